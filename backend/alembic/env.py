@@ -8,7 +8,7 @@ sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
 # Импортируем Base и ВСЕ модели (иначе Alembic не увидит таблицы)
 from app.db.base import Base
-from app.models.models import User, Document, Template, Image, Feedback, Element
+from app.models.models import User, Document, Template, Image, Feedback, Element, CompileJob, CompileRun, DocumentRevision
 
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
@@ -0,0 +1,28 @@
+"""Add compilation diagnostics
+
+Revision ID: 3b7e1c9a4d52
+Revises: cc65925f9025
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e1c9a4d52'
+down_revision: Union[str, Sequence[str], None] = 'cc65925f9025'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('compilation_diagnostics', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'compilation_diagnostics')
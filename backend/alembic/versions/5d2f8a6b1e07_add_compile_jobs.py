@@ -0,0 +1,50 @@
+"""Add compile jobs queue
+
+Revision ID: 5d2f8a6b1e07
+Revises: 3b7e1c9a4d52
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8a6b1e07'
+down_revision: Union[str, Sequence[str], None] = '3b7e1c9a4d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('compile_jobs',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('template_id', sa.Integer(), nullable=True),
+    sa.Column('latex_source', sa.Text(), nullable=False),
+    sa.Column('source_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.String(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['doc_id'], ['documents.doc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_index(op.f('ix_compile_jobs_job_id'), 'compile_jobs', ['job_id'], unique=False)
+    op.create_index(op.f('ix_compile_jobs_doc_id'), 'compile_jobs', ['doc_id'], unique=False)
+    op.create_index('ix_compile_jobs_status_created', 'compile_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_compile_jobs_status_created', table_name='compile_jobs')
+    op.drop_index(op.f('ix_compile_jobs_doc_id'), table_name='compile_jobs')
+    op.drop_index(op.f('ix_compile_jobs_job_id'), table_name='compile_jobs')
+    op.drop_table('compile_jobs')
@@ -0,0 +1,30 @@
+"""Add image content hash
+
+Revision ID: 8a4c2e9f3b61
+Revises: 5d2f8a6b1e07
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4c2e9f3b61'
+down_revision: Union[str, Sequence[str], None] = '5d2f8a6b1e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_images_content_hash'), 'images', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_images_content_hash'), table_name='images')
+    op.drop_column('images', 'content_hash')
@@ -0,0 +1,43 @@
+"""Add document revisions
+
+Revision ID: a9d4f2c7e815
+Revises: f2a8c6e4b173
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4f2c7e815'
+down_revision: Union[str, Sequence[str], None] = 'f2a8c6e4b173'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('document_revisions',
+    sa.Column('revision_id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('source_hash', sa.String(length=64), nullable=False),
+    sa.Column('pdf_path', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['doc_id'], ['documents.doc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('revision_id')
+    )
+    op.create_index(op.f('ix_document_revisions_revision_id'), 'document_revisions', ['revision_id'], unique=False)
+    op.create_index('ix_document_revisions_doc_version', 'document_revisions', ['doc_id', 'version'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_document_revisions_doc_version', table_name='document_revisions')
+    op.drop_index(op.f('ix_document_revisions_revision_id'), table_name='document_revisions')
+    op.drop_table('document_revisions')
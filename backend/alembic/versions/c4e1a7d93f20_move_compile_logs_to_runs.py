@@ -0,0 +1,76 @@
+"""Move compile logs to compile runs
+
+Revision ID: c4e1a7d93f20
+Revises: 8a4c2e9f3b61
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1a7d93f20'
+down_revision: Union[str, Sequence[str], None] = '8a4c2e9f3b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    compile_runs = op.create_table('compile_runs',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('log_compressed', sa.LargeBinary(), nullable=True),
+    sa.Column('log_size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['doc_id'], ['documents.doc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('run_id')
+    )
+    op.create_index(op.f('ix_compile_runs_run_id'), 'compile_runs', ['run_id'], unique=False)
+    op.create_index('ix_compile_runs_doc_run', 'compile_runs', ['doc_id', 'run_id'], unique=False)
+
+    # Переносим сохраненные логи (обрезанные до 5000 символов) в историю запусков
+    rows = op.get_bind().execute(sa.text(
+        "SELECT doc_id, compilation_status, compilation_log, pdf_generated_at "
+        "FROM documents WHERE compilation_log IS NOT NULL"
+    )).fetchall()
+    if rows:
+        op.bulk_insert(compile_runs, [
+            {
+                'doc_id': doc_id,
+                'status': 'success' if status == 'success' else 'error',
+                'log_compressed': zlib.compress(log.encode('utf-8'), 6),
+                'log_size': len(log.encode('utf-8')),
+                'created_at': generated_at,
+            }
+            for doc_id, status, log, generated_at in rows
+        ])
+
+    op.drop_column('documents', 'compilation_log')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('documents', sa.Column('compilation_log', sa.Text(), nullable=True))
+
+    # Возвращаем в документ хвост лога последнего запуска
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT DISTINCT ON (doc_id) doc_id, log_compressed FROM compile_runs "
+        "ORDER BY doc_id, run_id DESC"
+    )).fetchall()
+    for doc_id, log_compressed in rows:
+        log = zlib.decompress(log_compressed).decode('utf-8', errors='replace') if log_compressed else ''
+        bind.execute(
+            sa.text("UPDATE documents SET compilation_log = :log WHERE doc_id = :doc_id"),
+            {'log': log[-5000:], 'doc_id': doc_id}
+        )
+
+    op.drop_index('ix_compile_runs_doc_run', table_name='compile_runs')
+    op.drop_index(op.f('ix_compile_runs_run_id'), table_name='compile_runs')
+    op.drop_table('compile_runs')
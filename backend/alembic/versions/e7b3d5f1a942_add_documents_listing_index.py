@@ -0,0 +1,41 @@
+"""Add documents listing index
+
+Revision ID: e7b3d5f1a942
+Revises: c4e1a7d93f20
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3d5f1a942'
+down_revision: Union[str, Sequence[str], None] = 'c4e1a7d93f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Курсор строится по changes_data_doc, поэтому пустых значений быть не должно:
+    # документы, которые ни разу не меняли, считаем измененными в момент создания
+    op.execute("UPDATE documents SET changes_data_doc = creation_data_doc WHERE changes_data_doc IS NULL")
+    op.execute("UPDATE documents SET changes_data_doc = now() WHERE changes_data_doc IS NULL")
+    op.alter_column('documents', 'changes_data_doc',
+               existing_type=sa.DateTime(timezone=True),
+               server_default=sa.text('now()'),
+               nullable=False)
+    op.create_index('ix_documents_user_changes', 'documents',
+                    ['user_id', sa.text('changes_data_doc DESC'), 'doc_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_user_changes', table_name='documents')
+    op.alter_column('documents', 'changes_data_doc',
+               existing_type=sa.DateTime(timezone=True),
+               server_default=None,
+               nullable=True)
@@ -0,0 +1,28 @@
+"""Add document version
+
+Revision ID: f2a8c6e4b173
+Revises: e7b3d5f1a942
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a8c6e4b173'
+down_revision: Union[str, Sequence[str], None] = 'e7b3d5f1a942'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'version')
@@ -10,6 +10,7 @@ from app.core.config import settings
 from app.models.models import User, UserRole
 from app.schemas.user import UserCreate, UserResponse, Token, TitlePageData, UserUpdate
 from app.services.user_service import UserService
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 
@@ -199,4 +200,7 @@ async def update_user_me(
     await db.commit()
     await db.refresh(current_user)
     
+    # Закэшированный профиль устарел — следующий запрос перечитает его из БД
+    user_cache.invalidate(current_user.login)
+    
     return current_user
\ No newline at end of file
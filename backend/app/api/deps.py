@@ -6,6 +6,7 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.db.session import AsyncSessionLocal
 from app.models.models import User
+from app.services.user_cache import user_cache
 
 # Указываем, откуда FastAPI брать токен (из URL /auth/login)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -38,10 +39,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    # Частые запросы (опрос статуса компиляции) обходятся без SELECT пользователя
+    cached = user_cache.get(login, token)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+    
     result = await db.execute(select(User).where(User.login == login))
     user = result.scalars().first()
     
     if user is None:
         raise credentials_exception
     
+    user_cache.put(login, token, user)
     return user
\ No newline at end of file
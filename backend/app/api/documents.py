@@ -1,31 +1,74 @@
-import hashlib
+import asyncio
+import base64
+import json
 import logging
+from datetime import datetime
+from functools import partial
 from pathlib import Path
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, logger, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, logger, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from typing import List
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import load_only
+from typing import List, Optional
 
 from app.api.deps import get_db, get_current_user
-from app.models.models import Document, Template, User
-from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from app.core.config import settings
+from app.models.models import Document, DocumentRevision, Template, User
+from app.schemas.document import (
+    DocumentCreate, DocumentUpdate, DocumentResponse, DocumentSummary, DocumentPage, PreviewRequest,
+    DocumentPatch, DocumentSaveResult, DocumentRevisionInfo, DocumentRevisionContent
+)
 
 from app.services.user_service import UserService
-from app.services.compiler_services import CompilerService
+from app.services.compiler_services import CompilerService, workspaces, preview_workspaces
+from app.services.compile_queue import compile_queue, CompileBusy, CompileQueueFull
+from app.services.compile_jobs import enqueue_job, job_position, source_hash
+from app.services.compile_runs import RUN_ERROR, decompress_log, get_run, record_run
+from app.services.compile_events import compile_events, TERMINAL_STATUSES
+from app.services.image_service import ImageService
+from app.services.pdf_gc import store_compile_result
+from app.services.pdf_store import pdf_store
+from app.services.text_delta import apply_edits
+from app.services.revision_service import RevisionService
+from app.services.template_cache import template_cache
 from app.db.session import AsyncSessionLocal
 
 router = APIRouter()
 
+
+def _pdf_hash(document: Document) -> Optional[str]:
+    """Хэш PDF документа для неизменяемой ссылки /documents/{doc_id}/pdf/{pdf_hash}."""
+    if document.compilation_status != "success":
+        return None
+    return pdf_store.digest_for(document.pdf_path)
+
+
+def _document_response(document: Document) -> DocumentResponse:
+    response = DocumentResponse.model_validate(document)
+    response.pdf_hash = _pdf_hash(document)
+    return response
+
+
+def _document_summary(document: Document) -> DocumentSummary:
+    summary = DocumentSummary.model_validate(document)
+    summary.pdf_hash = _pdf_hash(document)
+    return summary
+
+
+def _revision_info(revision: DocumentRevision) -> DocumentRevisionInfo:
+    info = DocumentRevisionInfo.model_validate(revision)
+    info.pdf_hash = pdf_store.digest_for(revision.pdf_path)
+    return info
+
 @router.post("/", response_model=DocumentResponse)
 async def create_document(
     doc_in: DocumentCreate,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # 1. Ищем шаблон
-    result = await db.execute(select(Template).where(Template.template_id == doc_in.template_id))
-    template = result.scalars().first()
+    # 1. Ищем шаблон (разобранный шаблон берется из кэша, без запроса к БД)
+    template = await template_cache.get(db, doc_in.template_id)
     
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
@@ -33,15 +76,9 @@ async def create_document(
     # 2. Подготавливаем данные пользователя
     user_data = UserService.get_title_page_data(current_user)
     
-    # 3. Берем исходный код шаблона
-    source_latex = template.latex_preambula_tmp
-    
-    # 4. ВЫПОЛНЯЕМ ЗАМЕНУ МАРКЕРОВ
-    # Если в шаблоне есть эти слова, они заменятся на данные. Если нет - текст останется как есть.
-    filled_latex = source_latex.replace("VAR_GROUP", str(user_data["group"]))
-    filled_latex = filled_latex.replace("VAR_CARD", str(user_data["student_card"]))
-    # Можно использовать initials (Иванов И.И.) или signature_name (И.И. Иванов)
-    filled_latex = filled_latex.replace("VAR_STUDENT_SIGNATURE", str(user_data["initials"]))
+    # 3. ПОДСТАВЛЯЕМ ДАННЫЕ ВМЕСТО МАРКЕРОВ (VAR_GROUP, VAR_CARD, VAR_STUDENT_SIGNATURE...)
+    # Маркеры найдены заранее, заполнение — одна склейка кусков шаблона
+    filled_latex = template.fill(user_data)
 
     # 5. Создаем документ уже с заполненными данными
     new_doc = Document(
@@ -53,22 +90,81 @@ async def create_document(
     )
     
     db.add(new_doc)
+    await db.flush()
+    await RevisionService.record(db, new_doc)  # первая версия — снимок
     await db.commit()
     await db.refresh(new_doc)
-    return new_doc
+    return _document_response(new_doc)
 
 # 2. Получить список МОИХ документов
-@router.get("/", response_model=List[DocumentResponse])
+# Колонки для списка: тяжелые latex_source и content_json не читаются из БД вовсе,
+# весь документ загружается только при открытии (GET /documents/{doc_id}).
+# Здесь должны быть все поля DocumentSummary: отложенная колонка при сериализации
+# догружается лениво, а в async-сессии это ошибка (MissingGreenlet)
+DOCUMENT_SUMMARY_COLUMNS = (
+    Document.doc_id,
+    Document.name_doc,
+    Document.template_id,
+    Document.creation_data_doc,
+    Document.changes_data_doc,
+    Document.version,
+    Document.pdf_path,
+    Document.compilation_status,
+    Document.pdf_generated_at,
+)
+
+
+def _encode_cursor(document: Document) -> str:
+    """Курсор — позиция последнего документа страницы; клиенту он непрозрачен."""
+    raw = json.dumps([document.changes_data_doc.isoformat(), document.doc_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        changed_at, doc_id = json.loads(raw)
+        return datetime.fromisoformat(changed_at), int(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+@router.get("/", response_model=DocumentPage)
 async def read_documents(
-    skip: int = 0, 
-    limit: int = 100, 
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Документы пользователя, сначала недавно измененные. Постраничная выдача по курсору:
+    следующая страница начинается сразу после последнего документа предыдущей
+    (индекс ix_documents_user_changes), без OFFSET — глубокие страницы не дороже первой.
+    """
     # Фильтруем по user_id
-    query = select(Document).where(Document.user_id == current_user.user_id).offset(skip).limit(limit)
+    query = (
+        select(Document)
+        .options(load_only(*DOCUMENT_SUMMARY_COLUMNS))
+        .where(Document.user_id == current_user.user_id)
+        .order_by(Document.changes_data_doc.desc(), Document.doc_id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        changed_at, doc_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Document.changes_data_doc < changed_at,
+            and_(Document.changes_data_doc == changed_at, Document.doc_id > doc_id)
+        ))
+    
     result = await db.execute(query)
-    return result.scalars().all()
+    documents = result.scalars().all()
+    
+    # Лишний документ только показывает, что дальше есть еще страница
+    next_cursor = _encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    return DocumentPage(
+        items=[_document_summary(document) for document in documents[:limit]],
+        next_cursor=next_cursor
+    )
 
 # 3. Получить один документ по ID (Проверка, что он принадлежит юзеру)
 @router.get("/{doc_id}", response_model=DocumentResponse)
@@ -87,7 +183,7 @@ async def read_document(
     if doc.user_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Not enough privileges")
         
-    return doc
+    return _document_response(doc)
 
 # 4. Обновить документ (Сохранение)
 @router.put("/{doc_id}", response_model=DocumentResponse)
@@ -97,8 +193,8 @@ async def update_document(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Получаем документ
-    result = await db.execute(select(Document).where(Document.doc_id == doc_id))
+    # Получаем документ (с блокировкой: версии сохранений идут строго по очереди)
+    result = await db.execute(select(Document).where(Document.doc_id == doc_id).with_for_update())
     doc = result.scalars().first()
     
     if not doc:
@@ -107,6 +203,8 @@ async def update_document(
     if doc.user_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Not enough privileges")
 
+    previous_latex, previous_content = doc.latex_source, doc.content_json
+
     # Обновляем поля, если они пришли
     if doc_in.name_doc is not None:
         doc.name_doc = doc_in.name_doc
@@ -114,7 +212,66 @@ async def update_document(
         doc.content_json = doc_in.content_json
     if doc_in.latex_source is not None:
         doc.latex_source = doc_in.latex_source # Фронт перезаписывает код
+    if doc_in.content_json is not None or doc_in.latex_source is not None:
+        doc.version += 1
+        await RevisionService.record(db, doc, previous_latex, previous_content)
+
+    await db.commit()
+    await db.refresh(doc)
+    return _document_response(doc)
 
+# 4.1. Сохранение изменениями (автосохранение): только правки относительно известной версии
+@router.patch("/{doc_id}", response_model=DocumentSaveResult)
+async def patch_document(
+    doc_id: int,
+    patch_in: DocumentPatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Применяет правки к latex_source и content_json["html"]. Если документ уже сохранили
+    с другой версии (другая вкладка, другое устройство) — 409 с текущей версией,
+    правки не применяются.
+    """
+    # Блокируем строку: два сохранения одной версии не должны оба пройти
+    result = await db.execute(select(Document).where(Document.doc_id == doc_id).with_for_update())
+    doc = result.scalars().first()
+    
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if doc.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not enough privileges")
+    
+    if doc.version != patch_in.base_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Документ уже изменен, обновите его", "version": doc.version}
+        )
+    
+    previous_latex, previous_content = doc.latex_source, doc.content_json
+    try:
+        if patch_in.latex_edits:
+            doc.latex_source = apply_edits(
+                doc.latex_source or "",
+                [(edit.start, edit.end, edit.text) for edit in patch_in.latex_edits]
+            )
+        if patch_in.html_edits:
+            content_json = dict(doc.content_json or {})
+            content_json["html"] = apply_edits(
+                content_json.get("html") or "",
+                [(edit.start, edit.end, edit.text) for edit in patch_in.html_edits]
+            )
+            doc.content_json = content_json
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Некорректные правки: {e}")
+    
+    if patch_in.name_doc is not None:
+        doc.name_doc = patch_in.name_doc
+    if patch_in.latex_edits or patch_in.html_edits:
+        doc.version += 1
+        await RevisionService.record(db, doc, previous_latex, previous_content)
+    
     await db.commit()
     await db.refresh(doc)
     return doc
@@ -137,27 +294,26 @@ async def delete_document(
     
     await db.delete(doc)
     await db.commit()
+    
+    # Папки сборки удаленного документа больше не нужны
+    workspaces.drop(doc_id)
+    preview_workspaces.drop(doc_id)
     return None
 
 # 6. Компиляция документа
 @router.post("/{doc_id}/compile")
 async def compile_document(
     doc_id: int,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Скомпилировать документ в PDF (работает только на Windows хосте)"""
+    """
+    Скомпилировать документ в PDF. Без общей очереди компилирует сам процесс API
+    (только на Windows хосте с TeX Live), с COMPILE_JOBS_DURABLE — воркеры.
+    """
     from sqlalchemy import select
     import platform
     
-    # Проверяем, что мы на Windows (TeX Live установлен на хосте)
-    if platform.system() != "Windows":
-        raise HTTPException(
-            status_code=501,
-            detail="Компиляция PDF доступна только на Windows хосте с установленным TeX Live"
-        )
-    
     # Получаем документ из базы
     result = await db.execute(
         select(Document).where(
@@ -179,14 +335,56 @@ async def compile_document(
         raise HTTPException(status_code=400, detail=f"Невалидный LaTeX: {validation_msg}")
     
     # Проверяем доступность компилятора на хосте
-    available, compiler_msg = CompilerService.verify_compiler_available()
-    if not available:
-        raise HTTPException(
-            status_code=503,
-            detail=f"TeX Live компилятор недоступен на хосте: {compiler_msg}"
+    # (с общей очередью компилируют воркеры, TeX на узле API не нужен)
+    compiler_msg = None
+    if not settings.COMPILE_JOBS_DURABLE:
+        # Проверяем, что мы на Windows (TeX Live установлен на хосте)
+        if platform.system() != "Windows":
+            raise HTTPException(
+                status_code=501,
+                detail="Компиляция PDF доступна только на Windows хосте с установленным TeX Live"
+            )
+        # По истечении TTL реестр заново запускает движки (--version) — не в цикле событий
+        available, compiler_msg = await asyncio.to_thread(CompilerService.verify_compiler_available)
+        if not available:
+            raise HTTPException(
+                status_code=503,
+                detail=f"TeX Live компилятор недоступен на хосте: {compiler_msg}"
+            )
+    
+    latex_content = document.latex_source
+    template_id = document.template_id
+    queue_full_error = HTTPException(
+        status_code=503,
+        detail="Сервер компиляции перегружен, попробуйте позже",
+        headers={"Retry-After": "30"}
+    )
+    
+    if settings.COMPILE_JOBS_DURABLE:
+        # Задача и статус пишутся в одной транзакции: задачу заберет любой воркер,
+        # а после рестарта API она не потеряется
+        try:
+            submitted = await enqueue_job(db, doc_id, latex_content, template_id)
+        except CompileQueueFull:
+            await db.rollback()
+            raise queue_full_error
+        await db.execute(
+            update(Document)
+            .where(Document.doc_id == doc_id)
+            .values(compilation_status="compiling")
         )
+        await db.commit()
+        return {
+            "doc_id": doc_id,
+            "status": "compilation_started",
+            "message": "Компиляция уже выполняется" if submitted.joined else "Компиляция поставлена в очередь",
+            "queue_position": submitted.position,
+            "compiler_info": compiler_msg
+        }
     
-    # Обновляем статус на "compiling"
+    # Обновляем статус на "compiling" ДО постановки в очередь,
+    # иначе быстрая задача может завершиться раньше и ее статус перезапишется
+    previous_status = document.compilation_status
     await db.execute(
         update(Document)
         .where(Document.doc_id == doc_id)
@@ -194,38 +392,92 @@ async def compile_document(
     )
     await db.commit()
     
-    # Запускаем компиляцию в фоновом режиме
-    background_tasks.add_task(
-        compile_document_background_task,
-        doc_id=doc_id,
-        latex_content=document.latex_source
-    )
+    # Ставим задачу в очередь компиляции (если мест нет — сразу отказываем).
+    # Повтор с тем же исходником присоединяется к уже поставленной задаче.
+    latex_hash = source_hash(latex_content)
+    try:
+        submitted = compile_queue.submit(
+            doc_id,
+            latex_hash,
+            lambda generation: compile_document_background_task(
+                doc_id=doc_id,
+                latex_content=latex_content,
+                template_id=template_id,
+                generation=generation,
+                latex_hash=latex_hash
+            )
+        )
+    except CompileQueueFull:
+        await db.execute(
+            update(Document)
+            .where(Document.doc_id == doc_id)
+            .values(compilation_status=previous_status)
+        )
+        await db.commit()
+        raise queue_full_error
+    queue_position = submitted.position
+    
+    if not submitted.joined and queue_position > 0:
+        compile_events.publish(doc_id, {"status": "queued", "position": queue_position})
     
     return {
         "doc_id": doc_id,
         "status": "compilation_started",
-        "message": "Компиляция начата в фоновом режиме",
+        "message": "Компиляция уже выполняется" if submitted.joined else "Компиляция поставлена в очередь",
+        "queue_position": queue_position,
         "compiler_info": compiler_msg
     }
 
 async def compile_document_background_task(
     doc_id: int,
-    latex_content: str
+    latex_content: str,
+    template_id: Optional[int] = None,
+    generation: Optional[int] = None,
+    latex_hash: Optional[str] = None
 ):
-    """Фоновая задача компиляции с новой сессией БД"""
+    """
+    Фоновая задача компиляции с новой сессией БД.
+    Если пока шла компиляция пришел более новый исходник (generation устарел),
+    результат не записывается — его перезапишет более новая задача.
+    """
     from sqlalchemy import update, select
-    from sqlalchemy.sql import func
-    import asyncio
+    
+    def publish_if_current(event):
+        # Ход устаревшей компиляции в редактор не отправляем
+        if generation is None or compile_queue.is_current(doc_id, generation):
+            compile_events.publish(doc_id, event)
     
     # Создаем новую сессию для фоновой задачи
     async with AsyncSessionLocal() as db:
         try:
-            # Компилируем LaTeX в PDF
-            pdf_content, log = await asyncio.to_thread(
-                CompilerService.compile_latex_to_pdf,
-                latex_content
+            # Преамбула шаблона нужна для предкомпилированного формата
+            template_latex = None
+            if template_id is not None:
+                result = await db.execute(
+                    select(Template.latex_preambula_tmp).where(Template.template_id == template_id)
+                )
+                template_latex = result.scalars().first()
+            
+            # Картинки из \includegraphics подключаются из хранилища
+            images = await ImageService.resolve_for_document(db, doc_id, latex_content)
+            
+            # Компилируем LaTeX в PDF (в пуле очереди компиляции)
+            pdf_content, log, diagnostics = await compile_queue.run_blocking(
+                partial(
+                    CompilerService.compile_latex_to_pdf,
+                    latex_content,
+                    template_id=template_id,
+                    template_latex=template_latex,
+                    doc_id=doc_id,
+                    progress=lambda event: publish_if_current(event),
+                    images=images
+                )
             )
             
+            if generation is not None and not compile_queue.is_current(doc_id, generation):
+                logging.info(f"Результат компиляции документа {doc_id} устарел, не сохраняем")
+                return
+            
             # Получаем документ для проверки
             result = await db.execute(
                 select(Document).where(Document.doc_id == doc_id)
@@ -236,48 +488,18 @@ async def compile_document_background_task(
                 logger.error(f"Документ {doc_id} не найден при компиляции")
                 return
             
-            if pdf_content:
-                # Создаем хэш контента для уникального имени
-                content_hash = hashlib.md5(latex_content.encode()).hexdigest()[:8]
-                
-                # Сохраняем PDF
-                media_dir = Path("media") / "documents"
-                media_dir.mkdir(parents=True, exist_ok=True)
-                pdf_filename = f"document_{doc_id}_{content_hash}.pdf"
-                pdf_path = media_dir / pdf_filename
-                
-                pdf_path.write_bytes(pdf_content)
-                
-                # Обновляем документ в БД (сохраняем относительный путь)
-                await db.execute(
-                    update(Document)
-                    .where(Document.doc_id == doc_id)
-                    .values(
-                        pdf_path=f"documents/{pdf_filename}",
-                        compilation_status="success",
-                        compilation_log=log[:5000],
-                        pdf_generated_at=func.now()
-                    )
-                )
-                logging.info(f"PDF успешно создан для документа {doc_id}: {pdf_filename}")
-            else:
-                # Ошибка компиляции
-                await db.execute(
-                    update(Document)
-                    .where(Document.doc_id == doc_id)
-                    .values(
-                        compilation_status="error",
-                        compilation_log=log[:5000]
-                    )
-                )
-                logger.error(f"Ошибка компиляции документа {doc_id}: {log}")
+            await store_compile_result(db, doc_id, pdf_content, log, diagnostics, latex_hash)
             
             await db.commit()
+            publish_if_current({"status": "success" if pdf_content else "error"})
             
         except Exception as e:
             # Логируем ошибку
             logging.error(f"Ошибка компиляции документа {doc_id}: {str(e)}", exc_info=True)
             
+            if generation is not None and not compile_queue.is_current(doc_id, generation):
+                return
+            
             try:
                 # Обновляем статус ошибки
                 await db.execute(
@@ -285,27 +507,38 @@ async def compile_document_background_task(
                     .where(Document.doc_id == doc_id)
                     .values(
                         compilation_status="error",
-                        compilation_log=f"Системная ошибка: {str(e)}"
+                        compilation_diagnostics=None
                     )
                 )
+                await record_run(db, doc_id, RUN_ERROR, f"Системная ошибка: {str(e)}")
                 await db.commit()
+                publish_if_current({"status": "error"})
             except Exception as db_error:
                 logger.error(f"Не удалось обновить статус ошибки: {db_error}")
 
 # 7. Получить скомпилированный PDF
-@router.get("/{doc_id}/pdf")
-async def get_document_pdf(
-    doc_id: int,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """Получить скомпилированный PDF документа"""
-    from sqlalchemy import select
-    
+# Обычная ссылка всегда перепроверяется (ETag → 304), ссылка с хэшем не меняется никогда
+PDF_CACHE_REVALIDATE = "private, no-cache"
+PDF_CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли If-None-Match с ETag (слабое сравнение, как требует RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+async def _get_compiled_document(db: AsyncSession, doc_id: int, user_id: int) -> Document:
     result = await db.execute(
         select(Document).where(
             Document.doc_id == doc_id,
-            Document.user_id == current_user.user_id
+            Document.user_id == user_id
         )
     )
     document = result.scalars().first()
@@ -316,18 +549,61 @@ async def get_document_pdf(
     if not document.pdf_path or document.compilation_status != "success":
         raise HTTPException(status_code=404, detail="PDF не скомпилирован или компиляция не завершена")
     
-    # Собираем полный путь из относительного
-    pdf_full_path = Path("media") / document.pdf_path
-    
-    if not pdf_full_path.exists():
+    if not (Path("media") / document.pdf_path).exists():
         raise HTTPException(status_code=404, detail="PDF файл не найден на диске")
     
+    return document
+
+
+def _pdf_response(request: Request, document: Document, digest: str, cache_control: str) -> Response:
+    """
+    PDF со строгим ETag по хэшу содержимого. Повторный запрос с тем же ETag — 304 без тела;
+    запросы Range (просмотрщик грузит PDF по частям) FileResponse обрабатывает сам — 206/416.
+    """
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
     return FileResponse(
-        path=pdf_full_path,
+        path=Path("media") / document.pdf_path,
         filename=f"{document.name_doc}.pdf",
-        media_type='application/pdf'
+        media_type='application/pdf',
+        headers=headers
     )
 
+
+@router.get("/{doc_id}/pdf")
+async def get_document_pdf(
+    doc_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Получить скомпилированный PDF документа"""
+    document = await _get_compiled_document(db, doc_id, current_user.user_id)
+    digest = await asyncio.to_thread(pdf_store.artifact_digest, document.pdf_path)
+    return _pdf_response(request, document, digest, PDF_CACHE_REVALIDATE)
+
+
+@router.get("/{doc_id}/pdf/{pdf_hash}")
+async def get_document_pdf_by_hash(
+    doc_id: int,
+    pdf_hash: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    PDF по ссылке с хэшем содержимого (pdf_hash из ответа документа).
+    Содержимое по такой ссылке не меняется, поэтому браузер кэширует его навсегда;
+    после перекомпиляции у документа будет другая ссылка.
+    """
+    document = await _get_compiled_document(db, doc_id, current_user.user_id)
+    if pdf_store.digest_for(document.pdf_path) != pdf_hash:
+        raise HTTPException(status_code=404, detail="Эта версия PDF больше не актуальна")
+    return _pdf_response(request, document, pdf_hash, PDF_CACHE_IMMUTABLE)
+
 # 8. Получить статус компиляции
 @router.get("/{doc_id}/compile-status")
 async def get_compile_status(
@@ -360,5 +636,253 @@ async def get_compile_status(
         "status": document.compilation_status,
         "generated_at": document.pdf_generated_at,
         "pdf_exists": pdf_exists,
-        "pdf_path": document.pdf_path
-    }
\ No newline at end of file
+        "pdf_path": document.pdf_path,
+        "pdf_hash": _pdf_hash(document),
+        "queue_position": (
+            await job_position(db, doc_id) if settings.COMPILE_JOBS_DURABLE
+            else compile_queue.position(doc_id)
+        ),
+        "diagnostics": document.compilation_diagnostics or []
+    }
+
+# 9. Поток событий компиляции (Server-Sent Events) вместо опроса compile-status
+@router.get("/{doc_id}/compile-events")
+async def stream_compile_events(
+    doc_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Отдает события компиляции по мере появления: queued, compiling (номер прохода),
+    log (строки лога xelatex), success / error. База читается при подключении и
+    периодически, пока идет компиляция; если статус не меняется дольше
+    COMPILE_EVENTS_STALE_SECONDS, поток закрывается.
+    """
+    # Подписываемся до чтения статуса, чтобы не пропустить завершение между ними
+    queue = compile_events.subscribe(doc_id)
+    
+    result = await db.execute(
+        select(Document.compilation_status).where(
+            Document.doc_id == doc_id,
+            Document.user_id == current_user.user_id
+        )
+    )
+    current_status = result.scalars().first()
+    
+    if current_status is None:
+        compile_events.unsubscribe(doc_id, queue)
+        raise HTTPException(status_code=404, detail="Документ не найден")
+    
+    # Соединение с БД на время стрима не держим
+    await db.close()
+    
+    async def event_stream():
+        try:
+            # Сначала текущее состояние, чтобы клиенту не ждать следующего события
+            first_event = compile_events.last_event(doc_id) or {"status": current_status}
+            yield f"data: {json.dumps(first_event, ensure_ascii=False)}\n\n"
+            if first_event["status"] not in ("queued", "compiling"):
+                return
+            
+            # С общей очередью компилирует другой процесс и события сюда не приходят —
+            # тогда между ожиданиями смотрим статус документа в БД. Без нее тоже смотрим,
+            # но реже: компиляция могла оборваться без итогового события (рестарт процесса)
+            wait_seconds = settings.COMPILE_JOB_POLL_SECONDS * 2 if settings.COMPILE_JOBS_DURABLE else 15
+            loop_time = asyncio.get_running_loop().time
+            status_changed_at = loop_time()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=wait_seconds)
+                except asyncio.TimeoutError:
+                    async with AsyncSessionLocal() as poll_db:
+                        result = await poll_db.execute(
+                            select(Document.compilation_status).where(Document.doc_id == doc_id)
+                        )
+                        polled_status = result.scalars().first()
+                    if polled_status not in ("queued", "compiling"):
+                        yield f"data: {json.dumps({'status': polled_status}, ensure_ascii=False)}\n\n"
+                        return
+                    if loop_time() - status_changed_at > settings.COMPILE_EVENTS_STALE_SECONDS:
+                        # Статус давно не меняется — компиляция, видимо, потеряна; клиент
+                        # получит текущий статус из БД и может переподключиться
+                        yield f"data: {json.dumps({'status': polled_status, 'stale': True}, ensure_ascii=False)}\n\n"
+                        return
+                    # Комментарий SSE, чтобы прокси не закрыли простаивающее соединение
+                    yield ": ping\n\n"
+                    continue
+                if event["status"] != "log":
+                    status_changed_at = loop_time()
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            compile_events.unsubscribe(doc_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 10. Быстрый предпросмотр отдельных блоков (разделов) документа
+@router.post("/{doc_id}/preview")
+async def preview_document_blocks(
+    doc_id: int,
+    preview_in: PreviewRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Собирает PDF только из указанных блоков (0 — титульный лист и оглавление,
+    1..N — разделы по порядку). Нумерация страниц, разделов и ссылок берется
+    из предыдущих сборок предпросмотра. Результат не сохраняется в документ.
+    """
+    result = await db.execute(
+        select(Document.latex_source).where(
+            Document.doc_id == doc_id,
+            Document.user_id == current_user.user_id
+        )
+    )
+    latex_source = result.scalars().first()
+    
+    if latex_source is None:
+        raise HTTPException(status_code=404, detail="Документ не найден или нет LaTeX кода")
+    
+    is_valid, validation_msg = CompilerService.validate_latex_content(latex_source)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=f"Невалидный LaTeX: {validation_msg}")
+    
+    available, compiler_msg = await asyncio.to_thread(CompilerService.verify_compiler_available)
+    if not available:
+        raise HTTPException(
+            status_code=503,
+            detail=f"TeX Live компилятор недоступен на хосте: {compiler_msg}"
+        )
+    
+    images = await ImageService.resolve_for_document(db, doc_id, latex_source)
+    
+    # Предпросмотр синхронный, но проходит через ту же очередь компиляции:
+    # ограничение мест и не больше одного предпросмотра документа за раз
+    try:
+        pdf_content, log, diagnostics = await compile_queue.run(
+            ("preview", doc_id),
+            partial(
+                CompilerService.compile_preview,
+                latex_source,
+                doc_id,
+                blocks=preview_in.blocks,
+                images=images
+            )
+        )
+    except CompileQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Сервер компиляции перегружен, попробуйте позже",
+            headers={"Retry-After": "30"}
+        )
+    except CompileBusy:
+        raise HTTPException(
+            status_code=429,
+            detail="Предпросмотр документа уже выполняется",
+            headers={"Retry-After": "2"}
+        )
+    
+    if not pdf_content:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Ошибка компиляции предпросмотра", "diagnostics": diagnostics}
+        )
+    
+    return Response(content=pdf_content, media_type="application/pdf")
+
+# 11. Полный лог компиляции (хранится сжатым отдельно от документа, читается по запросу)
+@router.get("/{doc_id}/compile-log")
+async def get_compile_log(
+    doc_id: int,
+    run_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Лог последней компиляции документа (или запуска run_id из истории)"""
+    result = await db.execute(
+        select(Document.doc_id).where(
+            Document.doc_id == doc_id,
+            Document.user_id == current_user.user_id
+        )
+    )
+    if result.scalars().first() is None:
+        raise HTTPException(status_code=404, detail="Документ не найден")
+    
+    run = await get_run(db, doc_id, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Лог компиляции не найден")
+    
+    return {
+        "run_id": run.run_id,
+        "doc_id": doc_id,
+        "status": run.status,
+        "created_at": run.created_at,
+        "log_size": run.log_size,
+        "log": decompress_log(run.log_compressed)
+    }
+
+# 12. История версий документа
+async def _get_own_document(db: AsyncSession, doc_id: int, user_id: int, for_update: bool = False) -> Document:
+    query = select(Document).where(Document.doc_id == doc_id, Document.user_id == user_id)
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    document = result.scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Документ не найден")
+    return document
+
+
+@router.get("/{doc_id}/revisions", response_model=List[DocumentRevisionInfo])
+async def list_document_revisions(
+    doc_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Версии документа, начиная с последней"""
+    await _get_own_document(db, doc_id, current_user.user_id)
+    return [_revision_info(revision) for revision in await RevisionService.list_revisions(db, doc_id)]
+
+
+@router.get("/{doc_id}/revisions/{version}", response_model=DocumentRevisionContent)
+async def read_document_revision(
+    doc_id: int,
+    version: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Содержимое версии (собирается из ближайшего снимка и правок после него)"""
+    await _get_own_document(db, doc_id, current_user.user_id)
+    content = await RevisionService.reconstruct(db, doc_id, version)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Версия не найдена")
+    return DocumentRevisionContent(
+        version=version,
+        latex_source=content.latex_source,
+        content_json=content.content_json,
+        has_pdf=content.revision.pdf_path is not None
+    )
+
+
+@router.post("/{doc_id}/revisions/{version}/restore", response_model=DocumentResponse)
+async def restore_document_revision(
+    doc_id: int,
+    version: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Вернуть документ к версии. Восстановление — новая версия, история сохраняется.
+    Если версия компилировалась, ее PDF сразу становится PDF документа.
+    """
+    document = await _get_own_document(db, doc_id, current_user.user_id, for_update=True)
+    if await RevisionService.restore(db, document, version) is None:
+        raise HTTPException(status_code=404, detail="Версия не найдена")
+    await db.commit()
+    await db.refresh(document)
+    return _document_response(document)
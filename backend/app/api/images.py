@@ -0,0 +1,77 @@
+import hashlib
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+
+from app.api.deps import get_db, get_current_user
+from app.core.config import settings
+from app.models.models import Image, User
+from app.schemas.image import ImageResponse
+from app.services.image_service import ImageService
+from app.services.image_store import ALLOWED_EXTENSIONS, is_reserved_image_name, sanitize_image_name
+
+router = APIRouter()
+
+# 1. Загрузить картинку (в LaTeX на нее ссылаются по имени: \includegraphics{logo.png})
+@router.post("/", response_model=ImageResponse)
+async def upload_image(
+    file: UploadFile = File(...),
+    heading_img: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    data = await file.read(settings.IMAGE_MAX_BYTES + 1)
+    if len(data) > settings.IMAGE_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Картинка слишком большая"
+        )
+    if not data:
+        raise HTTPException(status_code=400, detail="Пустой файл")
+    
+    # Имя без латиницы (например, кириллическое) заменяется на имя по содержимому
+    name_img = sanitize_image_name(
+        file.filename, fallback_stem=f"image_{hashlib.sha256(data).hexdigest()[:8]}"
+    )
+    if name_img is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Поддерживаются только {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    # Под этими именами TeX пишет свои файлы в папке сборки
+    if is_reserved_image_name(name_img):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Имя {name_img} зарезервировано для файлов сборки, переименуйте картинку"
+        )
+    
+    return await ImageService.save_image(db, current_user.user_id, name_img, data, heading_img)
+
+# 2. Картинки текущего пользователя
+@router.get("/", response_model=List[ImageResponse])
+async def read_images(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(Image).where(Image.user_id == current_user.user_id).order_by(Image.image_id)
+    )
+    return result.scalars().all()
+
+# 3. Удалить картинку (файл удаляется, только если он больше никому не нужен)
+@router.delete("/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_image(
+    image_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(Image).where(Image.image_id == image_id, Image.user_id == current_user.user_id)
+    )
+    image = result.scalars().first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Картинка не найдена")
+    
+    await ImageService.delete_image(db, image)
+    return None
@@ -6,6 +6,8 @@ from typing import List
 from app.api.deps import get_db, get_current_user
 from app.models.models import Template, User, UserRole
 from app.schemas.template import TemplateCreate, TemplateResponse
+from app.services.compiler_services import CompilerService
+from app.services.template_cache import template_cache
 
 router = APIRouter()
 
@@ -41,6 +43,10 @@ async def create_template(
     db.add(new_template)
     await db.commit()
     await db.refresh(new_template)
+    
+    # Старые форматы и воркеры с этим ID (если ID переиспользован) больше не актуальны
+    CompilerService.invalidate_template(new_template.template_id)
+    template_cache.invalidate(new_template.template_id)
     return new_template
 
 # 3. Удалить шаблон
@@ -65,4 +71,8 @@ async def delete_template(
     
     await db.delete(template)
     await db.commit()
+    
+    # Удаляем предкомпилированные форматы преамбулы и теплые воркеры шаблона
+    CompilerService.invalidate_template(template_id)
+    template_cache.invalidate(template_id)
     return None
\ No newline at end of file
@@ -9,4 +9,76 @@ class Settings:
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 # 7 дней
 
+    # Кэш авторизованных пользователей в памяти процесса (0 — выключено).
+    # TTL ограничивает устаревание профиля в других процессах API
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_ENTRIES: int = 1024
+
+    # Кэш разобранных шаблонов (сбрасывается при создании/удалении шаблона в этом процессе)
+    TEMPLATE_CACHE_TTL_SECONDS: int = 300
+
+    # Максимальный размер загружаемой картинки
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024 # 10 МБ
+
+    # Хранилище PDF: сборка мусора (файлы без ссылок старше GRACE удаляются)
+    PDF_GC_INTERVAL_SECONDS: int = 3600
+    PDF_GC_GRACE_SECONDS: int = 3600
+    # Фиксированная дата для воспроизводимой сборки (одинаковый исходник — одинаковые байты)
+    PDF_SOURCE_DATE_EPOCH: int = 0
+
+    # Кэш скомпилированных PDF (LRU по размеру)
+    PDF_CACHE_MAX_BYTES: int = 256 * 1024 * 1024 # 256 МБ
+
+    # Очередь компиляции: сколько TeX процессов одновременно и сколько задач ждут
+    COMPILE_WORKERS: int = 2
+    COMPILE_QUEUE_MAX_PENDING: int = 50
+
+    # Общая очередь в таблице compile_jobs (компилируют воркеры python -m app.worker).
+    # Выключено — компиляция в памяти процесса API, как раньше
+    COMPILE_JOBS_DURABLE: bool = False
+    COMPILE_JOB_LEASE_SECONDS: int = 120 # аренда задачи, продлевается пульсом воркера
+    COMPILE_JOB_HEARTBEAT_SECONDS: int = 20
+    COMPILE_JOB_MAX_ATTEMPTS: int = 3 # после стольких потерянных аренд задача считается упавшей
+    COMPILE_JOB_POLL_SECONDS: float = 1.0 # как часто свободный воркер проверяет очередь
+
+    # Статус компиляции без изменений дольше этого считается зависшим: он не отдается
+    # новым подписчикам, а поток событий (SSE) закрывается
+    COMPILE_EVENTS_STALE_SECONDS: int = 600
+
+    # История компиляций: сколько последних запусков (с полными логами) хранить на документ
+    COMPILE_RUNS_KEEP: int = 20
+
+    # История версий документа: полный снимок раз в столько версий, между ними — правки.
+    # Восстановление версии применяет не больше стольких правок
+    REVISION_SNAPSHOT_INTERVAL: int = 20
+    # PDF хранится при стольких последних версиях документа; у более старых ссылка
+    # снимается, и сборщик мусора может удалить их PDF
+    REVISION_PDF_KEEP: int = 10
+
+    # Максимум проходов TeX (повторяем, только пока меняются .aux/.toc/.out)
+    LATEX_MAX_RUNS: int = 3
+
+    # Сколько секунд доверяем найденным движкам TeX без повторной проверки
+    TOOLCHAIN_CACHE_TTL: int = 600
+
+    # Теплые процессы TeX с загруженной преамбулой шаблона (0 — выключено)
+    WARM_POOL_SIZE: int = 1
+    WARM_POOL_SIZE_BY_TEMPLATE: dict = {} # {template_id: размер пула}
+    WARM_WORKER_MAX_JOBS: int = 50 # после стольких задач папка воркера пересоздается
+
+    # Сколько постоянных папок сборки документов держать (LRU)
+    BUILD_WORKSPACES_MAX: int = 500
+
+    # Разбор лога TeX: сколько последних сырых строк держать и сколько диагностик отдавать
+    LATEX_LOG_RING_LINES: int = 200
+    LATEX_MAX_DIAGNOSTICS: int = 200
+
+    # Жесткие лимиты на один процесс TeX
+    LATEX_TIMEOUT_SECONDS: int = 30 # реальное время на один проход
+    LATEX_CPU_SECONDS: int = 30
+    LATEX_MEMORY_MB: int = 1536
+    LATEX_MAX_FILE_MB: int = 50 # максимальный размер любого записываемого файла (PDF, .log)
+    LATEX_MAX_OPEN_FILES: int = 256
+    LATEX_MAX_OUTPUT_BYTES: int = 2 * 1024 * 1024 # вывод в stdout
+
 settings = Settings()
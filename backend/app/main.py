@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 import asyncio
 import sys
-from app.api import auth, templates, documents 
+from app.api import auth, templates, documents, images
 from app.services.latex_compiler import check_latex_availability
+from app.services.compile_queue import compile_queue
+from app.services.pdf_gc import pdf_gc_loop
+from app.services.compiler_services import warm_workers
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="Report Constructor API")
@@ -24,12 +27,21 @@ app.add_middleware(
 # Проверка LaTeX при запуске
 @app.on_event("startup")
 async def startup_event():
-    is_installed, msg = check_latex_availability()
+    is_installed, msg = await asyncio.to_thread(check_latex_availability)
     print(f"LaTeX Check: {msg}")
+    await compile_queue.start()
+    app.state.pdf_gc_task = asyncio.create_task(pdf_gc_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.pdf_gc_task.cancel()
+    await compile_queue.stop()
+    warm_workers.shutdown()
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(templates.router, prefix="/templates", tags=["Templates"])
 app.include_router(documents.router, prefix="/documents", tags=["Documents"])
+app.include_router(images.router, prefix="/images", tags=["Images"])
 
 @app.get("/")
 def root():
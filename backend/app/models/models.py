@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, JSON, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, JSON, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
@@ -53,15 +53,17 @@ class Document(Base):
     # Храним данные редактора (JSON) и итоговый LaTeX код
     content_json = Column(JSON, nullable=True) 
     latex_source = Column(Text, nullable=True)
+    # Версия содержимого: сохранение изменениями применяется только к той версии, от которой их считали
+    version = Column(Integer, default=1, server_default="1", nullable=False)
     
     # PDF генерация
     pdf_path = Column(String, nullable=True)  # путь к PDF файлу
     pdf_generated_at = Column(DateTime(timezone=True), nullable=True)
     compilation_status = Column(String, default="not_compiled")  # not_compiled, success, error
-    compilation_log = Column(Text, nullable=True)  # логи компиляции
+    compilation_diagnostics = Column(JSON, nullable=True)  # разобранные ошибки/предупреждения из .log
     
     creation_data_doc = Column(DateTime(timezone=True), server_default=func.now())
-    changes_data_doc = Column(DateTime(timezone=True), onupdate=func.now())
+    changes_data_doc = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     user_id = Column(Integer, ForeignKey("users.user_id"))
     template_id = Column(Integer, ForeignKey("templates.template_id"))
@@ -69,12 +71,77 @@ class Document(Base):
     user = relationship("User", back_populates="documents")
     template = relationship("Template", back_populates="documents")
 
+    __table_args__ = (
+        # Список документов пользователя по курсору (сначала недавно измененные)
+        Index("ix_documents_user_changes", user_id, changes_data_doc.desc(), doc_id),
+    )
+
+class DocumentRevision(Base):
+    """
+    Версия содержимого документа. Полный снимок раз в REVISION_SNAPSHOT_INTERVAL версий,
+    между снимками — правки к предыдущей версии. data сжато zlib.
+    """
+    __tablename__ = "document_revisions"
+
+    revision_id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(Integer, ForeignKey("documents.doc_id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)  # Document.version после этого сохранения
+    is_snapshot = Column(Boolean, default=False, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    source_hash = Column(String(64), nullable=False)  # sha256 latex_source — по нему привязывается PDF
+    pdf_path = Column(String, nullable=True)  # PDF этой версии в хранилище, если ее компилировали
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_document_revisions_doc_version", "doc_id", "version", unique=True),
+    )
+
+class CompileJob(Base):
+    """Задача компиляции в общей очереди (ее забирает любой воркер: python -m app.worker)"""
+    __tablename__ = "compile_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(Integer, ForeignKey("documents.doc_id", ondelete="CASCADE"), nullable=False, index=True)
+    template_id = Column(Integer, nullable=True)
+    latex_source = Column(Text, nullable=False)
+    source_hash = Column(String(64), nullable=False)
+
+    status = Column(String, default="queued", nullable=False)  # queued, running, done, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    worker_id = Column(String, nullable=True)  # кто держит аренду
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_compile_jobs_status_created", "status", "created_at"),
+    )
+
+class CompileRun(Base):
+    """Итог одной компиляции с полным логом (сжат zlib, читается отдельно от документа)"""
+    __tablename__ = "compile_runs"
+
+    run_id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(Integer, ForeignKey("documents.doc_id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, nullable=False)  # success, error
+    log_compressed = Column(LargeBinary, nullable=True)
+    log_size = Column(Integer, default=0, nullable=False)  # размер лога до сжатия, байт
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_compile_runs_doc_run", "doc_id", "run_id"),
+    )
+
 class Image(Base):
     __tablename__ = "images"
 
     image_id = Column(Integer, primary_key=True, index=True)
     name_img = Column(String)
     url_img = Column(String) # Путь к файлу на сервере
+    content_hash = Column(String(64), nullable=True, index=True) # sha256 содержимого в хранилище картинок
     heading_img = Column(String, nullable=True)
     upload_data_img = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 from datetime import datetime
 
 # Базовая схема
@@ -16,21 +16,86 @@ class DocumentUpdate(BaseModel):
     content_json: Optional[Dict[str, Any]] = None # JSON от React-редактора
     latex_source: Optional[str] = None # Текст для компиляции
 
-# Для ответа (Отдаем всё, включая даты)
-class DocumentResponse(DocumentBase):
+# Правка текста: заменить [start, end) на text (позиции в UTF-16, как в JavaScript)
+class TextEdit(BaseModel):
+    start: int
+    end: int
+    text: str = ""
+
+# Сохранение изменениями: правки относительно версии base_version
+class DocumentPatch(BaseModel):
+    base_version: int
+    name_doc: Optional[str] = None
+    latex_edits: Optional[List[TextEdit]] = None
+    html_edits: Optional[List[TextEdit]] = None  # правки content_json["html"]
+
+# Ответ на сохранение изменениями: без содержимого, его клиент уже знает
+class DocumentSaveResult(BaseModel):
+    doc_id: int
+    version: int
+    changes_data_doc: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+# Одно сообщение из лога TeX (ошибка, предупреждение, переполнение бокса)
+class CompileDiagnostic(BaseModel):
+    severity: str  # error, warning, badbox
+    message: str
+    line: Optional[int] = None  # строка в исходнике
+    file: Optional[str] = None  # файл, в котором возникло сообщение
+    package: Optional[str] = None
+    context: Optional[str] = None  # фрагмент строки с ошибкой
+
+# Запрос предпросмотра: какие блоки верстать (None — все)
+class PreviewRequest(BaseModel):
+    blocks: Optional[List[int]] = None
+
+# Для списка документов (дашборд): только метаданные, без исходника и содержимого редактора
+class DocumentSummary(DocumentBase):
     doc_id: int
-    user_id: int
     template_id: int
-    content_json: Optional[Dict[str, Any]]
-    latex_source: Optional[str]
     creation_data_doc: datetime
     changes_data_doc: Optional[datetime]
+    version: int = 1  # растет с каждым сохранением содержимого
     
     # Поля для PDF компиляции
     pdf_path: Optional[str] = None
     compilation_status: str = "not_compiled"  # Дефолтное значение
-    compilation_log: Optional[str] = None
     pdf_generated_at: Optional[datetime] = None
+    # Хэш PDF для неизменяемой ссылки /documents/{doc_id}/pdf/{pdf_hash} (заполняет API)
+    pdf_hash: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Страница списка документов; next_cursor передается в следующий запрос (None — страниц больше нет)
+class DocumentPage(BaseModel):
+    items: List[DocumentSummary]
+    next_cursor: Optional[str] = None
+
+# Для ответа (Отдаем всё, включая даты)
+class DocumentResponse(DocumentSummary):
+    user_id: int
+    content_json: Optional[Dict[str, Any]]
+    latex_source: Optional[str]
+    compilation_diagnostics: Optional[List[CompileDiagnostic]] = None
+
+# Версия из истории документа (без содержимого)
+class DocumentRevisionInfo(BaseModel):
+    version: int
+    is_snapshot: bool
+    created_at: Optional[datetime]
+    pdf_path: Optional[str] = None
+    # PDF этой версии (ссылка /documents/{doc_id}/pdf/{pdf_hash} работает, пока это PDF документа)
+    pdf_hash: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+# Содержимое версии из истории
+class DocumentRevisionContent(BaseModel):
+    version: int
+    latex_source: Optional[str]
+    content_json: Optional[Dict[str, Any]]
+    has_pdf: bool
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ImageResponse(BaseModel):
+    image_id: int
+    name_img: str # Имя для \includegraphics{...}
+    url_img: str
+    heading_img: Optional[str] = None
+    content_hash: Optional[str] = None
+    upload_data_img: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
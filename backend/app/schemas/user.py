@@ -32,6 +32,7 @@ class TitlePageData(BaseModel):
     last_name: str
     first_name: str
     middle_name: Optional[str]
+    full_name: str  # Иванов Иван Петрович
     initials: str  # Иванов И.П.
     group: Optional[str]
     student_card: Optional[str]
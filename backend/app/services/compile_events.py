@@ -0,0 +1,86 @@
+# app/services/compile_events.py
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Статусы, после которых компиляция завершена и поток событий можно закрыть
+TERMINAL_STATUSES = ("success", "error")
+
+
+class CompileEventBus:
+    """
+    Внутрипроцессный pub/sub событий компиляции.
+
+    Воркеры компиляции (в том числе из потоков пула) публикуют события по doc_id,
+    а открытые вкладки редактора получают их через SSE без опроса базы.
+    Последний статус незавершенной компиляции хранится для новых подписчиков;
+    итоговый статус уже записан в БД, поэтому после него запись удаляется,
+    а зависшие записи (процесс упал посреди компиляции) — через stale_seconds.
+    """
+
+    def __init__(self, queue_size: int = 1000, stale_seconds: float = 600):
+        self.queue_size = queue_size
+        self.stale_seconds = stale_seconds
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        # doc_id -> (когда пришел, последний статус)
+        self._last: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, doc_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(doc_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, doc_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(doc_id, [])
+            self._subscribers[doc_id] = [s for s in subscribers if s[1] is not queue]
+            if not self._subscribers[doc_id]:
+                del self._subscribers[doc_id]
+
+    def last_event(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Последний статус незавершенной компиляции (None — нет или устарел)."""
+        with self._lock:
+            entry = self._last.get(doc_id)
+            if entry is None or time.monotonic() - entry[0] > self.stale_seconds:
+                return None
+            return entry[1]
+
+    def publish(self, doc_id: int, event: Dict[str, Any]) -> None:
+        """Публикует событие. Можно вызывать из любого потока."""
+        status = event.get("status")
+        with self._lock:
+            if status in TERMINAL_STATUSES:
+                self._last.pop(doc_id, None)
+            elif status != "log":
+                now = time.monotonic()
+                self._last[doc_id] = (now, event)
+                self._prune(now)
+            subscribers = list(self._subscribers.get(doc_id, []))
+
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    def _prune(self, now: float) -> None:
+        """Удаляет зависшие статусы (вызывается под self._lock)."""
+        stale = [doc_id for doc_id, (at, _) in self._last.items() if now - at > self.stale_seconds]
+        for doc_id in stale:
+            del self._last[doc_id]
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: строки лога можно потерять, смену статуса — нет
+            if event.get("status") != "log":
+                queue.get_nowait()
+                queue.put_nowait(event)
+
+
+compile_events = CompileEventBus(stale_seconds=settings.COMPILE_EVENTS_STALE_SECONDS)
@@ -0,0 +1,237 @@
+# app/services/compile_jobs.py
+import hashlib
+import logging
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.models.models import CompileJob, Document
+from app.services.compile_queue import CompileQueueFull
+from app.services.compile_runs import RUN_ERROR, record_run
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class EnqueueResult(NamedTuple):
+    job_id: int
+    position: int   # 0 — уже компилируется, 1.. — место в очереди
+    joined: bool    # True — присоединились к задаче с тем же исходником
+
+
+def source_hash(latex_content: str) -> str:
+    return hashlib.sha256(latex_content.encode()).hexdigest()
+
+
+async def _position(db: AsyncSession, job: CompileJob) -> int:
+    if job.status == JOB_RUNNING:
+        return 0
+    result = await db.execute(
+        select(func.count()).select_from(CompileJob).where(
+            CompileJob.status == JOB_QUEUED,
+            CompileJob.created_at <= job.created_at
+        )
+    )
+    return result.scalar_one()
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    doc_id: int,
+    latex_content: str,
+    template_id: Optional[int]
+) -> EnqueueResult:
+    """
+    Ставит задачу компиляции документа в общую очередь (коммит — на вызывающем).
+    Как и в очереди в памяти: задача с тем же исходником переиспользуется,
+    а ожидающая задача с другим исходником подменяется, сохраняя место.
+    Бросает CompileQueueFull, если ожидающих задач слишком много.
+    """
+    new_hash = source_hash(latex_content)
+
+    # Блокируем строку документа: параллельные запросы одного документа ставятся по очереди
+    await db.execute(select(Document.doc_id).where(Document.doc_id == doc_id).with_for_update())
+
+    # FOR UPDATE ждет воркера, который как раз забирает задачу, и видит ее новый статус
+    result = await db.execute(
+        select(CompileJob)
+        .where(CompileJob.doc_id == doc_id, CompileJob.status.in_(ACTIVE_STATUSES))
+        .order_by(CompileJob.created_at, CompileJob.job_id)
+        .with_for_update()
+    )
+    active = result.scalars().all()
+
+    for job in active:
+        if job.source_hash == new_hash:
+            return EnqueueResult(job.job_id, await _position(db, job), True)
+
+    queued = next((job for job in active if job.status == JOB_QUEUED), None)
+    if queued is not None:
+        # Исходник изменился, а задача еще не начата — просто подменяем ее
+        queued.latex_source = latex_content
+        queued.source_hash = new_hash
+        queued.template_id = template_id
+        await db.flush()
+        return EnqueueResult(queued.job_id, await _position(db, queued), False)
+
+    result = await db.execute(
+        select(func.count()).select_from(CompileJob).where(CompileJob.status == JOB_QUEUED)
+    )
+    if result.scalar_one() >= settings.COMPILE_QUEUE_MAX_PENDING:
+        raise CompileQueueFull(f"В очереди уже {settings.COMPILE_QUEUE_MAX_PENDING} задач")
+
+    job = CompileJob(
+        doc_id=doc_id,
+        template_id=template_id,
+        latex_source=latex_content,
+        source_hash=new_hash,
+        status=JOB_QUEUED,
+        attempts=0
+    )
+    db.add(job)
+    await db.flush()
+    await db.refresh(job)
+    return EnqueueResult(job.job_id, await _position(db, job), False)
+
+
+async def job_position(db: AsyncSession, doc_id: int) -> Optional[int]:
+    """Позиция документа в общей очереди: 0 — компилируется сейчас, None — задач нет."""
+    result = await db.execute(
+        select(CompileJob)
+        .where(CompileJob.doc_id == doc_id, CompileJob.status.in_(ACTIVE_STATUSES))
+        .order_by(CompileJob.created_at)
+    )
+    jobs = result.scalars().all()
+    if not jobs:
+        return None
+    # Если есть ожидающая задача — интересна она (запущенная уже устарела)
+    queued = next((job for job in jobs if job.status == JOB_QUEUED), None)
+    return await _position(db, queued or jobs[0])
+
+
+async def claim_job(db: AsyncSession, worker_id: str) -> Optional[CompileJob]:
+    """
+    Забирает самую старую ожидающую задачу и берет на нее аренду.
+    SKIP LOCKED: воркеры не ждут друг друга, каждый берет свою строку.
+    Документ, который уже компилируется на другом воркере, пропускается.
+    """
+    running = aliased(CompileJob)
+    result = await db.execute(
+        select(CompileJob)
+        .where(
+            CompileJob.status == JOB_QUEUED,
+            ~exists().where(running.doc_id == CompileJob.doc_id, running.status == JOB_RUNNING)
+        )
+        .order_by(CompileJob.created_at, CompileJob.job_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalars().first()
+    if job is None:
+        await db.rollback()
+        return None
+
+    job.status = JOB_RUNNING
+    job.worker_id = worker_id
+    job.attempts += 1
+    job.started_at = func.now()
+    job.lease_expires_at = func.now() + timedelta(seconds=settings.COMPILE_JOB_LEASE_SECONDS)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def heartbeat(db: AsyncSession, job_id: int, worker_id: str) -> bool:
+    """Продлевает аренду. False — аренду потеряли (задачу забрал другой воркер)."""
+    result = await db.execute(
+        update(CompileJob)
+        .where(
+            CompileJob.job_id == job_id,
+            CompileJob.worker_id == worker_id,
+            CompileJob.status == JOB_RUNNING
+        )
+        .values(lease_expires_at=func.now() + timedelta(seconds=settings.COMPILE_JOB_LEASE_SECONDS))
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def finish_job(
+    db: AsyncSession,
+    job_id: int,
+    worker_id: str,
+    status: str,
+    error: Optional[str] = None
+) -> bool:
+    """
+    Закрывает задачу, если аренда еще наша (коммит — на вызывающем,
+    чтобы результат в документ записывался в той же транзакции).
+    """
+    result = await db.execute(
+        update(CompileJob)
+        .where(
+            CompileJob.job_id == job_id,
+            CompileJob.worker_id == worker_id,
+            CompileJob.status == JOB_RUNNING
+        )
+        .values(status=status, error=error, finished_at=func.now(), lease_expires_at=None)
+    )
+    return result.rowcount > 0
+
+
+async def has_newer_job(db: AsyncSession, doc_id: int) -> bool:
+    """Ждет ли документ более новой компиляции (тогда результат текущей не нужен)."""
+    result = await db.execute(
+        select(exists().where(CompileJob.doc_id == doc_id, CompileJob.status == JOB_QUEUED))
+    )
+    return bool(result.scalar())
+
+
+async def requeue_expired(db: AsyncSession) -> int:
+    """
+    Возвращает в очередь задачи, чья аренда истекла (воркер упал или завис).
+    После COMPILE_JOB_MAX_ATTEMPTS попыток задача считается упавшей, а документ — с ошибкой.
+    """
+    result = await db.execute(
+        select(CompileJob)
+        .where(CompileJob.status == JOB_RUNNING, CompileJob.lease_expires_at < func.now())
+        .with_for_update(skip_locked=True)
+    )
+    expired = result.scalars().all()
+
+    for job in expired:
+        if await has_newer_job(db, job.doc_id):
+            # Документ уже ждет более новой компиляции — эту повторять незачем
+            job.status = JOB_FAILED
+            job.error = "Аренда истекла, задача заменена более новой"
+        elif job.attempts >= settings.COMPILE_JOB_MAX_ATTEMPTS:
+            job.status = JOB_FAILED
+            job.error = f"Аренда истекла {job.attempts} раз(а), задача снята"
+            await db.execute(
+                update(Document)
+                .where(Document.doc_id == job.doc_id)
+                .values(
+                    compilation_status="error",
+                    compilation_diagnostics=None
+                )
+            )
+            await record_run(db, job.doc_id, RUN_ERROR, f"Системная ошибка: {job.error}")
+        else:
+            job.status = JOB_QUEUED
+        job.worker_id = None
+        job.lease_expires_at = None
+        if job.status == JOB_FAILED:
+            job.finished_at = func.now()
+        logger.warning(f"Задача компиляции {job.job_id} (документ {job.doc_id}) потеряла аренду: {job.status}")
+
+    await db.commit()
+    return len(expired)
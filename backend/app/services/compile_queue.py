@@ -0,0 +1,186 @@
+# app/services/compile_queue.py
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CompileQueueFull(Exception):
+    """Очередь компиляции переполнена — новую задачу принять нельзя."""
+
+
+class CompileBusy(Exception):
+    """По этому ключу уже есть задача (новый предпросмотр до ответа на прошлый)."""
+
+
+class SubmitResult(NamedTuple):
+    position: int     # 0 — уже компилируется, 1.. — место в очереди
+    generation: int   # номер версии задачи документа (для отсева устаревших результатов)
+    joined: bool      # True — присоединились к уже поставленной задаче с тем же исходником
+
+
+class CompileQueue:
+    """
+    Ограниченная очередь задач компиляции.
+
+    Одновременно работает не больше `workers` процессов TeX (у каждого воркера
+    свой поток в выделенном пуле), а ожидающих задач не больше `max_pending`.
+    Все, что сверх этого, отклоняется сразу, а не копится в памяти.
+
+    На документ в очереди не больше одной задачи: повторный запрос с тем же исходником
+    присоединяется к ней, а с новым — заменяет ожидающую задачу (сохраняя ее место).
+    Результат уже запущенной устаревшей задачи не публикуется (см. is_current).
+    Синхронные задачи (предпросмотр) идут через ту же очередь (run) под своим ключом,
+    например ("preview", doc_id), и ждут результат.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="latex-compile")
+        self._queue: Optional[asyncio.Queue] = None
+        self._order: List[Hashable] = []  # doc_id ожидающих задач в порядке очереди
+        # doc_id -> (generation, source_hash, job)
+        self._pending: Dict[Hashable, Tuple[int, str, Callable[[int], Awaitable[Any]]]] = {}
+        self._running: Dict[Hashable, Tuple[int, str]] = {}  # doc_id -> (generation, source_hash)
+        # Последняя выданная версия задачи документа. Ключ удаляется, когда у документа
+        # не остается задач; номера берутся из общего счетчика и после удаления не повторяются
+        self._generation: Dict[Hashable, int] = {}
+        self._generations = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Запускает воркеры (вызывается на старте приложения)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"Очередь компиляции запущена: воркеров {self.workers}, мест {self.max_pending}")
+
+    async def stop(self) -> None:
+        """Останавливает воркеры и пул потоков."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self,
+        doc_id: Hashable,
+        source_hash: str,
+        job: Callable[[int], Awaitable[Any]]
+    ) -> SubmitResult:
+        """
+        Ставит задачу компиляции документа в очередь. job получает номер версии задачи.
+        Бросает CompileQueueFull, если мест нет.
+        """
+        if self._queue is None:
+            raise RuntimeError("Очередь компиляции не запущена")
+
+        pending = self._pending.get(doc_id)
+        if pending is not None:
+            generation, pending_hash, _ = pending
+            position = self._order.index(doc_id) + 1
+            if pending_hash == source_hash:
+                return SubmitResult(position, generation, True)
+            # Исходник изменился, а старая задача еще не начата — просто подменяем ее
+            generation = self._next_generation(doc_id)
+            self._pending[doc_id] = (generation, source_hash, job)
+            return SubmitResult(position, generation, False)
+
+        running = self._running.get(doc_id)
+        if running is not None and running[1] == source_hash:
+            return SubmitResult(0, running[0], True)
+
+        try:
+            self._queue.put_nowait(doc_id)
+        except asyncio.QueueFull:
+            raise CompileQueueFull(f"В очереди уже {self.max_pending} задач")
+        # Если документ сейчас компилируется со старым исходником, та задача станет устаревшей
+        generation = self._next_generation(doc_id)
+        self._pending[doc_id] = (generation, source_hash, job)
+        self._order.append(doc_id)
+        return SubmitResult(len(self._order), generation, False)
+
+    def is_current(self, doc_id: int, generation: int) -> bool:
+        """Можно ли публиковать результат задачи (нет ли более новой версии)."""
+        return self._generation.get(doc_id) == generation
+
+    def position(self, doc_id: int) -> Optional[int]:
+        """Позиция документа в очереди: 0 — компилируется сейчас, None — задач нет."""
+        if doc_id in self._pending:
+            return self._order.index(doc_id) + 1
+        if doc_id in self._running:
+            return 0
+        return None
+
+    async def run(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет блокирующий вызов как задачу очереди и возвращает его результат.
+        Ограничения те же, что у submit: нет мест — CompileQueueFull; по ключу уже
+        есть задача — CompileBusy.
+        """
+        if key in self._pending or key in self._running:
+            raise CompileBusy(f"Задача {key} уже в очереди")
+        future = asyncio.get_running_loop().create_future()
+
+        async def job(generation: int) -> None:
+            try:
+                result = await self.run_blocking(func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Клиент мог не дождаться ответа
+            if not future.done():
+                future.set_result(result)
+
+        self.submit(key, "", job)
+        return await future
+
+    async def run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет блокирующий вызов (запуск TeX) в пуле компиляции."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": len(self._order),
+            "running": len(self._running),
+        }
+
+    def _next_generation(self, doc_id: Hashable) -> int:
+        generation = next(self._generations)
+        self._generation[doc_id] = generation
+        return generation
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            doc_id = await self._queue.get()
+            self._order.remove(doc_id)
+            generation, source_hash, job = self._pending.pop(doc_id)
+            self._running[doc_id] = (generation, source_hash)
+            try:
+                await job(generation)
+            except Exception as e:
+                logger.error(f"Воркер {worker_id}: ошибка задачи документа {doc_id}: {e}", exc_info=True)
+            finally:
+                if self._running.get(doc_id, (None,))[0] == generation:
+                    del self._running[doc_id]
+                # Задач документа больше нет — его версия не нужна
+                if (doc_id not in self._pending and doc_id not in self._running
+                        and self.is_current(doc_id, generation)):
+                    del self._generation[doc_id]
+                self._queue.task_done()
+
+
+compile_queue = CompileQueue(settings.COMPILE_WORKERS, settings.COMPILE_QUEUE_MAX_PENDING)
@@ -0,0 +1,57 @@
+# app/services/compile_runs.py
+import zlib
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import CompileRun
+
+RUN_SUCCESS = "success"
+RUN_ERROR = "error"
+
+
+def compress_log(log: str) -> bytes:
+    # Лог xelatex — повторяющийся текст, zlib сжимает его в 5-10 раз
+    return zlib.compress(log.encode("utf-8"), 6)
+
+
+def decompress_log(data: Optional[bytes]) -> str:
+    if not data:
+        return ""
+    return zlib.decompress(data).decode("utf-8", errors="replace")
+
+
+async def record_run(db: AsyncSession, doc_id: int, status: str, log: str) -> CompileRun:
+    """
+    Сохраняет итог компиляции с полным логом и удаляет запуски документа старше
+    COMPILE_RUNS_KEEP последних. Коммит — на вызывающем.
+    """
+    run = CompileRun(
+        doc_id=doc_id,
+        status=status,
+        log_compressed=compress_log(log),
+        log_size=len(log.encode("utf-8"))
+    )
+    db.add(run)
+    await db.flush()
+
+    keep = select(CompileRun.run_id).where(CompileRun.doc_id == doc_id) \
+        .order_by(CompileRun.run_id.desc()).limit(settings.COMPILE_RUNS_KEEP)
+    await db.execute(
+        delete(CompileRun).where(
+            CompileRun.doc_id == doc_id,
+            CompileRun.run_id.not_in(keep.scalar_subquery())
+        )
+    )
+    return run
+
+
+async def get_run(db: AsyncSession, doc_id: int, run_id: Optional[int] = None) -> Optional[CompileRun]:
+    """Запуск компиляции документа: указанный или последний."""
+    query = select(CompileRun).where(CompileRun.doc_id == doc_id)
+    if run_id is not None:
+        query = query.where(CompileRun.run_id == run_id)
+    result = await db.execute(query.order_by(CompileRun.run_id.desc()).limit(1))
+    return result.scalars().first()
@@ -6,22 +6,66 @@ import shutil
 import sys
 import platform
 from pathlib import Path
-from typing import Tuple, Optional, List
+from typing import Any, Callable, Dict, Tuple, Optional, List, Sequence
 import re  # <-- ДОБАВИТЬ ЭТО!
 import logging
 import uuid
+import hashlib
+import time
+
+from app.core.config import settings
+from app.services.pdf_cache import pdf_cache
+from app.services.preamble_formats import PreambleFormatCache
+from app.services.toolchain import toolchain
+from app.services.warm_workers import WarmWorkerManager
+from app.services.workspaces import BuildWorkspaces
+from app.services.latex_log_parser import parse_log_file
+from app.services.process_limits import ProcessLimitExceeded, collect_output, start_limited_process
+from app.services.partial_compile import split_into_blocks, write_blocks, build_main_file
+from app.services.image_store import image_store, remove_file
+from app.services.latex_scanner import scan_latex
 
 logger = logging.getLogger(__name__)
 
+# Файлы, от которых зависит нужен ли еще один проход TeX
+AUX_EXTENSIONS = (".aux", ".toc", ".out")
+
+# Что вставляется после \documentclass, если в документе нет поддержки русского
+RUSSIAN_SUPPORT_LINES = (
+    "",
+    "% ========== РУССКИЙ ЯЗЫК ==========",
+    "\\usepackage{fontspec}",
+    "\\usepackage{polyglossia}",
+    "\\setmainlanguage{russian}",
+    "\\setotherlanguage{english}",
+    "\\newfontfamily\\russianfont{CMU Serif}",
+    "\\newfontfamily\\russianfonttt{CMU Typewriter Text}",
+    "\\newfontfamily\\russianfontsf{CMU Sans Serif}",
+    "",
+)
+
+# Коды выхода оболочки "команда не найдена" (sh и cmd.exe)
+COMMAND_NOT_FOUND_CODES = (127, 9009)
+
+
+def _images_key(images: Optional[Dict[str, Path]]) -> str:
+    """Часть ключа кэша PDF: имена картинок и их содержимое (имя файла в хранилище — хэш)"""
+    if not images:
+        return ""
+    return "".join(f"\n%img {name}={path.name}" for name, path in sorted(images.items()))
+
+
+def _record_timing(timings: Optional[Dict[str, float]], phase: str, started: float) -> None:
+    """Добавляет длительность этапа компиляции (секунды), если замер включен"""
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
 class CompilerService:
     """Сервис для компиляции LaTeX в PDF"""
     
     @staticmethod
-    def _get_safe_temp_dir() -> Path:
-        """
-        Создает безопасную временную директорию без проблемных символов.
-        Работает как в Windows, так и в Docker/Linux.
-        """
+    def _get_temp_root() -> Path:
+        """Корневая папка для временных файлов LaTeX (без проблемных символов в пути)."""
         if platform.system() == "Windows":
             # На Windows избегаем путей с ~
             temp_parent = Path("C:/Temp/latex_temp")
@@ -32,6 +76,15 @@ class CompilerService:
             # В Docker/Linux используем /tmp
             temp_parent = Path("/tmp") / "latex_temp"
         
+        return temp_parent
+    
+    @staticmethod
+    def _get_safe_temp_dir() -> Path:
+        """
+        Создает безопасную временную директорию без проблемных символов.
+        Работает как в Windows, так и в Docker/Linux.
+        """
+        temp_parent = CompilerService._get_temp_root()
         temp_parent.mkdir(exist_ok=True, parents=True)
         
         temp_dir = temp_parent / str(uuid.uuid4())[:8]
@@ -42,34 +95,14 @@ class CompilerService:
     
     @staticmethod
     def verify_compiler_available(compiler: str = "xelatex") -> Tuple[bool, str]:
-        """Проверяет доступность компилятора LaTeX."""
-        if platform.system() == "Windows":
-            compiler_cmd = f"{compiler}.exe"
-        else:
-            compiler_cmd = compiler
-        
-        try:
-            result = subprocess.run(
-                [compiler_cmd, "--version"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=5,
-                shell=True  # Для Windows нужен shell=True
-            )
-            
-            if result.returncode == 0:
-                version_line = result.stdout.split('\n')[0] if result.stdout else "unknown"
-                return True, f"TeX Live {compiler}: {version_line[:80]}"
-            else:
-                return False, f"Компилятор не работает: {result.stderr[:100]}"
-                
-        except FileNotFoundError:
-            return False, f"Компилятор '{compiler}' не найден."
-        except subprocess.TimeoutExpired:
-            return False, "Проверка превысила время ожидания"
-        except Exception as e:
-            return False, f"Ошибка: {str(e)}"
+        """Проверяет доступность компилятора LaTeX (результат кэшируется в реестре движков)."""
+        return toolchain.verify(compiler)
+    
+    @staticmethod
+    def invalidate_template(template_id: int) -> None:
+        """Сбрасывает всё, что построено на преамбуле шаблона: форматы и теплые воркеры."""
+        warm_workers.drop_template(template_id)
+        preamble_formats.invalidate(template_id)
     
     @staticmethod
     def _wrap_latex_with_russian_support(latex_content: str) -> str:
@@ -77,44 +110,16 @@ class CompilerService:
         Оборачивает LaTeX контент в минимальный документ с поддержкой русского языка.
         Если документ уже содержит \documentclass, оставляем как есть.
         """
+        scan = scan_latex(latex_content)
+        
         # Проверяем, есть ли уже \documentclass в контенте
-        if "\\documentclass" in latex_content:
+        if scan.has_documentclass:
             # Проверяем, есть ли уже поддержка русского
-            if "\\usepackage[english,russian]{babel}" in latex_content or \
-               "\\usepackage{polyglossia}" in latex_content or \
-               "\\usepackage[utf8]{inputenc}" in latex_content:
+            if scan.has_russian_support:
                 return latex_content
-            else:
-                # Вставляем поддержку русского после \documentclass
-                lines = latex_content.split('\n')
-                result_lines = []
-                documentclass_added = False
-                russian_support_added = False
-                
-                for line in lines:
-                    result_lines.append(line)
-                    if "\\documentclass" in line and not documentclass_added:
-                        # Добавляем поддержку русского после \documentclass
-                        result_lines.extend([
-                            "",
-                            "% ========== РУССКИЙ ЯЗЫК ==========",
-                            "\\usepackage{fontspec}",
-                            "\\usepackage{polyglossia}",
-                            "\\setmainlanguage{russian}",
-                            "\\setotherlanguage{english}",
-                            "\\newfontfamily\\russianfont{CMU Serif}",
-                            "\\newfontfamily\\russianfonttt{CMU Typewriter Text}",
-                            "\\newfontfamily\\russianfontsf{CMU Sans Serif}",
-                            ""
-                        ])
-                        documentclass_added = True
-                        russian_support_added = True
-                
-                if not russian_support_added:
-                    # Если не нашли где вставить, добавляем в начало
-                    return latex_content
-                
-                return '\n'.join(result_lines)
+            # Вставляем поддержку русского после строки с \documentclass
+            end = scan.documentclass_line_end
+            return latex_content[:end] + "\n" + "\n".join(RUSSIAN_SUPPORT_LINES) + latex_content[end:]
         else:
             # Если нет \documentclass, создаем минимальный документ
             minimal_template = r"""\documentclass{article}
@@ -137,87 +142,304 @@ class CompilerService:
 \end{document}"""
             return minimal_template
     
+    @staticmethod
+    def _hash_aux_files(temp_dir: Path) -> str:
+        """
+        Хэш вспомогательных файлов (.aux, .toc, .out), включая .aux блоков при \\include.
+        Если после прохода он не изменился — ссылки, оглавление и закладки сошлись.
+        """
+        digest = hashlib.sha256()
+        for aux_file in CompilerService._aux_files(temp_dir):
+            digest.update(aux_file.name.encode())
+            digest.update(aux_file.read_bytes())
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _aux_files(temp_dir: Path) -> List[Path]:
+        files = [temp_dir / f"document{ext}" for ext in AUX_EXTENSIONS]
+        files += temp_dir.glob("block_*.aux")
+        return sorted(f for f in files if f.exists())
+    
+    @staticmethod
+    def _read_diagnostics(temp_dir: Path) -> List[Dict[str, Any]]:
+        """Структурированные сообщения из document.log (ошибки, предупреждения, badbox)."""
+        diagnostics, _ = parse_log_file(
+            temp_dir / "document.log",
+            ring_size=settings.LATEX_LOG_RING_LINES,
+            max_diagnostics=settings.LATEX_MAX_DIAGNOSTICS
+        )
+        return diagnostics
+    
+    @staticmethod
+    def _clear_aux_files(temp_dir: Path) -> None:
+        for aux_file in CompilerService._aux_files(temp_dir):
+            aux_file.unlink()
+    
+    @staticmethod
+    def _tex_env(fmt_name: Optional[str] = None) -> dict:
+        """
+        Окружение TeX. SOURCE_DATE_EPOCH фиксирует дату создания и /ID в PDF:
+        одинаковый исходник дает побайтно одинаковый PDF (и один файл в хранилище).
+        \\today от него не зависит — для этого нужен еще FORCE_SOURCE_DATE.
+        """
+        env = preamble_formats.env_for() if fmt_name else dict(os.environ)
+        env["SOURCE_DATE_EPOCH"] = str(settings.PDF_SOURCE_DATE_EPOCH)
+        return env
+    
+    @staticmethod
+    def _run_compiler_pass(
+        compiler: str,
+        temp_dir: Path,
+        tex_file: Path,
+        fmt_name: Optional[str] = None,
+        template_id: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        extra_files: Sequence[str] = ()
+    ) -> subprocess.CompletedProcess:
+        """
+        Один запуск TeX над document.tex (с предкомпилированным форматом, если он есть).
+        С форматом сначала пробуем свободный теплый воркер шаблона
+        (extra_files — подключенные картинки, которые нужны и в папке воркера).
+        """
+        env = CompilerService._tex_env(fmt_name)
+        
+        if fmt_name and template_id is not None:
+            engine = toolchain.get(compiler)
+            if engine is not None:
+                result = warm_workers.run_pass(
+                    template_id, fmt_name, engine.path, env, temp_dir,
+                    timeout=settings.LATEX_TIMEOUT_SECONDS,
+                    extra_files=extra_files,
+                    on_line=on_line
+                )
+                if result is not None:
+                    return result
+        
+        if platform.system() == "Windows":
+            # Для Windows: используем shell=True и команду как строку
+            fmt_arg = f' -fmt={fmt_name}' if fmt_name else ''
+            cmd_str = f'cd /d "{temp_dir}" && {compiler}.exe{fmt_arg} -interaction=nonstopmode -halt-on-error -output-directory "{temp_dir}" document.tex'
+            return CompilerService._run_streaming(
+                cmd_str, temp_dir, env, True, settings.LATEX_TIMEOUT_SECONDS, on_line
+            )
+        
+        # Для Linux/Docker
+        cmd = [compiler]
+        if fmt_name:
+            cmd.append(f"-fmt={fmt_name}")
+        cmd += [
+            "-interaction=nonstopmode",
+            "-halt-on-error",
+            "-output-directory", str(temp_dir),
+            str(tex_file)
+        ]
+        return CompilerService._run_streaming(
+            cmd, temp_dir, env, False, settings.LATEX_TIMEOUT_SECONDS, on_line
+        )
+    
+    @staticmethod
+    def _run_streaming(
+        cmd,
+        cwd: Path,
+        env: Optional[dict],
+        shell: bool,
+        timeout: int,
+        on_line: Optional[Callable[[str], None]] = None
+    ) -> subprocess.CompletedProcess:
+        """
+        Аналог subprocess.run(capture_output=True), но stdout читается построчно
+        и каждая строка сразу отдается в on_line (для живого лога в редакторе).
+        """
+        process = start_limited_process(
+            cmd,
+            cwd=cwd,
+            env=env,
+            shell=shell,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+        return collect_output(process, cmd, timeout, on_line)
+    
     @staticmethod
     def compile_latex_to_pdf(
         latex_content: str,
         compiler: str = "xelatex",
-        max_runs: int = 2
-    ) -> Tuple[Optional[bytes], str]:
+        max_runs: Optional[int] = None,
+        template_id: Optional[int] = None,
+        template_latex: Optional[str] = None,
+        doc_id: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        images: Optional[Dict[str, Path]] = None
+    ) -> Tuple[Optional[bytes], str, List[Dict[str, Any]]]:
         """
         Компилирует LaTeX код в PDF.
+        Возвращает PDF (или None), текстовый лог и структурированные диагностики из .log.
+        С doc_id сборка идет в постоянной папке документа, где сохраняются .aux/.toc/.out.
+        Проходы повторяются, только пока меняются .aux/.toc/.out (не больше max_runs).
+        Если передан шаблон документа и преамбула совпадает с ним,
+        компилирует с предкомпилированным форматом преамбулы.
+        progress получает события хода компиляции (номер прохода, строки лога).
+        В timings (если передан) записывается длительность этапов в секундах.
+        images — картинки документа (имя в \\includegraphics -> файл в хранилище),
+        они подключаются в папку сборки ссылками.
         """
         log_output = []
+        if max_runs is None:
+            max_runs = settings.LATEX_MAX_RUNS
+        max_runs = max(1, max_runs)
+        
+        # Добавляем поддержку русского языка
+        started = time.perf_counter()
+        latex_content_with_russian = CompilerService._wrap_latex_with_russian_support(latex_content)
+        _record_timing(timings, "wrap", started)
+        cache_source = latex_content_with_russian + _images_key(images)
+        
+        # Ищем готовый PDF в кэше: тот же исходник + тот же движок = тот же результат.
+        # До проверки компилятора: попадание в кэш не запускает ни одного процесса
+        known_engine = toolchain.known(compiler)
+        if known_engine is not None:
+            cache_key = pdf_cache.make_key(cache_source, compiler, known_engine)
+            cached = CompilerService._cached_result(cache_key, known_engine, log_output)
+            if cached is not None:
+                return cached
         
         # Проверяем доступность компилятора
         available, message = CompilerService.verify_compiler_available(compiler)
         if not available:
             log_output.append(f"❌ {message}")
-            return None, "\n".join(log_output)
+            return None, "\n".join(log_output), []
         
         log_output.append(f"✅ {message}")
         
-        # Добавляем поддержку русского языка
-        latex_content_with_russian = CompilerService._wrap_latex_with_russian_support(latex_content)
+        if message != known_engine:
+            # Движок проверялся впервые или сменился — ключ с его текущей версией
+            cache_key = pdf_cache.make_key(cache_source, compiler, message)
+            cached = CompilerService._cached_result(cache_key, None, log_output)
+            if cached is not None:
+                return cached
         
         # Проверяем наличие кириллицы в тексте
-        has_cyrillic = bool(re.search('[а-яА-Я]', latex_content))
-        if has_cyrillic:
+        if scan_latex(latex_content).has_cyrillic:
             log_output.append("🔤 Обнаружен русский текст, добавляется поддержка кириллицы")
         
+        # Предкомпилированная преамбула шаблона (если документ ее не менял)
+        fmt_name = None
+        if template_id is not None and template_latex:
+            fmt_name = preamble_formats.get_format(
+                template_id, template_latex, latex_content_with_russian, compiler
+            )
+            if fmt_name:
+                log_output.append(f"⚡ Используется формат преамбулы: {fmt_name}")
+        
+        # Постоянная папка документа (с .aux прошлой сборки) или временная
+        if doc_id is not None:
+            with workspaces.acquire(doc_id) as workspace:
+                log_output.append(f"📁 Папка сборки документа: {workspace}")
+                return CompilerService._compile_in_dir(
+                    workspace, latex_content_with_russian, compiler, max_runs,
+                    fmt_name, template_id, cache_key, log_output, progress, timings, images
+                )
+        
         # Создаем безопасную временную директорию
         temp_dir = CompilerService._get_safe_temp_dir()
-        
+        return CompilerService._compile_in_dir(
+            temp_dir, latex_content_with_russian, compiler, max_runs,
+            fmt_name, template_id, cache_key, log_output, progress, timings, images
+        )
+    
+    @staticmethod
+    def _cached_result(
+        cache_key: str,
+        engine: Optional[str],
+        log_output: List[str]
+    ) -> Optional[Tuple[bytes, str, List[Dict[str, Any]]]]:
+        """Результат из кэша PDF в формате compile_latex_to_pdf (None — промах)."""
+        cached = pdf_cache.get(cache_key)
+        if cached is None:
+            return None
+        cached_pdf, cached_diagnostics = cached
+        if engine is not None:
+            log_output.append(f"✅ {engine}")
+        log_output.append(f"♻️ PDF взят из кэша: {len(cached_pdf)} байт")
+        return cached_pdf, "\n".join(log_output), cached_diagnostics
+    
+    @staticmethod
+    def _compile_in_dir(
+        temp_dir: Path,
+        latex_content_with_russian: str,
+        compiler: str,
+        max_runs: int,
+        fmt_name: Optional[str],
+        template_id: Optional[int],
+        cache_key: str,
+        log_output: List[str],
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        images: Optional[Dict[str, Path]] = None
+    ) -> Tuple[Optional[bytes], str, List[Dict[str, Any]]]:
+        """Проходы TeX в заданной папке, чтение готового PDF и разбор .log."""
         try:
             # Создаем .tex файл
+            started = time.perf_counter()
             tex_file = temp_dir / "document.tex"
-            tex_file.write_text(latex_content_with_russian, encoding='utf-8')
+            if fmt_name:
+                # С форматом часть преамбулы после \endofdump выполняется заново (шрифты)
+                tex_file.write_text(
+                    PreambleFormatCache.with_end_of_dump(latex_content_with_russian), encoding='utf-8'
+                )
+            else:
+                tex_file.write_text(latex_content_with_russian, encoding='utf-8')
             log_output.append(f"📄 Файл создан: {tex_file}")
             
+            # Лог прошлой сборки тоже: если проход упадет раньше, чем TeX напишет новый
+            # (лимит времени, пропавший движок), диагностика покажет чужие ошибки
+            (temp_dir / "document.log").unlink(missing_ok=True)
+            
+            # PDF прошлой сборки не должен выдаваться за результат этой
+            for old_pdf in temp_dir.glob("*.pdf"):
+                # Подключенные PDF-картинки не трогаем
+                if not images or old_pdf.name not in images:
+                    remove_file(old_pdf)
+            
+            # Картинки — ссылками на хранилище, без копирования
+            linked_images = image_store.materialize(temp_dir, images) if images else []
+            if linked_images:
+                log_output.append(f"🖼️ Подключено картинок: {len(linked_images)}")
+            _record_timing(timings, "write", started)
+            
             # Компилируем (на Windows используем shell=True)
-            for i in range(max_runs):
-                if platform.system() == "Windows":
-                    # Для Windows: используем shell=True и команду как строку
-                    cmd_str = f'cd /d "{temp_dir}" && {compiler}.exe -interaction=nonstopmode -halt-on-error -output-directory "{temp_dir}" document.tex'
-                    
-                    log_output.append(f"=== Запуск {i+1}/{max_runs} ===")
-                    
-                    try:
-                        result = subprocess.run(
-                            cmd_str,
-                            shell=True,
-                            capture_output=True,
-                            text=True,
-                            encoding='utf-8',
-                            timeout=30
-                        )
-                    except Exception as e:
-                        log_output.append(f"💥 Исключение: {str(e)}")
-                        return None, "\n".join(log_output)
-                else:
-                    # Для Linux/Docker
-                    cmd = [
-                        compiler,
-                        "-interaction=nonstopmode",
-                        "-halt-on-error",
-                        "-output-directory", str(temp_dir),
-                        str(tex_file)
-                    ]
-                    
-                    log_output.append(f"=== Запуск {i+1}/{max_runs} ===")
-                    
-                    try:
-                        result = subprocess.run(
-                            cmd,
-                            cwd=temp_dir,
-                            capture_output=True,
-                            text=True,
-                            encoding='utf-8',
-                            timeout=30,
-                            shell=False
-                        )
-                    except Exception as e:
-                        log_output.append(f"💥 Исключение: {str(e)}")
-                        return None, "\n".join(log_output)
+            started = time.perf_counter()
+            aux_hash = CompilerService._hash_aux_files(temp_dir)
+            i = 0
+            while i < max_runs:
+                log_output.append(f"=== Запуск {i+1}/{max_runs} ===")
+                if progress is not None:
+                    progress({"status": "compiling", "pass": i + 1, "max_runs": max_runs})
+                
+                try:
+                    result = CompilerService._run_compiler_pass(
+                        compiler, temp_dir, tex_file, fmt_name, template_id,
+                        on_line=(lambda line: progress({"status": "log", "line": line[:200]})) if progress else None,
+                        extra_files=linked_images
+                    )
+                except FileNotFoundError as e:
+                    # Движок пропал (обновили/удалили TeX Live) — перепроверим при следующем запросе
+                    toolchain.invalidate()
+                    log_output.append(f"💥 Компилятор не найден: {str(e)}")
+                    return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
+                except (subprocess.TimeoutExpired, ProcessLimitExceeded) as e:
+                    # Процесс убит по лимиту — его .aux может быть недописан
+                    CompilerService._clear_aux_files(temp_dir)
+                    log_output.append(f"⏱️ Компиляция остановлена по лимиту: {str(e)}")
+                    return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
+                except Exception as e:
+                    log_output.append(f"💥 Исключение: {str(e)}")
+                    return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
                 
                 # Логируем вывод
                 if result.stdout:
@@ -233,36 +455,132 @@ class CompilerService:
                             log_output.append(f"  ⚠️ {line[:200]}")
                 
                 if result.returncode != 0:
+                    if fmt_name:
+                        # С форматом не получилось — повторяем обычной компиляцией с первого прохода
+                        log_output.append("↩️ Компиляция с форматом не удалась, повтор без формата")
+                        fmt_name = None
+                        tex_file.write_text(latex_content_with_russian, encoding='utf-8')
+                        aux_hash = CompilerService._hash_aux_files(temp_dir)
+                        i = 0
+                        continue
+                    if result.returncode in COMMAND_NOT_FOUND_CODES:
+                        toolchain.invalidate()
+                    # Испорченный .aux может ломать и следующие сборки — начинаем с чистого листа
+                    CompilerService._clear_aux_files(temp_dir)
                     log_output.append(f"❌ Ошибка компиляции (код: {result.returncode})")
                     if result.stderr:
                         log_output.append(f"Детали: {result.stderr[:500]}")
-                    return None, "\n".join(log_output)
+                    return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
+                
+                i += 1
+                
+                # Если вспомогательные файлы не изменились — следующий проход ничего не даст
+                new_aux_hash = CompilerService._hash_aux_files(temp_dir)
+                if new_aux_hash == aux_hash:
+                    break
+                aux_hash = new_aux_hash
+            
+            log_output.append(f"🔁 Выполнено проходов: {i} (максимум {max_runs})")
+            _record_timing(timings, "passes", started)
             
             # Ищем PDF файл
+            started = time.perf_counter()
             pdf_file = temp_dir / "document.pdf"
             if pdf_file.exists():
                 pdf_content = pdf_file.read_bytes()
                 log_output.append(f"✅ PDF создан: {len(pdf_content)} байт")
+                diagnostics = CompilerService._read_diagnostics(temp_dir)
+                pdf_cache.put(cache_key, pdf_content, diagnostics)
+                _record_timing(timings, "read_back", started)
                 
-                return pdf_content, "\n".join(log_output)
+                return pdf_content, "\n".join(log_output), diagnostics
             
             # Ищем PDF с другим именем
             pdf_files = list(temp_dir.glob("*.pdf"))
             if pdf_files:
                 pdf_content = pdf_files[0].read_bytes()
                 log_output.append(f"✅ PDF найден: {pdf_files[0].name}")
-                return pdf_content, "\n".join(log_output)
+                diagnostics = CompilerService._read_diagnostics(temp_dir)
+                pdf_cache.put(cache_key, pdf_content, diagnostics)
+                _record_timing(timings, "read_back", started)
+                return pdf_content, "\n".join(log_output), diagnostics
         
         except Exception as e:
             log_output.append(f"💥 Общее исключение: {str(e)}")
-            return None, "\n".join(log_output)
+            return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
         
         finally:
             # Временно оставляем папку для отладки
             pass
         
         log_output.append("❌ PDF не был создан")
-        return None, "\n".join(log_output)
+        return None, "\n".join(log_output), CompilerService._read_diagnostics(temp_dir)
+    
+    @staticmethod
+    def compile_preview(
+        latex_content: str,
+        doc_id: int,
+        blocks: Optional[List[int]] = None,
+        compiler: str = "xelatex",
+        max_runs: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        images: Optional[Dict[str, Path]] = None
+    ) -> Tuple[Optional[bytes], str, List[Dict[str, Any]]]:
+        """
+        Быстрый предпросмотр отдельных блоков документа.
+        Документ делится по \\section на файлы и собирается через \\includeonly:
+        верстаются только запрошенные (и измененные) блоки, а нумерация и ссылки
+        остальных берутся из их .aux, сохраненных в папке предпросмотра.
+        Если делить нечего — обычная компиляция.
+        """
+        if max_runs is None:
+            max_runs = settings.LATEX_MAX_RUNS
+        max_runs = max(1, max_runs)
+        
+        latex_content_with_russian = CompilerService._wrap_latex_with_russian_support(latex_content)
+        split = split_into_blocks(latex_content_with_russian)
+        if split is None:
+            return CompilerService.compile_latex_to_pdf(
+                latex_content, compiler, max_runs, doc_id=doc_id, progress=progress, images=images
+            )
+        
+        log_output = []
+        requested = set(blocks) if blocks else set(range(len(split.blocks)))
+        
+        with preview_workspaces.acquire(doc_id) as workspace:
+            included = write_blocks(workspace, split, requested)
+            main_latex = build_main_file(split, included)
+            log_output.append(
+                f"🧩 Предпросмотр: блоков {len(included)} из {len(split.blocks)} "
+                f"({', '.join(str(i) for i in included)})"
+            )
+            
+            # Ключ кэша учитывает и набор блоков, и их содержимое.
+            # Как и в compile_latex_to_pdf, кэш смотрим до проверки компилятора
+            cache_source = main_latex + "".join(split.blocks) + _images_key(images)
+            known_engine = toolchain.known(compiler)
+            if known_engine is not None:
+                cache_key = pdf_cache.make_key(cache_source, compiler, known_engine)
+                cached = CompilerService._cached_result(cache_key, known_engine, log_output)
+                if cached is not None:
+                    return cached
+            
+            available, message = CompilerService.verify_compiler_available(compiler)
+            if not available:
+                log_output.append(f"❌ {message}")
+                return None, "\n".join(log_output), []
+            log_output.append(f"✅ {message}")
+            
+            if message != known_engine:
+                cache_key = pdf_cache.make_key(cache_source, compiler, message)
+                cached = CompilerService._cached_result(cache_key, None, log_output)
+                if cached is not None:
+                    return cached
+            
+            return CompilerService._compile_in_dir(
+                workspace, main_latex, compiler, max_runs,
+                None, None, cache_key, log_output, progress, images=images
+            )
     
     @staticmethod
     def validate_latex_content(latex_content: str) -> Tuple[bool, str]:
@@ -274,28 +592,17 @@ class CompilerService:
         if not latex_content or not latex_content.strip():
             return False, "Пустой LaTeX контент"
         
+        # Один проход сканера вместо набора регулярных выражений
+        scan = scan_latex(latex_content)
+        
         # Проверяем базовую структуру (если есть \begin{document})
-        if "\\begin{document}" in latex_content and "\\end{document}" not in latex_content:
+        if scan.has_begin_document and not scan.has_end_document:
             return False, "Есть \\begin{document} но нет \\end{document}"
         
-        # ТОЛЬКО САМЫЕ ОПАСНЫЕ КОМАНДЫ:
-        dangerous_patterns = [
-            # Выполнение системных команд
-            r"\\write18\s*{",
-            r"\\immediate\s*\\write18\s*{",
-            
-            # Прямое выполнение кода через \special
-            r"\\special\s*{[^}]*shell[^}]*}",
-            r"\\special\s*{[^}]*exec[^}]*}",
-            
-            # Попытки обхода пути
-            r"\\input\s*{[^}]*\.\.\.[^}]*}",
-            r"\\include\s*{[^}]*\.\.\.[^}]*}",
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, latex_content, re.IGNORECASE):
-                return False, f"Обнаружена опасная команда"
+        # ТОЛЬКО САМЫЕ ОПАСНЫЕ КОМАНДЫ: \write18{, \special{...shell/exec...},
+        # \input{...}/\include{...} с попыткой обхода пути
+        if scan.dangerous is not None:
+            return False, f"Обнаружена опасная команда"
         
         return True, "LaTeX код валиден"
     
@@ -312,4 +619,12 @@ class CompilerService:
         if "\\write18{" in latex_content:
             return False, "Команда \\write18{...} запрещена"
         
-        return True, "LaTeX код валиден"
\ No newline at end of file
+        return True, "LaTeX код валиден"
+
+
+# Форматы преамбул шаблонов живут рядом с временными папками компиляции
+preamble_formats = PreambleFormatCache(CompilerService._get_temp_root() / "formats")
+warm_workers = WarmWorkerManager(CompilerService._get_temp_root() / "warm")
+workspaces = BuildWorkspaces(CompilerService._get_temp_root() / "docs", settings.BUILD_WORKSPACES_MAX)
+# Для предпросмотра блоков отдельные папки: там свой набор .aux по блокам
+preview_workspaces = BuildWorkspaces(CompilerService._get_temp_root() / "preview", settings.BUILD_WORKSPACES_MAX)
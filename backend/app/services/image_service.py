@@ -0,0 +1,110 @@
+import hashlib
+import os
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Document, Image
+from app.services.image_store import image_store, referenced_images
+
+
+async def _lock_content(db: AsyncSession, content_hash: str) -> None:
+    """
+    Блокировка содержимого до конца транзакции (advisory lock PostgreSQL по хэшу):
+    запись файла со строкой Image и проверка ссылок с удалением файла не пересекаются.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(int(content_hash[:15], 16))))
+
+
+class ImageService:
+    """Сервис для картинок пользователей (файлы — в хранилище по хэшу содержимого)"""
+
+    @staticmethod
+    async def save_image(
+        db: AsyncSession,
+        user_id: int,
+        name_img: str,
+        data: bytes,
+        heading_img: Optional[str] = None
+    ) -> Image:
+        """
+        Сохраняет картинку пользователя. Повторная загрузка с тем же именем заменяет
+        прежнюю (документы ссылаются на картинку по имени).
+        """
+        ext = os.path.splitext(name_img)[1]
+        digest = hashlib.sha256(data).hexdigest()
+        # Пока строка не закоммичена, _release не должен удалить только что записанный файл
+        await _lock_content(db, digest)
+        image_store.put(data, ext)
+
+        result = await db.execute(
+            select(Image).where(Image.user_id == user_id, Image.name_img == name_img)
+        )
+        image = result.scalars().first()
+        old_hash = None
+        if image is None:
+            image = Image(user_id=user_id, name_img=name_img)
+            db.add(image)
+        else:
+            old_hash = image.content_hash
+
+        image.content_hash = digest
+        image.url_img = image_store.relative_path(digest, ext)
+        if heading_img is not None:
+            image.heading_img = heading_img
+        await db.commit()
+        await db.refresh(image)
+
+        if old_hash and old_hash != digest:
+            await ImageService._release(db, old_hash, ext)
+        return image
+
+    @staticmethod
+    async def delete_image(db: AsyncSession, image: Image) -> None:
+        content_hash = image.content_hash
+        ext = os.path.splitext(image.name_img or "")[1]
+        await db.delete(image)
+        await db.commit()
+        if content_hash:
+            await ImageService._release(db, content_hash, ext)
+
+    @staticmethod
+    async def _release(db: AsyncSession, content_hash: str, ext: str) -> None:
+        """Удаляет файл из хранилища, если на это содержимое больше никто не ссылается."""
+        await _lock_content(db, content_hash)
+        result = await db.execute(
+            select(func.count()).select_from(Image).where(
+                Image.url_img == image_store.relative_path(content_hash, ext)
+            )
+        )
+        if result.scalar_one() == 0:
+            image_store.remove(content_hash, ext)
+        await db.commit()  # снимает блокировку
+
+    @staticmethod
+    async def resolve_for_document(db: AsyncSession, doc_id: int, latex_content: str) -> Dict[str, Path]:
+        """
+        Картинки владельца документа, на которые ссылается \\includegraphics:
+        путь в LaTeX -> файл в хранилище. Картинка ищется по имени файла,
+        так что figures/logo.png — это загруженная logo.png.
+        """
+        refs = referenced_images(latex_content)
+        if not refs:
+            return {}
+        names = {PurePosixPath(ref).name for ref in refs}
+        result = await db.execute(
+            select(Image.name_img, Image.url_img)
+            .join(Document, Document.user_id == Image.user_id)
+            .where(
+                Document.doc_id == doc_id,
+                Image.name_img.in_(names),
+                Image.content_hash.is_not(None)
+            )
+        )
+        stored = {name: Path("media") / url for name, url in result.all()}
+        return {
+            ref: stored[PurePosixPath(ref).name]
+            for ref in refs if PurePosixPath(ref).name in stored
+        }
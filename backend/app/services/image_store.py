@@ -0,0 +1,205 @@
+# app/services/image_store.py
+import hashlib
+import logging
+import os
+import re
+import shutil
+import stat
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые xelatex вставляет через \includegraphics
+ALLOWED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf")
+
+_INCLUDEGRAPHICS_RE = re.compile(r"\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}")
+_UNSAFE_NAME_CHARS_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Имена, под которыми TeX пишет свои файлы в папке сборки (document.pdf, block_001.aux, ...).
+# Картинка с таким именем была бы жесткой ссылкой на файл хранилища, и TeX перезаписал бы
+# его содержимое для всех пользователей этой картинки
+RESERVED_STEMS = ("document",)
+RESERVED_PREFIXES = ("block_",)
+
+
+def sanitize_image_name(filename: Optional[str], fallback_stem: str = "image") -> Optional[str]:
+    """
+    Имя картинки, под которым на нее ссылаются из LaTeX: только латиница, цифры, _ . -
+    (пробелы и кириллица в именах файлов ломают TeX). Если от имени ничего не осталось —
+    fallback_stem. None — неподдерживаемый формат.
+    """
+    if not filename:
+        return None
+    name = Path(filename).name
+    stem, ext = os.path.splitext(name)
+    ext = ext.lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        return None
+    stem = _UNSAFE_NAME_CHARS_RE.sub("_", stem).strip("._")
+    if not stem.replace("_", ""):
+        stem = fallback_stem
+    return f"{stem}{ext}"
+
+
+def is_reserved_image_name(name: str) -> bool:
+    """Совпадает ли имя (в корне папки сборки) с файлами, которые пишет сам TeX."""
+    stem = os.path.splitext(name)[0].lower()
+    return stem in RESERVED_STEMS or stem.startswith(RESERVED_PREFIXES)
+
+
+def _safe_reference(ref: str) -> Optional[str]:
+    """
+    Путь из \\includegraphics относительно папки сборки (figures/logo.png) или None,
+    если он выходит за ее пределы (абсолютный путь, ..).
+    """
+    path = PurePosixPath(ref.replace("\\", "/"))
+    if not path.parts or path.is_absolute() or ".." in path.parts or ":" in path.parts[0]:
+        return None
+    return path.as_posix()
+
+
+def referenced_images(latex_content: str) -> Set[str]:
+    """
+    Пути файлов, которые может искать \\includegraphics документа, как они записаны
+    в LaTeX (figures/logo.png). Ссылка без расширения дополняется всеми
+    поддерживаемыми — как это делает TeX.
+    """
+    names = set()
+    for match in _INCLUDEGRAPHICS_RE.finditer(latex_content):
+        ref = _safe_reference(match.group(1).strip())
+        if not ref:
+            continue
+        names.add(ref)
+        if not os.path.splitext(ref)[1]:
+            names.update(f"{ref}{ext}" for ext in ALLOWED_EXTENSIONS)
+    return names
+
+
+def remove_file(path: Path, missing_ok: bool = False) -> None:
+    """
+    Удаляет файл, в том числе доступный только для чтения: файлы хранилища read-only,
+    а их жесткие ссылки в папках сборки — тот же файл. Windows такой файл
+    не удаляет, пока с него не снят атрибут "только чтение".
+    """
+    try:
+        path.unlink(missing_ok=missing_ok)
+    except PermissionError:
+        if path.is_symlink():
+            raise
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        path.unlink(missing_ok=missing_ok)
+
+
+def _remove_readonly(func, path, _exc_info) -> None:
+    # Обработчик ошибок rmtree: снимаем "только чтение" и повторяем
+    try:
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        func(path)
+    except OSError:
+        pass
+
+
+def remove_tree(path: Path) -> None:
+    """
+    rmtree(ignore_errors=True), который удаляет и read-only ссылки на картинки
+    хранилища (см. remove_file).
+    """
+    shutil.rmtree(path, onerror=_remove_readonly)
+
+
+def link_file(src: Path, dst: Path) -> str:
+    """
+    Помещает src в dst без копирования: жесткая ссылка, если это одна файловая система,
+    иначе символическая, и только в крайнем случае копия. Возвращает способ.
+    """
+    if dst.is_symlink() or dst.exists():
+        try:
+            if os.path.samefile(src, dst):
+                return "exists"
+        except OSError:
+            pass
+        remove_file(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        os.symlink(src.resolve(), dst)
+        return "symlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+class ImageStore:
+    """
+    Хранилище картинок с адресацией по содержимому.
+
+    Файл лежит один раз под своим sha256 (root/ab/abcdef....png), сколько бы
+    пользователей его ни загрузили — одинаковые логотипы и графики занимают место однажды.
+    Для компиляции картинки не копируются, а подключаются ссылками в папку сборки.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def relative_path(self, digest: str, ext: str) -> str:
+        """Путь относительно media (так хранится в Image.url_img)."""
+        return f"{self.root.name}/{digest[:2]}/{digest}{ext}"
+
+    def path_for(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def put(self, data: bytes, ext: str) -> Tuple[str, Path]:
+        """Сохраняет содержимое (если такого еще нет) и возвращает его хэш и путь."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, ext)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Пишем во временный файл и переименовываем: параллельная загрузка того же
+            # файла не увидит его недописанным
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_bytes(data)
+            # Только чтение: файл подключается в папки сборки жесткими ссылками
+            os.chmod(tmp, 0o444)
+            try:
+                os.replace(tmp, path)
+            except PermissionError:
+                # Windows не заменяет read-only файл: его уже положила параллельная
+                # загрузка того же содержимого, наша копия не нужна
+                if not path.exists():
+                    raise
+                remove_file(tmp)
+                return digest, path
+            logger.info(f"🖼️ Новая картинка в хранилище: {digest[:12]} ({len(data)} байт)")
+        return digest, path
+
+    def remove(self, digest: str, ext: str) -> None:
+        """Удаляет содержимое (вызывать, только когда на него больше никто не ссылается)."""
+        remove_file(self.path_for(digest, ext), missing_ok=True)
+
+    @staticmethod
+    def materialize(workspace: Path, images: Dict[str, Path]) -> List[str]:
+        """
+        Подключает картинки в папку сборки под их путями из LaTeX. Возвращает пути.
+        Имена файлов самого TeX пропускаются (см. RESERVED_STEMS).
+        """
+        linked = []
+        for name, src in images.items():
+            if is_reserved_image_name(name):
+                logger.warning(f"Картинка {name} совпадает с файлом сборки TeX, пропускаем")
+                continue
+            if not src.exists():
+                logger.warning(f"Картинка {name} отсутствует в хранилище: {src}")
+                continue
+            dst = workspace / name
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            link_file(src, dst)
+            linked.append(name)
+        return linked
+
+
+image_store = ImageStore(Path("media") / "images")
@@ -1,16 +1,11 @@
-import subprocess
-import shutil
+from app.services.toolchain import toolchain
 
 def check_latex_availability():
     """
     Проверяет, установлен ли xelatex и доступен ли он в PATH.
+    Результат берется из реестра движков, поэтому повторных запусков xelatex нет.
     """
-    path = shutil.which("xelatex")
-    if path:
-        try:
-            # Пробуем узнать версию
-            result = subprocess.run(["xelatex", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return True, f"Found XeLaTeX at {path}: {result.stdout.splitlines()[0]}"
-        except Exception as e:
-            return False, f"Error running XeLaTeX: {e}"
+    engine = toolchain.get("xelatex")
+    if engine:
+        return True, f"Found XeLaTeX at {engine.path}: {engine.version}"
     return False, "XeLaTeX binary not found in system PATH."
\ No newline at end of file
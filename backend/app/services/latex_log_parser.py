@@ -0,0 +1,165 @@
+# app/services/latex_log_parser.py
+import re
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+# Шаблоны строк .log, по которым распознаются сообщения
+_PACKAGE_MESSAGE = re.compile(r"^(?:Package|Class) (\S+) (Error|Warning|Info): (.*)$")
+_LATEX_MESSAGE = re.compile(r"^LaTeX(?: Font)? (Error|Warning|Info): (.*)$")
+_INPUT_LINE = re.compile(r"on input line (\d+)")
+_SOURCE_LINE = re.compile(r"^l\.(\d+)")
+_BADBOX = re.compile(r"^(Overfull|Underfull) \\[hv]box .*?(?:lines? (\d+)(?:--\d+)?)?$")
+_FILE_OPEN = re.compile(r"\((\.?/?[^\s()]+\.(?:tex|sty|cls|cfg|def|aux|toc|out|fd|clo|ldf))")
+
+
+class LatexLogParser:
+    """
+    Потоковый разбор .log файла TeX в структурированные диагностики.
+
+    Файл читается построчно, в памяти остается только кольцевой буфер последних
+    сырых строк (для контекста) и ограниченный список диагностик.
+    Диагностика: severity (error / warning / badbox), message, line, file, package, context.
+    """
+
+    def __init__(self, ring_size: int = 200, max_diagnostics: int = 200):
+        self.ring: Deque[str] = deque(maxlen=ring_size)
+        self.max_diagnostics = max_diagnostics
+        self.diagnostics: List[Dict[str, Any]] = []
+        self._files: List[str] = []          # Стек открытых TeX файлов (по скобкам)
+        self._pending_error: Optional[Dict[str, Any]] = None
+        self._continuation: Optional[Dict[str, Any]] = None
+
+    def feed(self, lines: Iterable[str]) -> "LatexLogParser":
+        for raw in lines:
+            self.feed_line(raw.rstrip("\r\n"))
+        self._flush_error()
+        return self
+
+    def feed_line(self, line: str) -> None:
+        self.ring.append(line)
+
+        # Продолжение многострочного сообщения пакета: "(hyperref)    текст"
+        if self._continuation is not None:
+            prefix = f"({self._continuation.get('package')})"
+            if self._continuation.get("package") and line.startswith(prefix):
+                self._continuation["message"] += " " + line[len(prefix):].strip()
+                self._update_line_from_text(self._continuation, line)
+                return
+            if line.startswith(" ") and line.strip() and not self._continuation.get("package"):
+                self._continuation["message"] += " " + line.strip()
+                self._update_line_from_text(self._continuation, line)
+                return
+            self._continuation = None
+
+        # Ошибка TeX: "! Сообщение", номер строки придет позже в "l.<номер> ..."
+        if line.startswith("! "):
+            self._flush_error()
+            message = line[2:].strip()
+            package = None
+            match = _PACKAGE_MESSAGE.match(message)
+            if match:
+                package, message = match.group(1), match.group(3)
+            elif message.startswith("LaTeX Error: "):
+                message = message[len("LaTeX Error: "):]
+            self._pending_error = self._make("error", message, package=package)
+            return
+
+        if self._pending_error is not None:
+            match = _SOURCE_LINE.match(line)
+            if match:
+                self._pending_error["line"] = int(match.group(1))
+                self._pending_error["context"] = line[match.end():].strip()[:200] or None
+                self._flush_error()
+                return
+
+        match = _PACKAGE_MESSAGE.match(line)
+        if match:
+            severity = "error" if match.group(2) == "Error" else "warning"
+            if match.group(2) == "Info":
+                self._track_files(line)
+                return
+            diagnostic = self._make(severity, match.group(3), package=match.group(1))
+            self._update_line_from_text(diagnostic, line)
+            self._add(diagnostic)
+            self._continuation = diagnostic
+            return
+
+        match = _LATEX_MESSAGE.match(line)
+        if match:
+            if match.group(1) == "Info":
+                return
+            severity = "error" if match.group(1) == "Error" else "warning"
+            diagnostic = self._make(severity, match.group(2))
+            self._update_line_from_text(diagnostic, line)
+            self._add(diagnostic)
+            self._continuation = diagnostic
+            return
+
+        match = _BADBOX.match(line)
+        if match:
+            diagnostic = self._make("badbox", line.strip())
+            if match.group(2):
+                diagnostic["line"] = int(match.group(2))
+            self._add(diagnostic)
+            return
+
+        self._track_files(line)
+
+    def result(self) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Диагностики и последние сырые строки лога."""
+        return self.diagnostics, list(self.ring)
+
+    def _make(self, severity: str, message: str, package: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "severity": severity,
+            "message": message.strip()[:500],
+            "line": None,
+            "file": self._files[-1] if self._files else None,
+            "package": package,
+            "context": None,
+        }
+
+    def _add(self, diagnostic: Dict[str, Any]) -> None:
+        if len(self.diagnostics) < self.max_diagnostics:
+            self.diagnostics.append(diagnostic)
+        elif diagnostic["severity"] == "error":
+            # Ошибки важнее предупреждений: вытесняем последнее не-ошибочное сообщение
+            for i in range(len(self.diagnostics) - 1, -1, -1):
+                if self.diagnostics[i]["severity"] != "error":
+                    self.diagnostics[i] = diagnostic
+                    break
+
+    def _flush_error(self) -> None:
+        if self._pending_error is not None:
+            self._add(self._pending_error)
+            self._pending_error = None
+
+    @staticmethod
+    def _update_line_from_text(diagnostic: Dict[str, Any], text: str) -> None:
+        match = _INPUT_LINE.search(text)
+        if match:
+            diagnostic["line"] = int(match.group(1))
+
+    def _track_files(self, line: str) -> None:
+        """Грубое отслеживание текущего файла по скобкам "(./file.tex ... )"."""
+        position = 0
+        for match in _FILE_OPEN.finditer(line):
+            closes = line.count(")", position, match.start())
+            for _ in range(min(closes, len(self._files))):
+                self._files.pop()
+            self._files.append(match.group(1))
+            position = match.end()
+        closes = line.count(")", position)
+        for _ in range(min(closes, len(self._files))):
+            self._files.pop()
+
+
+def parse_log_file(log_path: Path, ring_size: int = 200, max_diagnostics: int = 200) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Разбирает .log файл TeX. Если файла нет — пустой результат."""
+    parser = LatexLogParser(ring_size=ring_size, max_diagnostics=max_diagnostics)
+    if not log_path.exists():
+        return parser.result()
+    with open(log_path, "r", encoding="utf-8", errors="replace") as log_file:
+        parser.feed(log_file)
+    return parser.result()
@@ -0,0 +1,125 @@
+# app/services/latex_scanner.py
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Команды, которые интересны валидации и обертке. Остальной текст (а это почти весь
+# документ) регулярное выражение пропускает на стороне C, без работы в Python.
+# Опасные команды ищутся без учета регистра; классы вместо re.IGNORECASE —
+# с флагом на все выражение оно работает в несколько раз медленнее.
+# После опасной команды сразу должен идти аргумент: \includegraphics, \specialrule
+# и т.п. отсеиваются еще в регулярном выражении
+_TOKEN_RE = re.compile(
+    r"\\(?:documentclass|usepackage|begin\{document\}|end\{document\}"
+    r"|(?:[wW][rR][iI][tT][eE]18"
+    r"|[sS][pP][eE][cC][iI][aA][lL]"
+    r"|[iI][nN](?:[pP][uU][tT]|[cC][lL][uU][dD][eE]))(?=[\s{]))"
+)
+_CYRILLIC_RE = re.compile("[а-яА-Я]")
+
+# Пакеты, при которых документу уже не нужна наша поддержка русского языка
+RUSSIAN_SUPPORT_PACKAGES = (
+    "\\usepackage[english,russian]{babel}",
+    "\\usepackage{polyglossia}",
+    "\\usepackage[utf8]{inputenc}",
+)
+
+
+class LatexScan(NamedTuple):
+    documentclass_line_end: Optional[int]  # конец строки с первым \documentclass (куда вставлять пакеты)
+    has_begin_document: bool
+    has_end_document: bool
+    has_russian_support: bool
+    has_cyrillic: bool
+    dangerous: Optional[str]  # первая опасная конструкция или None
+
+    @property
+    def has_documentclass(self) -> bool:
+        return self.documentclass_line_end is not None
+
+
+def _skip_spaces(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _braced_argument(text: str, pos: int) -> Optional[str]:
+    """Содержимое {...} сразу после pos (пробелы допускаются), без вложенных скобок."""
+    pos = _skip_spaces(text, pos)
+    if pos >= len(text) or text[pos] != "{":
+        return None
+    end = text.find("}", pos + 1)
+    if end == -1:
+        return None
+    return text[pos + 1:end]
+
+
+def _check_dangerous(text: str, name: str, end: int) -> bool:
+    """Те же правила, что были в регулярных выражениях validate_latex_content."""
+    if name == "write18":
+        # \write18{ и \immediate\write18{
+        pos = _skip_spaces(text, end)
+        return pos < len(text) and text[pos] == "{"
+    if name == "special":
+        argument = _braced_argument(text, end)
+        if argument is None:
+            return False
+        argument = argument.lower()
+        return "shell" in argument or "exec" in argument
+    if name in ("input", "include"):
+        # Попытки обхода пути
+        argument = _braced_argument(text, end)
+        return argument is not None and "..." in argument
+    return False
+
+
+@lru_cache(maxsize=16)
+def scan_latex(text: str) -> LatexScan:
+    """
+    Один проход по исходнику: все, что нужно валидации, обертке с русским языком
+    и определению кириллицы. Результат кэшируется — обработчик запроса и компиляция
+    обычно сканируют одну и ту же строку.
+    """
+    documentclass_line_end = None
+    has_begin_document = False
+    has_end_document = False
+    has_russian_support = False
+    has_cyrillic = False
+    dangerous = None
+
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        start, end = match.span()
+        # Кириллицу ищем в промежутках между командами, пока не найдем
+        if not has_cyrillic:
+            has_cyrillic = _CYRILLIC_RE.search(text, pos, start) is not None
+        pos = end
+
+        token = match.group()
+        name = token[1:].lower()
+        if token == "\\documentclass":
+            if documentclass_line_end is None:
+                newline = text.find("\n", end)
+                documentclass_line_end = len(text) if newline == -1 else newline
+        elif token == "\\usepackage":
+            if not has_russian_support:
+                has_russian_support = text.startswith(RUSSIAN_SUPPORT_PACKAGES, start)
+        elif token == "\\begin{document}":
+            has_begin_document = True
+        elif token == "\\end{document}":
+            has_end_document = True
+        elif dangerous is None and _check_dangerous(text, name, end):
+            dangerous = text[start:end]
+
+    if not has_cyrillic:
+        has_cyrillic = _CYRILLIC_RE.search(text, pos) is not None
+
+    return LatexScan(
+        documentclass_line_end=documentclass_line_end,
+        has_begin_document=has_begin_document,
+        has_end_document=has_end_document,
+        has_russian_support=has_russian_support,
+        has_cyrillic=has_cyrillic,
+        dangerous=dangerous,
+    )
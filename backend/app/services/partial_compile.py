@@ -0,0 +1,88 @@
+# app/services/partial_compile.py
+import hashlib
+import re
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Set
+
+BEGIN_DOCUMENT = "\\begin{document}"
+END_DOCUMENT = "\\end{document}"
+
+# Граница блока — раздел верхнего уровня (h1 в редакторе превращается в \section)
+_SECTION = re.compile(r"^[ \t]*\\section\*?\s*[\[{]", re.MULTILINE)
+
+
+class SplitDocument(NamedTuple):
+    preamble: str       # всё до \begin{document}
+    blocks: List[str]   # блок 0 — титульник/оглавление, дальше по одному на \section
+    
+
+def split_into_blocks(latex_content: str) -> Optional[SplitDocument]:
+    """
+    Делит документ на блоки по \\section. Возвращает None, если делить нечего
+    (нет \\begin{document}/\\end{document} или нет ни одного раздела).
+    """
+    begin = latex_content.find(BEGIN_DOCUMENT)
+    end = latex_content.rfind(END_DOCUMENT)
+    if begin == -1 or end == -1 or end < begin:
+        return None
+
+    body = latex_content[begin + len(BEGIN_DOCUMENT):end]
+    starts = [m.start() for m in _SECTION.finditer(body)]
+    if not starts:
+        return None
+
+    bounds = [0] + starts + [len(body)]
+    blocks = [body[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+    return SplitDocument(preamble=latex_content[:begin], blocks=blocks)
+
+
+def block_name(index: int) -> str:
+    return f"block_{index:03d}"
+
+
+def write_blocks(workspace: Path, split: SplitDocument, requested: Set[int]) -> List[int]:
+    """
+    Записывает блоки в отдельные файлы и решает, какие из них верстать.
+    Верстаются запрошенные блоки, а также измененные и те, у которых еще нет .aux —
+    иначе нумерация и ссылки в остальных блоках были бы неверны.
+    """
+    included = []
+    for index, content in enumerate(split.blocks):
+        name = block_name(index)
+        tex_file = workspace / f"{name}.tex"
+        hash_file = workspace / f"{name}.hash"
+        aux_file = workspace / f"{name}.aux"
+
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        changed = not hash_file.exists() or hash_file.read_text() != content_hash
+        if changed:
+            tex_file.write_text(content, encoding="utf-8")
+            hash_file.write_text(content_hash)
+
+        if index in requested or changed or not aux_file.exists():
+            included.append(index)
+
+    # Блоки, которых больше нет в документе, не должны попадать в сборку
+    for stale in workspace.glob("block_*.tex"):
+        try:
+            stale_index = int(stale.stem[len("block_"):])
+        except ValueError:
+            continue
+        if stale_index >= len(split.blocks):
+            for ext in (".tex", ".aux", ".hash"):
+                (workspace / f"{stale.stem}{ext}").unlink(missing_ok=True)
+
+    return included
+
+
+def build_main_file(split: SplitDocument, included: List[int]) -> str:
+    """Главный файл: преамбула + \\includeonly + \\include всех блоков по порядку."""
+    only = ",".join(block_name(i) for i in included)
+    includes = "\n".join(f"\\include{{{block_name(i)}}}" for i in range(len(split.blocks)))
+    return (
+        f"{split.preamble.rstrip()}\n"
+        f"\\includeonly{{{only}}}\n"
+        f"{BEGIN_DOCUMENT}\n"
+        f"{includes}\n"
+        f"{END_DOCUMENT}\n"
+    )
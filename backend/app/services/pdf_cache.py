@@ -0,0 +1,87 @@
+# app/services/pdf_cache.py
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PdfCache:
+    """
+    Контентно-адресуемый кэш готовых PDF.
+
+    Ключ — хэш обернутого LaTeX кода, имени компилятора и версии движка,
+    поэтому одинаковые исходники (в том числе у разных студентов) компилируются один раз.
+    Вытеснение — LRU по суммарному размеру PDF в байтах.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Значение: (PDF, диагностики из .log) — предупреждения нужны и при попадании в кэш
+        self._entries: "OrderedDict[str, Tuple[bytes, List[Dict[str, Any]]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()  # Компиляция идет в потоках, а не только в event loop
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(wrapped_latex: str, compiler: str, engine_version: str) -> str:
+        """Строит ключ кэша по исходнику, компилятору и версии движка."""
+        digest = hashlib.sha256()
+        for part in (compiler, engine_version, wrapped_latex):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")  # Разделитель, чтобы части не склеивались
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, List[Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, pdf_content: bytes, diagnostics: Optional[List[Dict[str, Any]]] = None) -> None:
+        size = len(pdf_content)
+        if size > self.max_bytes:
+            # Слишком большой PDF не кэшируем, иначе он вытеснит всё остальное
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+
+            self._entries[key] = (pdf_content, diagnostics or [])
+            self._size += size
+
+            while self._size > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+pdf_cache = PdfCache(settings.PDF_CACHE_MAX_BYTES)
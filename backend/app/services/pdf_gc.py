@@ -0,0 +1,89 @@
+# app/services/pdf_gc.py
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import Document, DocumentRevision
+from app.services.compile_runs import RUN_ERROR, RUN_SUCCESS, record_run
+from app.services.pdf_store import pdf_store
+from app.services.revision_service import RevisionService
+
+# Ссылки на файлы хранилища PDF: их записывает store_compile_result (документ и его версии),
+# а сборщик мусора удаляет файлы, на которые никто не ссылается
+
+logger = logging.getLogger(__name__)
+
+
+async def store_compile_result(
+    db: AsyncSession,
+    doc_id: int,
+    pdf_content: Optional[bytes],
+    log: str,
+    diagnostics: Optional[List[Dict[str, Any]]],
+    latex_hash: Optional[str] = None
+) -> None:
+    """
+    Записывает результат компиляции: PDF в хранилище (по хэшу содержимого)
+    и статус в документ, полный лог — в историю запусков (compile_runs).
+    latex_hash — хэш скомпилированного исходника: PDF привязывается к версиям
+    документа с этим исходником. Прежний PDF документа удалит сборщик мусора,
+    когда на него не останется ссылок. Коммит — на вызывающем.
+    """
+    if pdf_content:
+        _, pdf_path = pdf_store.put(pdf_content)
+
+        # Обновляем документ в БД (сохраняем относительный путь)
+        await db.execute(
+            update(Document)
+            .where(Document.doc_id == doc_id)
+            .values(
+                pdf_path=pdf_path,
+                compilation_status="success",
+                compilation_diagnostics=diagnostics,
+                pdf_generated_at=func.now()
+            )
+        )
+        await record_run(db, doc_id, RUN_SUCCESS, log)
+        if latex_hash:
+            await RevisionService.link_pdf(db, doc_id, latex_hash, pdf_path)
+        logger.info(f"PDF успешно создан для документа {doc_id}: {pdf_path}")
+    else:
+        await db.execute(
+            update(Document)
+            .where(Document.doc_id == doc_id)
+            .values(
+                compilation_status="error",
+                compilation_diagnostics=diagnostics
+            )
+        )
+        await record_run(db, doc_id, RUN_ERROR, log)
+        logger.error(f"Ошибка компиляции документа {doc_id}: {log}")
+
+
+async def collect_pdf_garbage(db: AsyncSession) -> int:
+    """Удаляет из хранилища PDF, на которые не ссылается ни один документ и ни одна его версия."""
+    result = await db.execute(
+        select(Document.pdf_path).where(Document.pdf_path.is_not(None))
+        .union(select(DocumentRevision.pdf_path).where(DocumentRevision.pdf_path.is_not(None)))
+    )
+    referenced = set(result.scalars().all())
+    removed, _ = await asyncio.to_thread(
+        pdf_store.collect_garbage, referenced, settings.PDF_GC_GRACE_SECONDS
+    )
+    return removed
+
+
+async def pdf_gc_loop() -> None:
+    """Фоновая сборка мусора в хранилище PDF (запускается на старте приложения)."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await collect_pdf_garbage(db)
+        except Exception as e:
+            logger.error(f"Ошибка сборки мусора PDF: {e}", exc_info=True)
+        await asyncio.sleep(settings.PDF_GC_INTERVAL_SECONDS)
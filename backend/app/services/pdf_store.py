@@ -0,0 +1,128 @@
+# app/services/pdf_store.py
+import hashlib
+import logging
+import os
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PdfStore:
+    """
+    Хранилище скомпилированных PDF с адресацией по содержимому.
+
+    Файл лежит под своим sha256 в подпапке по первым двум символам хэша
+    (media/pdfs/ab/abcdef....pdf), поэтому в одной папке не копятся сотни тысяч файлов.
+    Одинаковые результаты сборки (сборка воспроизводима, см. SOURCE_DATE_EPOCH)
+    хранятся один раз. Ссылки на файлы — Document.pdf_path; то, на что никто
+    не ссылается, удаляет collect_garbage.
+    """
+
+    def __init__(self, media_root: Path, subdir: str = "pdfs", legacy_subdir: str = "documents"):
+        self.media_root = media_root
+        self.root = media_root / subdir
+        # Плоская папка, куда PDF писались раньше (document_{id}_{hash}.pdf)
+        self.legacy_root = media_root / legacy_subdir
+
+    def relative_path(self, digest: str) -> str:
+        """Путь относительно media (так хранится в Document.pdf_path)."""
+        return f"{self.root.name}/{digest[:2]}/{digest}.pdf"
+
+    def digest_for(self, relative: Optional[str]) -> Optional[str]:
+        """Хэш PDF по его пути в хранилище (None — путь не из хранилища, например старый)."""
+        if not relative:
+            return None
+        parts = relative.split("/")
+        if len(parts) != 3 or parts[0] != self.root.name or not parts[2].endswith(".pdf"):
+            return None
+        digest = parts[2][:-len(".pdf")]
+        if len(digest) != 64 or parts[1] != digest[:2]:
+            return None
+        return digest
+
+    def artifact_digest(self, relative: str) -> str:
+        """
+        Хэш содержимого PDF для ETag. У файлов хранилища он уже в имени;
+        старые файлы (media/documents) хэшируются, пока не изменятся.
+        """
+        digest = self.digest_for(relative)
+        if digest is not None:
+            return digest
+        path = self.media_root / relative
+        stat = path.stat()
+        return _file_digest(str(path), stat.st_mtime_ns, stat.st_size)
+
+    def put(self, pdf_content: bytes) -> Tuple[str, str]:
+        """Сохраняет PDF (если такого еще нет). Возвращает хэш и путь относительно media."""
+        digest = hashlib.sha256(pdf_content).hexdigest()
+        relative = self.relative_path(digest)
+        path = self.media_root / relative
+        if path.exists():
+            # Файл снова нужен — обновляем время, чтобы сборщик мусора не удалил его
+            # до того, как ссылка на него попадет в БД
+            os.utime(path)
+            return digest, relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_bytes(pdf_content)
+        os.replace(tmp, path)
+        return digest, relative
+
+    def _artifacts(self) -> Iterator[Path]:
+        if self.root.exists():
+            yield from self.root.glob("*/*.pdf")
+        if self.legacy_root.exists():
+            yield from self.legacy_root.glob("*.pdf")
+
+    def collect_garbage(self, referenced: Set[str], grace_seconds: int) -> Tuple[int, int]:
+        """
+        Удаляет PDF, на которые не ссылается ни один документ и которые не менялись
+        дольше grace_seconds (свежий файл может быть еще не записан в БД).
+        Возвращает (сколько удалено, сколько байт освобождено).
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        freed = 0
+        for path in self._artifacts():
+            relative = path.relative_to(self.media_root).as_posix()
+            if relative in referenced:
+                continue
+            try:
+                stat = path.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+
+        # Недописанные временные файлы (процесс упал во время записи)
+        if self.root.exists():
+            for tmp in self.root.glob("*/.*.tmp"):
+                try:
+                    if tmp.stat().st_mtime <= cutoff:
+                        tmp.unlink()
+                except FileNotFoundError:
+                    pass
+
+        if removed:
+            logger.info(f"🧹 Удалено PDF без ссылок: {removed} ({freed // 1024} КБ)")
+        return removed, freed
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    # mtime и размер — часть ключа: измененный файл хэшируется заново
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+pdf_store = PdfStore(Path("media"))
@@ -0,0 +1,245 @@
+# app/services/preamble_formats.py
+import hashlib
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services.process_limits import collect_output, start_limited_process
+
+logger = logging.getLogger(__name__)
+
+BEGIN_DOCUMENT = "\\begin{document}"
+END_OF_DUMP = "\\endofdump"
+
+# Пакеты, которые загружают системные шрифты или зависят от выбранного языка:
+# они остаются после \endofdump вместе с командами выбора шрифтов и языков
+_RUNTIME_PACKAGES = frozenset({
+    "fontspec", "polyglossia", "babel", "unicode-math", "mathspec", "xunicode",
+    "xltxtra", "realscripts", "xecjk", "xgreek", "bidi", "csquotes", "biblatex",
+})
+
+# Строки, которые попадают в формат: класс документа и загрузка обычных пакетов
+_DUMPABLE_RE = re.compile(
+    r"^\s*\\(?:documentclass|usepackage|RequirePackage|PassOptionsToPackage)\b"
+)
+_PACKAGE_LIST_RE = re.compile(r"\\(?:usepackage|RequirePackage)\s*(?:\[[^\]]*\]\s*)?\{([^}]*)\}")
+_COMMENT_RE = re.compile(r"(?<!\\)%.*")
+
+# Версия раскладки преамбулы по формату и остатку (входит в имя формата):
+# форматы, собранные по старой раскладке, не подходят к документам по новой
+_DUMP_LAYOUT = "2"
+
+
+def _preamble_statements(preamble: str) -> List[str]:
+    """
+    Делит преамбулу на команды по строкам; команда, у которой не закрыты скобки
+    (\\hypersetup{ или опции \\usepackage[ на нескольких строках), продолжается
+    на следующих строках.
+    """
+    statements: List[str] = []
+    current: List[str] = []
+    depth = 0
+    for line in preamble.splitlines(keepends=True):
+        current.append(line)
+        code = _COMMENT_RE.sub("", line).replace("\\{", "").replace("\\}", "")
+        depth += code.count("{") + code.count("[") - code.count("}") - code.count("]")
+        if depth <= 0:
+            statements.append("".join(current))
+            current = []
+            depth = 0
+    if current:
+        statements.append("".join(current))
+    return statements
+
+
+def _is_dumpable(statement: str) -> bool:
+    """Класс документа или загрузка пакетов, среди которых нет _RUNTIME_PACKAGES."""
+    code = _COMMENT_RE.sub("", statement)
+    if not _DUMPABLE_RE.match(code):
+        return False
+    for packages in _PACKAGE_LIST_RE.findall(code):
+        names = {name.strip().lower() for name in packages.split(",")}
+        if names & _RUNTIME_PACKAGES:
+            return False
+    return True
+
+
+class PreambleFormatCache:
+    """
+    Предкомпилированные форматы (.fmt) преамбул шаблонов.
+
+    Преамбула шаблона (всё до \\begin{document}) один раз "дампится" через
+    mylatexformat в файл формата, и документы этого шаблона компилируются
+    уже с ним — TeX не разбирает polyglossia, fontspec, hyperref и т.д. на каждом проходе.
+    Имя формата содержит хэш преамбулы, поэтому изменение шаблона само дает новый формат.
+
+    XeTeX не может выполнить \\dump, когда загружены системные шрифты, а шаблоны
+    выбирают их в преамбуле (fontspec, polyglossia, \\setmainfont). Поэтому в формат
+    попадают \\documentclass и загрузка обычных пакетов, а fontspec/polyglossia
+    и все остальные команды преамбулы (выбор шрифтов и языков, настройки пакетов)
+    идут после \\endofdump — их mylatexformat выполняет при каждой компиляции.
+    Та же раскладка с \\endofdump нужна и в документе (with_end_of_dump).
+    """
+
+    def __init__(self, formats_dir: Path):
+        self.formats_dir = formats_dir
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._failed: Dict[str, str] = {}  # Форматы, которые не удалось собрать (чтобы не пробовать снова)
+
+    @staticmethod
+    def split_preamble(latex_content: str) -> Tuple[Optional[str], str]:
+        """Делит LaTeX на преамбулу и тело. Если \\begin{document} нет — преамбулы нет."""
+        index = latex_content.find(BEGIN_DOCUMENT)
+        if index == -1:
+            return None, latex_content
+        return latex_content[:index], latex_content[index:]
+
+    @staticmethod
+    def split_dump(preamble: str) -> Tuple[str, str]:
+        """
+        Делит преамбулу на часть для формата и часть, которая выполняется каждый раз.
+        Порядок команд внутри каждой части сохраняется. Настройки пакетов остаются
+        во второй части: длины в em и т.п. должны считаться уже с выбранным шрифтом.
+        """
+        dumped: List[str] = []
+        rest: List[str] = []
+        for statement in _preamble_statements(preamble):
+            (dumped if _is_dumpable(statement) else rest).append(statement)
+        if dumped and not dumped[-1].endswith("\n"):
+            dumped[-1] += "\n"
+        return "".join(dumped), "".join(rest)
+
+    @staticmethod
+    def with_end_of_dump(latex_content: str) -> str:
+        """Документ для компиляции с форматом: \\endofdump там же, где при сборке формата."""
+        preamble, body = PreambleFormatCache.split_preamble(latex_content)
+        if preamble is None:
+            return latex_content
+        dumped, rest = PreambleFormatCache.split_dump(preamble)
+        return dumped + END_OF_DUMP + "\n" + rest + body
+
+    @staticmethod
+    def format_name(template_id: int, preamble: str, compiler: str) -> str:
+        preamble_hash = hashlib.sha256((_DUMP_LAYOUT + preamble).encode("utf-8")).hexdigest()[:12]
+        return f"tmpl_{template_id}_{compiler}_{preamble_hash}"
+
+    def env_for(self, base_env: Optional[dict] = None) -> dict:
+        """Окружение, в котором TeX найдет наши форматы (TEXFORMATS + стандартный путь)."""
+        env = dict(base_env if base_env is not None else os.environ)
+        env["TEXFORMATS"] = str(self.formats_dir) + os.pathsep
+        return env
+
+    def get_format(
+        self,
+        template_id: int,
+        template_latex: str,
+        document_latex: str,
+        compiler: str = "xelatex"
+    ) -> Optional[str]:
+        """
+        Возвращает имя формата для документа или None, если нужна обычная компиляция.
+        Формат используется только если преамбула документа совпадает с преамбулой шаблона.
+        """
+        template_preamble, _ = self.split_preamble(template_latex)
+        document_preamble, _ = self.split_preamble(document_latex)
+        if not template_preamble or template_preamble != document_preamble:
+            return None
+
+        name = self.format_name(template_id, template_preamble, compiler)
+        if name in self._failed:
+            return None
+
+        fmt_file = self.formats_dir / f"{name}.fmt"
+        if fmt_file.exists():
+            return name
+
+        with self._lock_for(name):
+            # Пока ждали блокировку, формат мог собрать другой поток
+            if fmt_file.exists():
+                return name
+            if self._build(name, template_preamble, compiler):
+                return name
+        return None
+
+    def invalidate(self, template_id: int) -> int:
+        """Удаляет все форматы шаблона. Возвращает количество удаленных файлов."""
+        removed = 0
+        if not self.formats_dir.exists():
+            return removed
+        for path in self.formats_dir.glob(f"tmpl_{template_id}_*"):
+            try:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink()
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Не удалось удалить формат {path}: {e}")
+        prefix = f"tmpl_{template_id}_"
+        for name in [n for n in self._failed if n.startswith(prefix)]:
+            del self._failed[name]
+        return removed
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _build(self, name: str, preamble: str, compiler: str) -> bool:
+        """Собирает формат: xelatex -ini "&xelatex" mylatexformat.ltx preamble.tex"""
+        self.formats_dir.mkdir(parents=True, exist_ok=True)
+        build_dir = self.formats_dir / f"{name}_build"
+        build_dir.mkdir(exist_ok=True)
+
+        source = build_dir / "preamble.tex"
+        source.write_text(
+            self.with_end_of_dump(preamble + BEGIN_DOCUMENT) + "\n\\end{document}\n",
+            encoding="utf-8"
+        )
+
+        try:
+            if platform.system() == "Windows":
+                # Кавычки обязательны: в cmd.exe символ & разделяет команды
+                cmd = (
+                    f'cd /d "{build_dir}" && {compiler}.exe -ini -interaction=nonstopmode '
+                    f'-jobname={name} "&{compiler}" mylatexformat.ltx preamble.tex'
+                )
+                shell = True
+            else:
+                cmd = [
+                    compiler, "-ini", "-interaction=nonstopmode",
+                    f"-jobname={name}", f"&{compiler}", "mylatexformat.ltx", "preamble.tex"
+                ]
+                shell = False
+            process = start_limited_process(
+                cmd, cwd=build_dir, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, encoding='utf-8', errors='replace'
+            )
+            result = collect_output(process, cmd, timeout=120)
+        except Exception as e:
+            self._failed[name] = str(e)
+            logger.warning(f"Не удалось собрать формат {name}: {e}")
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return False
+
+        built = build_dir / f"{name}.fmt"
+        if result.returncode != 0 or not built.exists():
+            self._failed[name] = (result.stdout or "")[-500:]
+            logger.warning(
+                f"Формат {name} не собран (код {result.returncode}), используем обычную компиляцию:\n"
+                f"{self._failed[name]}"
+            )
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return False
+
+        # Атомарно публикуем готовый формат
+        os.replace(built, self.formats_dir / f"{name}.fmt")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        logger.info(f"Собран формат преамбулы {name}")
+        return True
@@ -0,0 +1,269 @@
+# app/services/process_limits.py
+import logging
+import os
+import platform
+import signal
+import subprocess
+import threading
+import weakref
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IS_WINDOWS = platform.system() == "Windows"
+
+if IS_WINDOWS:
+    import ctypes
+    from ctypes import wintypes
+else:
+    import resource
+
+
+class ProcessLimitExceeded(Exception):
+    """Процесс TeX превысил лимит (например, объем вывода) и был остановлен."""
+
+
+def _rlimits() -> Tuple[Tuple[int, int], ...]:
+    """Жесткие лимиты на ресурсы TeX (считаются в родительском процессе)."""
+    mb = 1024 * 1024
+    return (
+        (resource.RLIMIT_CPU, settings.LATEX_CPU_SECONDS),
+        (resource.RLIMIT_AS, settings.LATEX_MEMORY_MB * mb),
+        (resource.RLIMIT_FSIZE, settings.LATEX_MAX_FILE_MB * mb),
+        (resource.RLIMIT_NOFILE, settings.LATEX_MAX_OPEN_FILES),
+    )
+
+
+def _rlimits_preexec(limits: Tuple[Tuple[int, int], ...]) -> Callable[[], None]:
+    """
+    preexec_fn для Popen. Выполняется в дочернем процессе между fork и exec, где
+    при живых потоках родителя нельзя ни импортировать, ни брать блокировки, —
+    поэтому внутри только вызовы setrlimit с заранее посчитанными значениями.
+    """
+    def apply() -> None:
+        for limit, value in limits:
+            try:
+                resource.setrlimit(limit, (value, value))
+            except (ValueError, OSError):
+                # Лимит выше жесткого лимита системы — оставляем системный
+                pass
+    return apply
+
+
+# Job Object на Windows — аналог rlimits: лимит памяти на процесс и процессорного
+# времени на все дерево (cmd.exe и запущенный им TeX)
+_JOB_OBJECT_LIMIT_JOB_TIME = 0x00000004
+_JOB_OBJECT_LIMIT_PROCESS_MEMORY = 0x00000100
+_JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE = 0x00002000
+_JOB_OBJECT_EXTENDED_LIMIT_INFORMATION = 9
+_CREATE_SUSPENDED = 0x00000004
+
+if IS_WINDOWS:
+    class _IoCounters(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+            "ReadTransferCount", "WriteTransferCount", "OtherTransferCount",
+        )]
+
+    class _BasicLimitInformation(ctypes.Structure):
+        _fields_ = [
+            ("PerProcessUserTimeLimit", wintypes.LARGE_INTEGER),
+            ("PerJobUserTimeLimit", wintypes.LARGE_INTEGER),
+            ("LimitFlags", wintypes.DWORD),
+            ("MinimumWorkingSetSize", ctypes.c_size_t),
+            ("MaximumWorkingSetSize", ctypes.c_size_t),
+            ("ActiveProcessLimit", wintypes.DWORD),
+            ("Affinity", ctypes.c_size_t),
+            ("PriorityClass", wintypes.DWORD),
+            ("SchedulingClass", wintypes.DWORD),
+        ]
+
+    class _ExtendedLimitInformation(ctypes.Structure):
+        _fields_ = [
+            ("BasicLimitInformation", _BasicLimitInformation),
+            ("IoInfo", _IoCounters),
+            ("ProcessMemoryLimit", ctypes.c_size_t),
+            ("JobMemoryLimit", ctypes.c_size_t),
+            ("PeakProcessMemoryUsed", ctypes.c_size_t),
+            ("PeakJobMemoryUsed", ctypes.c_size_t),
+        ]
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    _kernel32.CreateJobObjectW.argtypes = (wintypes.LPVOID, wintypes.LPCWSTR)
+    _kernel32.SetInformationJobObject.argtypes = (
+        wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD
+    )
+    _kernel32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+    _kernel32.TerminateJobObject.argtypes = (wintypes.HANDLE, wintypes.UINT)
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    _ntdll = ctypes.WinDLL("ntdll")
+    _ntdll.NtResumeProcess.argtypes = (wintypes.HANDLE,)
+
+
+def _create_limited_job() -> int:
+    """Создает Job Object с лимитами LATEX_MEMORY_MB и LATEX_CPU_SECONDS."""
+    job = _kernel32.CreateJobObjectW(None, None)
+    if not job:
+        raise ctypes.WinError(ctypes.get_last_error())
+    info = _ExtendedLimitInformation()
+    basic = info.BasicLimitInformation
+    basic.LimitFlags = (
+        _JOB_OBJECT_LIMIT_JOB_TIME
+        | _JOB_OBJECT_LIMIT_PROCESS_MEMORY
+        | _JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+    )
+    # Единица — 100 нс
+    basic.PerJobUserTimeLimit = settings.LATEX_CPU_SECONDS * 10_000_000
+    info.ProcessMemoryLimit = settings.LATEX_MEMORY_MB * 1024 * 1024
+    if not _kernel32.SetInformationJobObject(
+        job, _JOB_OBJECT_EXTENDED_LIMIT_INFORMATION, ctypes.byref(info), ctypes.sizeof(info)
+    ):
+        error = ctypes.get_last_error()
+        _kernel32.CloseHandle(job)
+        raise ctypes.WinError(error)
+    return job
+
+
+def _attach_job(process: subprocess.Popen) -> None:
+    """
+    Помещает запущенный приостановленным процесс в Job Object и возобновляет его.
+    Процесс еще не выполнил ни одной инструкции, поэтому все его потомки
+    (TeX, запущенный через cmd.exe) тоже окажутся в задании.
+    """
+    try:
+        job = _create_limited_job()
+        if not _kernel32.AssignProcessToJobObject(job, int(process._handle)):
+            error = ctypes.get_last_error()
+            _kernel32.CloseHandle(job)
+            raise ctypes.WinError(error)
+    except OSError as e:
+        # Без лимитов памяти и CPU остаются лимит реального времени и объема вывода
+        logger.warning(f"Не удалось ограничить процесс {process.pid} через Job Object: {e}")
+    else:
+        # Закрытие последнего дескриптора задания (KILL_ON_JOB_CLOSE) добивает
+        # оставшихся потомков, поэтому держим его, пока жив объект процесса
+        process._tex_job = job
+        weakref.finalize(process, _kernel32.CloseHandle, job)
+    finally:
+        _ntdll.NtResumeProcess(int(process._handle))
+
+
+def start_limited_process(cmd, **kwargs) -> subprocess.Popen:
+    """
+    Popen для запуска TeX с лимитами: своя группа процессов (чтобы убивать
+    все дерево разом) и лимиты на ресурсы.
+
+    На POSIX это rlimits на CPU, память, размер файлов и число файлов. На Windows —
+    Job Object с лимитом памяти на процесс и процессорного времени на дерево; лимитов
+    на размер файлов и число открытых файлов там нет, их заменяют лимит реального
+    времени и объема вывода в collect_output.
+    """
+    if IS_WINDOWS:
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | _CREATE_SUSPENDED
+        process = subprocess.Popen(cmd, **kwargs)
+        _attach_job(process)
+        return process
+    return subprocess.Popen(
+        cmd, start_new_session=True, preexec_fn=_rlimits_preexec(_rlimits()), **kwargs
+    )
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """Убивает процесс вместе со всеми потомками."""
+    if process.poll() is not None:
+        return
+    try:
+        job = getattr(process, "_tex_job", None)
+        if job is not None:
+            _kernel32.TerminateJobObject(job, 1)
+        elif IS_WINDOWS:
+            subprocess.run(
+                ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=10
+            )
+        else:
+            # start_new_session=True: pgid процесса совпадает с его pid
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Не удалось убить дерево процессов {process.pid}: {e}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def collect_output(
+    process: subprocess.Popen,
+    cmd,
+    timeout: int,
+    on_line: Optional[Callable[[str], None]] = None,
+    stdin_data: Optional[str] = None
+) -> subprocess.CompletedProcess:
+    """
+    Аналог communicate() для TeX (stdout и stderr — текстовые пайпы): stdout читается
+    построчно и каждая строка сразу отдается в on_line (живой лог в редакторе),
+    в памяти остаются только последние LATEX_LOG_RING_LINES строк. Процесс, который
+    пишет больше LATEX_MAX_OUTPUT_BYTES или работает дольше timeout, убивается.
+    """
+    max_output = settings.LATEX_MAX_OUTPUT_BYTES
+
+    # stderr читаем в отдельном потоке, чтобы процесс не встал на заполненном пайпе
+    stderr_chunks: List[str] = []
+
+    def read_stderr():
+        stderr_chunks.append(process.stderr.read(max_output))
+        # Остаток сверх лимита вычитываем и выбрасываем
+        while process.stderr.read(65536):
+            pass
+
+    stderr_reader = threading.Thread(target=read_stderr)
+    stderr_reader.start()
+
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        kill_process_tree(process)
+
+    timer = threading.Timer(timeout, kill_on_timeout)
+    timer.start()
+    stdout_lines: Deque[str] = deque(maxlen=settings.LATEX_LOG_RING_LINES)
+    output_size = 0
+    output_exceeded = False
+    try:
+        if stdin_data is not None:
+            try:
+                process.stdin.write(stdin_data)
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                # Процесс уже завершился — его вывод все равно прочитаем
+                pass
+        for line in process.stdout:
+            output_size += len(line)
+            if output_size > max_output:
+                # Документ, который сыплет выводом без конца (\loop и т.п.), останавливаем
+                output_exceeded = True
+                kill_process_tree(process)
+                break
+            stdout_lines.append(line)
+            if on_line is not None:
+                on_line(line.rstrip('\n'))
+        process.wait()
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            kill_process_tree(process)
+            process.wait()
+        stderr_reader.join()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if output_exceeded:
+        raise ProcessLimitExceeded(f"Вывод TeX превысил {max_output} байт, процесс остановлен")
+
+    return subprocess.CompletedProcess(cmd, process.returncode, "".join(stdout_lines), "".join(stderr_chunks))
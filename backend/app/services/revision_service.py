@@ -0,0 +1,221 @@
+# app/services/revision_service.py
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Document, DocumentRevision
+from app.services.pdf_store import pdf_store
+from app.services.text_delta import apply_edits, diff_text
+
+
+class RevisionContent(NamedTuple):
+    latex_source: Optional[str]
+    content_json: Optional[Dict[str, Any]]
+    revision: DocumentRevision
+
+
+def _pack(payload: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack(data: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _latex_hash(latex_source: Optional[str]) -> str:
+    # Тот же хэш, что у исходника задачи компиляции (compile_jobs.source_hash)
+    return hashlib.sha256((latex_source or "").encode()).hexdigest()
+
+
+def _without_html(content: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in content.items() if key != "html"}
+
+
+def _delta_possible(
+    previous_latex: Optional[str],
+    previous_content: Optional[Dict[str, Any]],
+    latex: Optional[str],
+    content: Optional[Dict[str, Any]]
+) -> bool:
+    """Правки описывают только текст latex_source и content_json["html"], остальное должно совпасть."""
+    if (previous_latex is None) != (latex is None):
+        return False
+    if (previous_content is None) != (content is None):
+        return False
+    previous_content, content = previous_content or {}, content or {}
+    if ("html" in previous_content) != ("html" in content):
+        return False
+    return _without_html(previous_content) == _without_html(content)
+
+
+class RevisionService:
+    """История версий документа: полные снимки + сжатые правки между ними"""
+
+    @staticmethod
+    async def record(
+        db: AsyncSession,
+        doc: Document,
+        previous_latex: Optional[str] = None,
+        previous_content: Optional[Dict[str, Any]] = None
+    ) -> DocumentRevision:
+        """
+        Записывает версию doc.version (содержимое уже сохранено в doc, previous_* —
+        содержимое предыдущей версии). Снимок — если это первая версия в истории,
+        если предыдущей нет или пора по REVISION_SNAPSHOT_INTERVAL; иначе правки.
+        Коммит — на вызывающем.
+        """
+        result = await db.execute(
+            select(
+                func.max(case((DocumentRevision.is_snapshot, DocumentRevision.version))),
+                func.max(DocumentRevision.version)
+            ).where(DocumentRevision.doc_id == doc.doc_id)
+        )
+        last_snapshot, last_version = result.one()
+
+        is_snapshot = (
+            last_snapshot is None
+            or last_version != doc.version - 1
+            or doc.version - last_snapshot >= settings.REVISION_SNAPSHOT_INTERVAL
+            or not _delta_possible(previous_latex, previous_content, doc.latex_source, doc.content_json)
+        )
+        if is_snapshot:
+            payload = {"latex_source": doc.latex_source, "content_json": doc.content_json}
+        else:
+            payload = {
+                "latex": diff_text(previous_latex or "", doc.latex_source or ""),
+                "html": diff_text(
+                    (previous_content or {}).get("html") or "",
+                    (doc.content_json or {}).get("html") or ""
+                ),
+            }
+
+        revision = DocumentRevision(
+            doc_id=doc.doc_id,
+            version=doc.version,
+            is_snapshot=is_snapshot,
+            data=_pack(payload),
+            source_hash=_latex_hash(doc.latex_source)
+        )
+        db.add(revision)
+        await db.flush()
+        await RevisionService.prune_pdf_links(db, doc.doc_id, doc.version)
+        return revision
+
+    @staticmethod
+    async def list_revisions(db: AsyncSession, doc_id: int) -> List[DocumentRevision]:
+        result = await db.execute(
+            select(DocumentRevision)
+            .where(DocumentRevision.doc_id == doc_id)
+            .order_by(DocumentRevision.version.desc())
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    async def reconstruct(db: AsyncSession, doc_id: int, version: int) -> Optional[RevisionContent]:
+        """
+        Содержимое версии: ближайший снимок не позже нее и правки после снимка по порядку.
+        None — такой версии в истории нет.
+        """
+        result = await db.execute(
+            select(DocumentRevision)
+            .where(
+                DocumentRevision.doc_id == doc_id,
+                DocumentRevision.is_snapshot.is_(True),
+                DocumentRevision.version <= version
+            )
+            .order_by(DocumentRevision.version.desc())
+            .limit(1)
+        )
+        snapshot = result.scalars().first()
+        if snapshot is None:
+            return None
+
+        result = await db.execute(
+            select(DocumentRevision)
+            .where(
+                DocumentRevision.doc_id == doc_id,
+                DocumentRevision.version > snapshot.version,
+                DocumentRevision.version <= version
+            )
+            .order_by(DocumentRevision.version)
+        )
+        deltas = result.scalars().all()
+        if snapshot.version + len(deltas) != version:
+            return None
+
+        payload = _unpack(snapshot.data)
+        latex_source, content_json = payload["latex_source"], payload["content_json"]
+        for delta in deltas:
+            edits = _unpack(delta.data)
+            if edits["latex"]:
+                latex_source = apply_edits(latex_source or "", edits["latex"])
+            if edits["html"]:
+                content_json = dict(content_json or {})
+                content_json["html"] = apply_edits(content_json.get("html") or "", edits["html"])
+        return RevisionContent(latex_source, content_json, deltas[-1] if deltas else snapshot)
+
+    @staticmethod
+    async def link_pdf(db: AsyncSession, doc_id: int, source_hash: str, pdf_path: str) -> None:
+        """Привязывает PDF к версиям документа с этим исходником. Коммит — на вызывающем."""
+        await db.execute(
+            update(DocumentRevision)
+            .where(DocumentRevision.doc_id == doc_id, DocumentRevision.source_hash == source_hash)
+            .values(pdf_path=pdf_path)
+        )
+        result = await db.execute(
+            select(func.max(DocumentRevision.version)).where(DocumentRevision.doc_id == doc_id)
+        )
+        latest = result.scalar_one()
+        if latest is not None:
+            await RevisionService.prune_pdf_links(db, doc_id, latest)
+
+    @staticmethod
+    async def prune_pdf_links(db: AsyncSession, doc_id: int, latest_version: int) -> None:
+        """
+        Снимает ссылки на PDF у версий старше REVISION_PDF_KEEP последних: иначе
+        сборщик мусора хранилища не удалил бы ни один когда-либо собранный PDF.
+        Такую версию можно восстановить, но PDF для нее соберется заново.
+        """
+        await db.execute(
+            update(DocumentRevision)
+            .where(
+                DocumentRevision.doc_id == doc_id,
+                DocumentRevision.version <= latest_version - settings.REVISION_PDF_KEEP,
+                DocumentRevision.pdf_path.is_not(None)
+            )
+            .values(pdf_path=None)
+        )
+
+    @staticmethod
+    async def restore(db: AsyncSession, doc: Document, version: int) -> Optional[Document]:
+        """
+        Возвращает документ к версии version (это новая версия, история не теряется).
+        Если та версия была скомпилирована и ее PDF на месте — он сразу становится
+        PDF документа, без перекомпиляции. None — версии нет в истории.
+        """
+        content = await RevisionService.reconstruct(db, doc.doc_id, version)
+        if content is None:
+            return None
+
+        previous_latex, previous_content = doc.latex_source, doc.content_json
+        doc.latex_source = content.latex_source
+        doc.content_json = content.content_json
+        doc.version += 1
+
+        pdf_path = content.revision.pdf_path
+        has_pdf = bool(pdf_path) and (pdf_store.media_root / pdf_path).exists()
+        if has_pdf:
+            doc.pdf_path = pdf_path
+            doc.compilation_status = "success"
+            doc.compilation_diagnostics = None
+            doc.pdf_generated_at = func.now()
+
+        revision = await RevisionService.record(db, doc, previous_latex, previous_content)
+        if has_pdf:
+            revision.pdf_path = pdf_path
+        return doc
@@ -0,0 +1,91 @@
+# app/services/template_cache.py
+import re
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Template
+
+# Маркеры шаблона → ключ данных титульного листа (UserService.get_title_page_data).
+# Новый маркер — одна строка здесь: заполнение от числа маркеров не дорожает
+PLACEHOLDERS = {
+    "VAR_GROUP": "group",
+    "VAR_CARD": "student_card",
+    "VAR_STUDENT_SIGNATURE": "initials",
+    "VAR_DEPARTMENT": "department",
+    "VAR_FULL_NAME": "full_name",
+}
+
+# Длинные маркеры первыми: VAR_STUDENT_SIGNATURE не должен совпасть с более коротким префиксом
+_PLACEHOLDER_RE = re.compile("|".join(
+    re.escape(name) for name in sorted(PLACEHOLDERS, key=len, reverse=True)
+))
+
+
+class CompiledTemplate(NamedTuple):
+    """Шаблон, разобранный на куски текста и маркеры между ними"""
+    template_id: int
+    segments: Tuple[str, ...]  # текст вокруг маркеров: на один больше, чем fields
+    fields: Tuple[str, ...]    # ключи данных титульного листа по порядку маркеров
+
+    def fill(self, title_data: Dict[str, Any]) -> str:
+        """Подставляет данные пользователя одной склейкой готовых кусков."""
+        parts = [self.segments[0]]
+        for field, segment in zip(self.fields, self.segments[1:]):
+            parts.append(str(title_data.get(field) or ""))
+            parts.append(segment)
+        return "".join(parts)
+
+
+def compile_template(template_id: int, latex: str) -> CompiledTemplate:
+    """Один проход по шаблону: запоминаем, где стоят маркеры."""
+    segments = []
+    fields = []
+    pos = 0
+    for match in _PLACEHOLDER_RE.finditer(latex):
+        segments.append(latex[pos:match.start()])
+        fields.append(PLACEHOLDERS[match.group()])
+        pos = match.end()
+    segments.append(latex[pos:])
+    return CompiledTemplate(template_id, tuple(segments), tuple(fields))
+
+
+class TemplateCache:
+    """
+    Разобранные шаблоны в памяти процесса. Сбрасывается при создании и удалении
+    шаблона (templates.py); TTL ограничивает устаревание в других процессах API.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, CompiledTemplate]] = {}
+
+    async def get(self, db: AsyncSession, template_id: int) -> Optional[CompiledTemplate]:
+        """Разобранный шаблон или None, если такого шаблона нет."""
+        entry = self._entries.get(template_id)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+
+        result = await db.execute(
+            select(Template.latex_preambula_tmp).where(Template.template_id == template_id)
+        )
+        latex = result.scalars().first()
+        if latex is None:
+            self._entries.pop(template_id, None)
+            return None
+
+        compiled = compile_template(template_id, latex)
+        self._entries[template_id] = (time.monotonic() + self.ttl_seconds, compiled)
+        return compiled
+
+    def invalidate(self, template_id: Optional[int] = None) -> None:
+        if template_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(template_id, None)
+
+
+template_cache = TemplateCache(settings.TEMPLATE_CACHE_TTL_SECONDS)
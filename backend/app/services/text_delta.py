@@ -0,0 +1,86 @@
+# app/services/text_delta.py
+from typing import Iterable, List, Tuple
+
+# Правка: заменить [start, end) на text. Позиции — в единицах UTF-16, как индексы
+# строк в JavaScript: так редактор считает их без перекодирования (у Python другие
+# индексы, если в тексте есть символы вне BMP — например, эмодзи)
+TextEdit = Tuple[int, int, str]
+
+
+def apply_edits(text: str, edits: Iterable[TextEdit]) -> str:
+    """
+    Применяет правки к тексту. Позиции всех правок относятся к исходному тексту,
+    правки идут по возрастанию и не пересекаются. Иначе — ValueError.
+    """
+    source = text.encode("utf-16-le", "surrogatepass")
+    length = len(source) // 2
+    parts = []
+    pos = 0
+    for start, end, replacement in edits:
+        if not pos <= start <= end <= length:
+            raise ValueError(f"Правка [{start}, {end}) вне текста или пересекает предыдущую (длина {length})")
+        parts.append(source[pos * 2:start * 2])
+        parts.append(replacement.encode("utf-16-le", "surrogatepass"))
+        pos = end
+    parts.append(source[pos * 2:])
+    try:
+        return b"".join(parts).decode("utf-16-le")
+    except UnicodeDecodeError:
+        # Правка разрезала суррогатную пару
+        raise ValueError("Правка разрезает символ")
+
+
+# Сравниваем блоками: сравнение срезов идет на стороне C, побайтно — только внутри
+# блока с первым отличием
+_CHUNK = 4096
+
+
+def _common_prefix(a: bytes, b: bytes) -> int:
+    limit = min(len(a), len(b))
+    pos = 0
+    while pos < limit:
+        end = min(pos + _CHUNK, limit)
+        if a[pos:end] != b[pos:end]:
+            while a[pos] == b[pos]:
+                pos += 1
+            return pos
+        pos = end
+    return limit
+
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    length = 0
+    while length < limit:
+        step = min(_CHUNK, limit - length)
+        if a[len(a) - length - step:len(a) - length] != b[len(b) - length - step:len(b) - length]:
+            while a[len(a) - 1 - length] == b[len(b) - 1 - length]:
+                length += 1
+            return length
+        length += step
+    return limit
+
+
+def _is_high_surrogate(units: bytes, index: int) -> bool:
+    return 0xD800 <= int.from_bytes(units[index * 2:index * 2 + 2], "little") <= 0xDBFF
+
+
+def diff_text(old: str, new: str) -> List[TextEdit]:
+    """
+    Правки, превращающие old в new: общее начало и конец остаются, середина заменяется
+    (то же, что считает редактор в textDiff.ts). Пустой список — текст не изменился.
+    """
+    if old == new:
+        return []
+    old_units = old.encode("utf-16-le", "surrogatepass")
+    new_units = new.encode("utf-16-le", "surrogatepass")
+    prefix = _common_prefix(old_units, new_units) // 2
+    suffix = _common_suffix(old_units, new_units, min(len(old_units), len(new_units)) - prefix * 2) // 2
+    # Границы правки — только между символами, не внутри суррогатной пары
+    if prefix > 0 and _is_high_surrogate(old_units, prefix - 1):
+        prefix -= 1
+    old_length, new_length = len(old_units) // 2, len(new_units) // 2
+    if suffix > 0 and _is_high_surrogate(old_units, old_length - 1 - suffix):
+        suffix -= 1
+
+    replacement = new_units[prefix * 2:(new_length - suffix) * 2].decode("utf-16-le", "surrogatepass")
+    return [(prefix, old_length - suffix, replacement)]
@@ -0,0 +1,111 @@
+# app/services/toolchain.py
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ENGINES = ("xelatex", "lualatex", "pdflatex")
+
+
+class EngineInfo(NamedTuple):
+    name: str
+    path: str
+    version: str
+
+
+class ToolchainRegistry:
+    """
+    Реестр установленных движков TeX.
+
+    Один раз находит xelatex/lualatex/pdflatex и их версии и кэширует результат на TTL.
+    Повторная проверка — только по истечении TTL или после invalidate()
+    (например, когда компиляция упала с "команда не найдена").
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._engines: Dict[str, EngineInfo] = {}
+        self._probed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def engines(self) -> Dict[str, EngineInfo]:
+        """Найденные движки (с проверкой при первом обращении или истекшем TTL)."""
+        with self._lock:
+            expired = (
+                self._probed_at is None
+                or time.monotonic() - self._probed_at > self.ttl_seconds
+            )
+            if expired:
+                self._engines = self._probe_all()
+                self._probed_at = time.monotonic()
+            return dict(self._engines)
+
+    def get(self, compiler: str) -> Optional[EngineInfo]:
+        return self.engines().get(compiler)
+
+    def verify(self, compiler: str = "xelatex") -> Tuple[bool, str]:
+        """Проверяет доступность компилятора. Формат ответа как у verify_compiler_available."""
+        engine = self.get(compiler)
+        if engine is None:
+            return False, f"Компилятор '{compiler}' не найден."
+        return True, self._describe(engine)
+
+    def known(self, compiler: str = "xelatex") -> Optional[str]:
+        """
+        Описание движка (как у verify) по последней проверке, без запуска процессов
+        и без учета TTL. None — движок еще не проверялся или не найден.
+        """
+        with self._lock:
+            engine = self._engines.get(compiler)
+        return self._describe(engine) if engine is not None else None
+
+    @staticmethod
+    def _describe(engine: EngineInfo) -> str:
+        return f"TeX Live {engine.name}: {engine.version[:80]}"
+
+    def invalidate(self) -> None:
+        """Сбрасывает кэш — следующее обращение заново найдет движки."""
+        with self._lock:
+            self._probed_at = None
+            self._engines = {}
+
+    @staticmethod
+    def _probe_all() -> Dict[str, EngineInfo]:
+        engines = {}
+        for name in SUPPORTED_ENGINES:
+            engine = ToolchainRegistry._probe(name)
+            if engine is not None:
+                engines[name] = engine
+        logger.info(f"Найдены движки TeX: {', '.join(engines) or 'нет'}")
+        return engines
+
+    @staticmethod
+    def _probe(name: str) -> Optional[EngineInfo]:
+        # shutil.which сам учитывает PATHEXT на Windows, shell не нужен
+        path = shutil.which(name)
+        if not path:
+            return None
+        try:
+            result = subprocess.run(
+                [path, "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=5
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Не удалось получить версию {name}: {e}")
+            return None
+        if result.returncode != 0:
+            return None
+        version_line = result.stdout.split('\n')[0] if result.stdout else "unknown"
+        return EngineInfo(name=name, path=path, version=version_line)
+
+
+toolchain = ToolchainRegistry(settings.TOOLCHAIN_CACHE_TTL)
@@ -0,0 +1,81 @@
+# app/services/user_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.models.models import User
+
+
+class UserCache:
+    """
+    Кэш пользователей, уже найденных по токену: TTL + LRU по числу записей.
+
+    Ключ — логин и хэш токена (сам токен в памяти не храним). Значение — отсоединенная
+    копия строки users: запрос получает ее через db.merge(load=False), то есть объект
+    своей сессии без SELECT, и может менять его, не трогая кэш.
+    Работает только в event loop, поэтому без блокировок.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, User]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(login: str, token: str) -> Tuple[str, str]:
+        return login, hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def _detached_copy(user: User) -> User:
+        copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+    def get(self, login: str, token: str) -> Optional[User]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = self._key(login, token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, login: str, token: str, user: User) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        key = self._key(login, token)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, self._detached_copy(user))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, login: str) -> None:
+        """Сбрасывает все записи пользователя (профиль или пароль изменились)."""
+        for key in [key for key in self._entries if key[0] == login]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+user_cache = UserCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
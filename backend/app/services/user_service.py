@@ -57,6 +57,7 @@ class UserService:
         
         Возвращает словарь с ключами:
         - last_name, first_name, middle_name (отдельно)
+        - full_name ("Иванов Иван Петрович")
         - initials (форматированные: "Иванов И.П.")
         - group, student_card, department
         """
@@ -64,6 +65,10 @@ class UserService:
             "last_name": user.last_name or "",           # должно быть
             "first_name": user.first_name or "",         # должно быть
             "middle_name": user.middle_name or "",   
+            "full_name": " ".join(
+                part.strip() for part in (user.last_name, user.first_name, user.middle_name)
+                if part and part.strip()
+            ),
             "initials": UserService.format_initials(
                 user.last_name, 
                 user.first_name, 
@@ -0,0 +1,313 @@
+# app/services/warm_workers.py
+import logging
+import shutil
+import subprocess
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.image_store import link_file, remove_file, remove_tree
+from app.services.preamble_formats import PreambleFormatCache
+from app.services.process_limits import (
+    ProcessLimitExceeded, collect_output, kill_process_tree, start_limited_process
+)
+
+logger = logging.getLogger(__name__)
+
+# Файлы, которые переносятся между папкой сборки и папкой воркера
+# (document.tex воркер пишет сам — только тело документа)
+_INPUT_FILES = ("document.aux", "document.toc", "document.out")
+_OUTPUT_FILES = ("document.pdf", "document.aux", "document.toc", "document.out", "document.log")
+
+# Преамбула шаблона, которую воркер выполняет до прихода документа
+_PREAMBLE_FILE = "warm_preamble.tex"
+
+# Первая строка TeX (вместо имени файла на приглашении "**"). Формат к ее разбору уже
+# загружен; воркер выполняет остаток преамбулы после \endofdump (fontspec, polyglossia,
+# шрифты), и \read ждет имя файла с телом документа со stdin. Ждать терминал
+# в nonstopmode TeX отказывается, поэтому режим включается только после чтения
+_FIRST_LINE = rf"\input {_PREAMBLE_FILE[:-4]} \read16 to\warmjob \nonstopmode\input\warmjob"
+
+
+class WarmWorker:
+    """
+    Слот с заранее запущенным процессом TeX.
+
+    Процесс стартует с форматом преамбулы шаблона, выполняет остаток преамбулы,
+    который в формат не попал (загрузка системных шрифтов и языков), и ждет имя файла
+    на \\read (см. _FIRST_LINE). К моменту прихода документа запуск движка, загрузка
+    формата и вся преамбула уже позади — остается тело документа. На приглашении "**"
+    ждать нельзя: TeX читает эту строку до загрузки формата.
+    Один процесс TeX верстает только один документ, так что после задачи слот сразу
+    запускает следующий процесс, а после max_jobs задач (или ошибки) очищает свою папку.
+    """
+
+    def __init__(self, workdir: Path, command: List[str], env: dict, max_jobs: int, preamble: str):
+        self.workdir = workdir
+        self.command = command
+        self.preamble = preamble
+        self.env = env
+        self.max_jobs = max_jobs
+        self.jobs_done = 0
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        (self.workdir / _PREAMBLE_FILE).write_text(self.preamble, encoding="utf-8")
+        self.process = start_limited_process(
+            self.command,
+            cwd=self.workdir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            env=self.env
+        )
+
+    def is_alive(self) -> bool:
+        """Процесс ждет документ (не упал, например, на ошибке в преамбуле)."""
+        return self.process is not None and self.process.poll() is None
+
+    def run(
+        self,
+        temp_dir: Path,
+        body: str,
+        timeout: int = 30,
+        extra_files: Sequence[str] = (),
+        on_line: Optional[Callable[[str], None]] = None
+    ) -> subprocess.CompletedProcess:
+        """
+        Прогоняет один проход TeX над телом документа из temp_dir в этом воркере.
+        Вывод читается так же, как при обычном запуске: с лимитом объема и в on_line.
+        """
+        # Пустые строки вместо преамбулы: номера строк в ошибках — как в document.tex
+        (self.workdir / "document.tex").write_text(
+            "\n" * self.preamble.count("\n") + body, encoding="utf-8"
+        )
+        for name in _INPUT_FILES:
+            src = temp_dir / name
+            if src.exists():
+                shutil.copy2(src, self.workdir / name)
+        # Картинки — ссылками, как и в папке сборки
+        for name in extra_files:
+            dst = self.workdir / name
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            link_file(temp_dir / name, dst)
+
+        process = self.process
+        self.process = None
+        result = collect_output(process, self.command, timeout, on_line, stdin_data="document.tex\n")
+
+        for name in _OUTPUT_FILES:
+            out = self.workdir / name
+            if out.exists():
+                shutil.copy2(out, temp_dir / name)
+
+        self.jobs_done += 1
+        if result.returncode != 0 or self.jobs_done >= self.max_jobs:
+            self.recycle()
+        else:
+            self._clean_workdir()
+            self.start()
+
+        return result
+
+    def recycle(self) -> None:
+        """Полностью пересоздает слот: новая папка, новый процесс."""
+        self.stop()
+        remove_tree(self.workdir)
+        self.jobs_done = 0
+        self.start()
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            kill_process_tree(self.process)
+            self.process.wait()
+        self.process = None
+
+    def discard(self) -> None:
+        """Останавливает процесс и удаляет папку слота."""
+        self.stop()
+        remove_tree(self.workdir)
+
+    def _clean_workdir(self) -> None:
+        for path in self.workdir.iterdir():
+            if path.is_dir() and not path.is_symlink():
+                remove_tree(path)
+            else:
+                remove_file(path)
+
+
+class WarmWorkerPool:
+    """Пул теплых воркеров одного формата преамбулы (т.е. одной версии шаблона)."""
+
+    def __init__(self, root: Path, command: List[str], env: dict, size: int, max_jobs: int, preamble: str):
+        self.root = root
+        self.preamble = preamble
+        self._idle: List[WarmWorker] = []
+        self._all: List[WarmWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            worker = WarmWorker(root / str(uuid.uuid4())[:8], command, env, max_jobs, preamble)
+            worker.start()
+            self._idle.append(worker)
+            self._all.append(worker)
+
+    def acquire(self) -> Optional[WarmWorker]:
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def release(self, worker: WarmWorker) -> None:
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+                return
+            self._all.remove(worker)
+            empty = not self._all
+        # Пул уже остановлен, пока воркер был занят
+        worker.discard()
+        if empty:
+            remove_tree(self.root)
+
+    def shutdown(self) -> None:
+        """Останавливает свободные воркеры; занятые остановятся при возврате в пул."""
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            for worker in idle:
+                self._all.remove(worker)
+            empty = not self._all
+        for worker in idle:
+            worker.discard()
+        if empty:
+            remove_tree(self.root)
+
+
+class WarmWorkerManager:
+    """Пулы теплых воркеров по форматам преамбул. Размер пула задается на шаблон."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._pools: Dict[str, WarmWorkerPool] = {}
+        self._pool_templates: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def pool_size(template_id: int) -> int:
+        return settings.WARM_POOL_SIZE_BY_TEMPLATE.get(template_id, settings.WARM_POOL_SIZE)
+
+    def run_pass(
+        self,
+        template_id: int,
+        fmt_name: str,
+        compiler_path: str,
+        env: dict,
+        temp_dir: Path,
+        timeout: int = 30,
+        extra_files: Sequence[str] = (),
+        on_line: Optional[Callable[[str], None]] = None
+    ) -> Optional[subprocess.CompletedProcess]:
+        """
+        Выполняет проход TeX в свободном теплом воркере.
+        Возвращает None, если пул выключен или все воркеры заняты — тогда нужен обычный запуск.
+        """
+        # document.tex уже с \endofdump (with_end_of_dump): преамбулу воркер выполнил заранее
+        preamble, body = PreambleFormatCache.split_preamble(
+            (temp_dir / "document.tex").read_text(encoding="utf-8")
+        )
+        if preamble is None:
+            return None
+        pool = self._get_pool(template_id, fmt_name, compiler_path, env, preamble)
+        if pool is None or pool.preamble != preamble:
+            return None
+        worker = pool.acquire()
+        if worker is None:
+            return None
+        try:
+            if not worker.is_alive():
+                # Процесс не дожил до документа — пересоздаем, а проход выполнит обычный запуск
+                logger.warning(f"Теплый воркер формата {fmt_name} завершился до задачи, пересоздаем")
+                self._recycle(worker)
+                return None
+            return worker.run(temp_dir, body, timeout=timeout, extra_files=extra_files, on_line=on_line)
+        except (subprocess.TimeoutExpired, ProcessLimitExceeded):
+            # Документ сам по себе слишком долгий или болтливый — обычный запуск не поможет
+            self._recycle(worker)
+            raise
+        except Exception:
+            # Сломанный воркер пересоздаем, а проход выполнит обычный запуск
+            logger.warning(f"Теплый воркер формата {fmt_name} упал, пересоздаем", exc_info=True)
+            self._recycle(worker)
+            return None
+        finally:
+            pool.release(worker)
+
+    @staticmethod
+    def _recycle(worker: WarmWorker) -> None:
+        """Пересоздает воркер после ошибки; своя ошибка не должна заслонить исходную."""
+        try:
+            worker.recycle()
+        except Exception:
+            logger.warning("Не удалось пересоздать теплый воркер", exc_info=True)
+            worker.stop()
+
+    def drop_template(self, template_id: int) -> None:
+        """Останавливает пулы шаблона (при изменении или удалении шаблона)."""
+        with self._lock:
+            names = [n for n, t in self._pool_templates.items() if t == template_id]
+            pools = [self._pools.pop(n) for n in names]
+            for name in names:
+                del self._pool_templates[name]
+        for pool in pools:
+            pool.shutdown()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            self._pool_templates.clear()
+        for pool in pools:
+            pool.shutdown()
+
+    def _get_pool(
+        self,
+        template_id: int,
+        fmt_name: str,
+        compiler_path: str,
+        env: dict,
+        preamble: str
+    ) -> Optional[WarmWorkerPool]:
+        size = self.pool_size(template_id)
+        if size <= 0:
+            return None
+        superseded = []
+        with self._lock:
+            pool = self._pools.get(fmt_name)
+            if pool is None:
+                # Формат с другим хэшем преамбулы того же шаблона и движка устарел
+                prefix = fmt_name.rsplit("_", 1)[0] + "_"
+                for name in [n for n in self._pools if n.startswith(prefix)]:
+                    superseded.append(self._pools.pop(name))
+                    del self._pool_templates[name]
+                command = [
+                    compiler_path,
+                    f"-fmt={fmt_name}",
+                    "-halt-on-error",
+                    "-jobname=document",
+                    _FIRST_LINE
+                ]
+                pool = WarmWorkerPool(
+                    self.root / fmt_name, command, env, size, settings.WARM_WORKER_MAX_JOBS, preamble
+                )
+                self._pools[fmt_name] = pool
+                self._pool_templates[fmt_name] = template_id
+        for old_pool in superseded:
+            logger.info(f"Преамбула шаблона {template_id} изменилась, останавливаем старый пул")
+            old_pool.shutdown()
+        return pool
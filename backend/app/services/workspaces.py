@@ -0,0 +1,91 @@
+# app/services/workspaces.py
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+from app.services.image_store import remove_tree
+
+logger = logging.getLogger(__name__)
+
+
+class BuildWorkspaces:
+    """
+    Постоянные папки сборки по документам.
+
+    В папке документа между компиляциями остаются .aux/.toc/.out, поэтому
+    перекрестные ссылки обычно сходятся уже на первом проходе.
+    Одну папку одновременно использует только одна компиляция (блокировка на документ),
+    лишние папки вытесняются по LRU.
+    """
+
+    def __init__(self, root: Path, max_workspaces: int):
+        self.root = root
+        self.max_workspaces = max_workspaces
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._locks: Dict[int, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._scanned = False
+
+    def path_for(self, doc_id: int) -> Path:
+        return self.root / f"doc_{doc_id}"
+
+    @contextmanager
+    def acquire(self, doc_id: int) -> Iterator[Path]:
+        """Захватывает папку документа на время компиляции."""
+        with self._guard:
+            self._scan_existing()
+            lock = self._locks.setdefault(doc_id, threading.Lock())
+            self._lru[doc_id] = None
+            self._lru.move_to_end(doc_id)
+
+        with lock:
+            workspace = self.path_for(doc_id)
+            workspace.mkdir(parents=True, exist_ok=True)
+            try:
+                yield workspace
+            finally:
+                self._evict()
+
+    def drop(self, doc_id: int) -> None:
+        """Удаляет папку документа (например, при удалении документа)."""
+        with self._guard:
+            lock = self._locks.get(doc_id)
+            if lock is not None and lock.locked():
+                return
+            self._lru.pop(doc_id, None)
+            self._locks.pop(doc_id, None)
+        remove_tree(self.path_for(doc_id))
+
+    def _evict(self) -> None:
+        with self._guard:
+            while len(self._lru) > self.max_workspaces:
+                # Ищем самую старую папку, которую сейчас никто не использует
+                victim = next(
+                    (d for d in self._lru if not (self._locks.get(d) and self._locks[d].locked())),
+                    None
+                )
+                if victim is None:
+                    return
+                del self._lru[victim]
+                self._locks.pop(victim, None)
+                remove_tree(self.path_for(victim))
+                logger.debug(f"Вытеснена папка сборки документа {victim}")
+
+    def _scan_existing(self) -> None:
+        """Подхватывает папки, оставшиеся от прошлого запуска (старые — первыми на вытеснение)."""
+        if self._scanned:
+            return
+        self._scanned = True
+        if not self.root.exists():
+            return
+        existing = []
+        for path in self.root.glob("doc_*"):
+            try:
+                existing.append((path.stat().st_mtime, int(path.name[len("doc_"):])))
+            except (ValueError, OSError):
+                continue
+        for _, doc_id in sorted(existing):
+            self._lru[doc_id] = None
@@ -0,0 +1,178 @@
+# app/worker.py
+"""
+Воркер общей очереди компиляции (таблица compile_jobs).
+
+Запуск из папки backend (таких процессов может быть сколько угодно на любых хостах):
+    python -m app.worker --concurrency 2
+
+Нужен COMPILE_JOBS_DURABLE = True у API. Папка media должна быть общей с API:
+воркер пишет туда готовые PDF.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import CompileJob, Template
+from app.services.compile_jobs import (
+    JOB_DONE, JOB_FAILED, claim_job, finish_job, has_newer_job, heartbeat, requeue_expired,
+)
+from app.services.compiler_services import CompilerService, warm_workers
+from app.services.image_service import ImageService
+from app.services.pdf_gc import store_compile_result
+
+logger = logging.getLogger(__name__)
+
+
+class CompileWorker:
+    """
+    Забирает задачи из compile_jobs (SELECT ... FOR UPDATE SKIP LOCKED), держит на них
+    аренду с пульсом и записывает результат в документ. Заодно возвращает в очередь
+    задачи, чья аренда истекла (их воркер упал).
+    """
+
+    def __init__(self, concurrency: int, worker_id: Optional[str] = None):
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="latex-compile")
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        logger.info(f"👷 Воркер компиляции {self.worker_id}: потоков {self.concurrency}")
+        tasks = [asyncio.create_task(self._loop(i)) for i in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._reaper()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _loop(self, slot: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with AsyncSessionLocal() as db:
+                    job = await claim_job(db, self.worker_id)
+                if job is None:
+                    await self._sleep(settings.COMPILE_JOB_POLL_SECONDS)
+                    continue
+                await self._run_job(job)
+            except Exception as e:
+                logger.error(f"Поток {slot}: ошибка обработки очереди: {e}", exc_info=True)
+                await self._sleep(settings.COMPILE_JOB_POLL_SECONDS)
+
+    async def _reaper(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with AsyncSessionLocal() as db:
+                    requeued = await requeue_expired(db)
+                if requeued:
+                    logger.info(f"♻️ Задач с истекшей арендой: {requeued}")
+            except Exception as e:
+                logger.error(f"Ошибка проверки аренд: {e}", exc_info=True)
+            await self._sleep(settings.COMPILE_JOB_LEASE_SECONDS / 2)
+
+    async def _heartbeat(self, job_id: int, lost: asyncio.Event) -> None:
+        while True:
+            await asyncio.sleep(settings.COMPILE_JOB_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    if not await heartbeat(db, job_id, self.worker_id):
+                        lost.set()
+                        return
+            except Exception as e:
+                # Временный сбой БД: аренда еще может быть жива, попробуем на следующем пульсе
+                logger.warning(f"Не удалось продлить аренду задачи {job_id}: {e}")
+
+    async def _run_job(self, job: CompileJob) -> None:
+        logger.info(f"⚙️ Задача {job.job_id}: документ {job.doc_id}, попытка {job.attempts}")
+        lost = asyncio.Event()
+        heartbeat_task = asyncio.create_task(self._heartbeat(job.job_id, lost))
+        error = None
+        try:
+            template_latex = None
+            async with AsyncSessionLocal() as db:
+                if job.template_id is not None:
+                    result = await db.execute(
+                        select(Template.latex_preambula_tmp).where(Template.template_id == job.template_id)
+                    )
+                    template_latex = result.scalars().first()
+                images = await ImageService.resolve_for_document(db, job.doc_id, job.latex_source)
+
+            pdf_content, log, diagnostics = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                partial(
+                    CompilerService.compile_latex_to_pdf,
+                    job.latex_source,
+                    template_id=job.template_id,
+                    template_latex=template_latex,
+                    doc_id=job.doc_id,
+                    images=images
+                )
+            )
+        except Exception as e:
+            logger.error(f"Ошибка компиляции документа {job.doc_id}: {e}", exc_info=True)
+            pdf_content, log, diagnostics = None, f"Системная ошибка: {str(e)}", None
+            error = str(e)
+        finally:
+            heartbeat_task.cancel()
+
+        if lost.is_set():
+            logger.warning(f"Аренда задачи {job.job_id} потеряна, результат не сохраняется")
+            return
+
+        async with AsyncSessionLocal() as db:
+            # Закрытие задачи и запись результата — одна транзакция
+            if not await finish_job(db, job.job_id, self.worker_id, JOB_DONE if pdf_content else JOB_FAILED, error):
+                await db.rollback()
+                logger.warning(f"Аренда задачи {job.job_id} потеряна, результат не сохраняется")
+                return
+            if await has_newer_job(db, job.doc_id):
+                logger.info(f"Результат компиляции документа {job.doc_id} устарел, не сохраняем")
+            else:
+                await store_compile_result(db, job.doc_id, pdf_content, log, diagnostics, job.source_hash)
+            await db.commit()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Воркер общей очереди компиляции")
+    parser.add_argument("--concurrency", type=int, default=settings.COMPILE_WORKERS,
+                        help="сколько документов компилировать одновременно")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    worker = CompileWorker(args.concurrency)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        logger.info("Воркер остановлен")
+    finally:
+        warm_workers.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+# benchmarks/compile_bench.py
+"""
+Бенчмарк конвейера компиляции LaTeX -> PDF.
+
+Замеряет пропускную способность, задержку (p50/p95/p99) и длительность этапов
+(wrap, validate, write, passes, read_back) при параллельности от 1 до N.
+
+Режимы:
+  direct — прямые вызовы CompilerService.compile_latex_to_pdf из пула потоков;
+  queue  — путь фоновой задачи compile_document_background_task:
+           очередь компиляции, постоянная папка документа и запись PDF в media
+           (без обращений к БД).
+
+Движок: fake — заглушка benchmarks/fake_tex.py (TeX Live не нужен),
+real — установленный xelatex, auto — real, если xelatex найден.
+
+Запуск из папки backend:
+    python -m benchmarks.compile_bench --max-concurrency 4 --jobs 20
+    python -m benchmarks.compile_bench --engine real --mode direct
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/), чтобы сравнивать прогоны.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+PHASES = ("validate", "wrap", "write", "passes", "read_back", "store")
+
+# Первый документ с id из этого диапазона — чтобы не пересекаться с настоящими папками сборки
+BENCH_DOC_ID_BASE = 900_000_000
+
+SAMPLE_DOCUMENT = r"""\documentclass[12pt]{article}
+\usepackage{amsmath}
+\begin{document}
+\tableofcontents
+\section{Введение}
+Тестовый документ для замера скорости компиляции. \label{sec:intro}
+\section{Основная часть}
+См. раздел~\ref{sec:intro}.
+\begin{equation}
+E = mc^2
+\end{equation}
+\section{Заключение}
+Конец документа.
+\end{document}
+"""
+
+
+def install_fake_engine(delay: float) -> Path:
+    """Кладет обертку xelatex -> fake_tex.py в отдельную папку и ставит ее первой в PATH."""
+    if platform.system() == "Windows":
+        # CompilerService на Windows вызывает именно xelatex.exe — скрипт его не заменит
+        raise SystemExit("Заглушка движка поддерживается только на Linux/macOS, используйте --engine real")
+
+    bin_dir = Path(tempfile.mkdtemp(prefix="fake_tex_"))
+    wrapper = bin_dir / "xelatex"
+    wrapper.write_text(
+        "#!/bin/sh\n"
+        f'exec "{sys.executable}" "{BENCH_DIR / "fake_tex.py"}" "$@"\n',
+        encoding="utf-8"
+    )
+    wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ["FAKE_TEX_DELAY"] = str(delay)
+    return bin_dir
+
+
+def make_source(base: str, level: int, job: int, unique: bool) -> str:
+    """Исходник задания; с unique каждое задание отличается и не попадает в кэш PDF."""
+    if not unique:
+        return base
+    return f"% bench {level}-{job}\n{base}"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль по ближайшему рангу."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5 - 1e-9)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(
+    mode: str,
+    concurrency: int,
+    wall: float,
+    latencies: List[float],
+    timings: List[Dict[str, float]],
+    failures: int
+) -> Dict[str, Any]:
+    ms = [value * 1000 for value in latencies]
+    phases = {}
+    for phase in PHASES:
+        values = [t[phase] * 1000 for t in timings if phase in t]
+        if values:
+            phases[phase] = {
+                "mean": round(statistics.mean(values), 3),
+                "p95": round(percentile(values, 95), 3),
+            }
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "jobs": len(latencies),
+        "failures": failures,
+        "wall_seconds": round(wall, 4),
+        "throughput_per_second": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(ms), 3) if ms else 0.0,
+            "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(max(ms), 3) if ms else 0.0,
+        },
+        "phases_ms": phases,
+    }
+
+
+def run_direct(source: str, concurrency: int, jobs: int, unique: bool, use_workspace: bool) -> Dict[str, Any]:
+    """Прямые вызовы compile_latex_to_pdf из concurrency потоков."""
+    from app.services.compiler_services import CompilerService, workspaces
+
+    def one(job: int):
+        latex = make_source(source, concurrency, job, unique)
+        doc_id = BENCH_DOC_ID_BASE + job if use_workspace else None
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        validate_started = time.perf_counter()
+        CompilerService.validate_latex_content(latex)
+        timings["validate"] = time.perf_counter() - validate_started
+
+        pdf, _, _ = CompilerService.compile_latex_to_pdf(latex, doc_id=doc_id, timings=timings)
+        return time.perf_counter() - started, timings, pdf is not None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(jobs)))
+    wall = time.perf_counter() - started
+
+    if use_workspace:
+        for job in range(jobs):
+            workspaces.drop(BENCH_DOC_ID_BASE + job)
+
+    return summarize(
+        "direct", concurrency, wall,
+        [r[0] for r in results], [r[1] for r in results],
+        sum(1 for r in results if not r[2])
+    )
+
+
+async def run_queue(source: str, concurrency: int, jobs: int, unique: bool, media_dir: Path) -> Dict[str, Any]:
+    """
+    Путь фоновой задачи: проверка исходника, постановка в очередь с concurrency воркерами,
+    компиляция в папке документа и запись PDF. Задержка считается от постановки в очередь.
+    """
+    from app.services.compile_queue import CompileQueue
+    from app.services.compiler_services import CompilerService, workspaces
+
+    queue = CompileQueue(workers=concurrency, max_pending=jobs)
+    await queue.start()
+    loop = asyncio.get_running_loop()
+
+    def make_job(doc_id: int, latex: str, timings: Dict[str, float], done: asyncio.Future):
+        async def job(generation: int):
+            try:
+                pdf, _, _ = await queue.run_blocking(
+                    partial(CompilerService.compile_latex_to_pdf, latex, doc_id=doc_id, timings=timings)
+                )
+                if pdf:
+                    store_started = time.perf_counter()
+                    (media_dir / f"document_{doc_id}.pdf").write_bytes(pdf)
+                    timings["store"] = time.perf_counter() - store_started
+                done.set_result((time.perf_counter(), pdf is not None))
+            except Exception as e:
+                done.set_result((time.perf_counter(), False))
+                logging.error(f"Задание {doc_id} упало: {e}")
+        return job
+
+    submitted = []
+    started = time.perf_counter()
+    for job_index in range(jobs):
+        latex = make_source(source, concurrency, job_index, unique)
+        doc_id = BENCH_DOC_ID_BASE + job_index
+        timings: Dict[str, float] = {}
+
+        validate_started = time.perf_counter()
+        CompilerService.validate_latex_content(latex)
+        timings["validate"] = time.perf_counter() - validate_started
+
+        done = loop.create_future()
+        submit_at = time.perf_counter()
+        queue.submit(doc_id, f"{concurrency}-{job_index}", make_job(doc_id, latex, timings, done))
+        submitted.append((submit_at, timings, done))
+
+    outcomes = await asyncio.gather(*(done for _, _, done in submitted))
+    wall = time.perf_counter() - started
+    await queue.stop()
+
+    for job_index in range(jobs):
+        workspaces.drop(BENCH_DOC_ID_BASE + job_index)
+
+    return summarize(
+        "queue", concurrency, wall,
+        [finished - submit_at for (submit_at, _, _), (finished, _) in zip(submitted, outcomes)],
+        [timings for _, timings, _ in submitted],
+        sum(1 for _, ok in outcomes if not ok)
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера компиляции LaTeX")
+    parser.add_argument("--engine", choices=("auto", "fake", "real"), default="auto",
+                        help="fake — заглушка, real — установленный xelatex (по умолчанию: real, если найден)")
+    parser.add_argument("--mode", choices=("direct", "queue", "both"), default="both")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="уровни параллельности 1..N")
+    parser.add_argument("--jobs", type=int, default=20, help="заданий на каждый уровень")
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка одного прохода заглушки, с")
+    parser.add_argument("--source", type=Path, help=".tex файл вместо встроенного примера")
+    parser.add_argument("--cached", action="store_true",
+                        help="одинаковый исходник во всех заданиях (замер с кэшем PDF)")
+    parser.add_argument("--no-workspace", action="store_true",
+                        help="режим direct без постоянной папки документа (временная папка на каждое задание)")
+    parser.add_argument("--output", type=Path, help="куда записать JSON с результатами")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    engine = args.engine
+    if engine == "auto":
+        engine = "real" if shutil.which("xelatex") else "fake"
+    fake_bin = install_fake_engine(args.delay) if engine == "fake" else None
+
+    # Импорт после подмены PATH: реестр движков должен найти нужный xelatex
+    from app.core.config import settings
+    from app.services.compiler_services import CompilerService
+    from app.services.pdf_cache import pdf_cache
+    from app.services.toolchain import toolchain
+
+    toolchain.invalidate()
+    available, message = CompilerService.verify_compiler_available("xelatex")
+    if not available:
+        print(f"❌ {message}")
+        return 1
+    print(f"✅ {message}")
+
+    source = args.source.read_text(encoding="utf-8") if args.source else SAMPLE_DOCUMENT
+    unique = not args.cached
+    media_dir = Path(tempfile.mkdtemp(prefix="bench_media_"))
+    temp_root = CompilerService._get_temp_root()
+    temp_before = set(temp_root.iterdir()) if temp_root.exists() else set()
+
+    modes = ("direct", "queue") if args.mode == "both" else (args.mode,)
+    results = []
+    try:
+        for mode in modes:
+            for concurrency in range(1, args.max_concurrency + 1):
+                pdf_cache.clear()
+                if mode == "direct":
+                    result = run_direct(source, concurrency, args.jobs, unique, not args.no_workspace)
+                else:
+                    result = asyncio.run(run_queue(source, concurrency, args.jobs, unique, media_dir))
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"{mode:6} c={concurrency:<2} {result['throughput_per_second']:8.2f} комп./с  "
+                    f"p50={latency['p50']:.1f} p95={latency['p95']:.1f} p99={latency['p99']:.1f} мс  "
+                    f"ошибок: {result['failures']}"
+                )
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+        if fake_bin is not None:
+            shutil.rmtree(fake_bin, ignore_errors=True)
+        # Временные папки сборок, созданные этим прогоном
+        if temp_root.exists():
+            for path in set(temp_root.iterdir()) - temp_before:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "engine": engine,
+        "engine_version": message,
+        "fake_delay_seconds": args.delay if engine == "fake" else None,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "latex_max_runs": settings.LATEX_MAX_RUNS,
+        "jobs_per_level": args.jobs,
+        "cached": args.cached,
+        "source_bytes": len(source.encode("utf-8")),
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        output = BENCH_DIR / "results" / f"compile_{engine}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📊 Результаты: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
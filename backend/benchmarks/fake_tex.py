@@ -0,0 +1,130 @@
+# benchmarks/fake_tex.py
+"""
+Заглушка движка TeX для бенчмарков конвейера компиляции.
+
+Понимает те же аргументы, что xelatex в CompilerService и теплых воркерах:
+после задержки FAKE_TEX_DELAY (секунды) пишет детерминированные
+document.aux / document.log / document.pdf. Содержимое .aux зависит только
+от исходника, поэтому адаптивные проходы сходятся как у настоящего TeX:
+2 прохода в пустой папке, 1 — при повторной сборке того же текста.
+
+Исходник с \\fakeerror завершается ошибкой с записью в .log (проверка пути диагностик).
+"""
+import hashlib
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+VERSION = "XeTeX 3.141592653-2.6-0.999995 (fake benchmark engine)"
+
+
+def _parse_args(argv):
+    output_dir = None
+    jobname = "document"
+    tex_path = None
+    is_ini = False
+    preload = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "-output-directory" and i + 1 < len(argv):
+            output_dir = argv[i + 1]
+            i += 2
+            continue
+        if arg.startswith("-output-directory="):
+            output_dir = arg.split("=", 1)[1]
+        elif arg.startswith("-jobname="):
+            jobname = arg.split("=", 1)[1]
+        elif arg == "-ini":
+            is_ini = True
+        elif arg.startswith("\\"):
+            # Первая строка теплого воркера: \input преамбулы, затем \read имени файла
+            match = re.match(r"\\input (\S+) ", arg)
+            preload = match.group(1) if match else None
+        elif not arg.startswith("-") and not arg.startswith("&"):
+            tex_path = arg
+        i += 1
+    return output_dir, jobname, tex_path, is_ini, preload
+
+
+def _fake_pdf(source: str) -> bytes:
+    """Минимальный PDF; размер и число страниц растут вместе с исходником."""
+    pages = 1 + len(source) // 3000
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    body = "".join(f"% page {n} {digest}\n" for n in range(pages))
+    return (
+        "%PDF-1.5\n"
+        f"% fake {digest}\n"
+        f"{body}"
+        "1 0 obj << /Type /Catalog >> endobj\n"
+        "trailer << /Root 1 0 R >>\n"
+        "%%EOF\n"
+    ).encode("ascii")
+
+
+def _compile(tex_file: Path, out_dir: Path, jobname: str) -> int:
+    source = tex_file.read_text(encoding="utf-8")
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    time.sleep(float(os.environ.get("FAKE_TEX_DELAY", "0.05")))
+
+    print(f"This is {VERSION}")
+    print(f"({tex_file.name}")
+
+    if "\\fakeerror" in source:
+        line_no = source[:source.index("\\fakeerror")].count("\n") + 1
+        (out_dir / f"{jobname}.log").write_text(
+            f"This is {VERSION}\n"
+            "! Undefined control sequence.\n"
+            f"l.{line_no} \\fakeerror\n",
+            encoding="utf-8"
+        )
+        print("! Undefined control sequence.")
+        return 1
+
+    pdf = _fake_pdf(source)
+    (out_dir / f"{jobname}.aux").write_text(f"\\relax\n% {digest}\n", encoding="utf-8")
+    (out_dir / f"{jobname}.log").write_text(
+        f"This is {VERSION}\n"
+        f"Output written on {jobname}.pdf ({1 + len(source) // 3000} pages, {len(pdf)} bytes).\n",
+        encoding="utf-8"
+    )
+    (out_dir / f"{jobname}.pdf").write_bytes(pdf)
+    print(f"Output written on {jobname}.pdf")
+    return 0
+
+
+def main(argv) -> int:
+    if "--version" in argv:
+        print(VERSION)
+        return 0
+
+    output_dir, jobname, tex_path, is_ini, preload = _parse_args(argv)
+    cwd = Path.cwd()
+
+    if is_ini:
+        # Дамп формата преамбулы: достаточно файла .fmt с нужным именем
+        (cwd / f"{jobname}.fmt").write_bytes(b"fake format\n")
+        return 0
+
+    if tex_path is not None:
+        tex_file = Path(tex_path)
+        if not tex_file.is_absolute():
+            tex_file = cwd / tex_file
+        out_dir = Path(output_dir) if output_dir else cwd
+        return _compile(tex_file, out_dir, jobname)
+
+    # Теплый воркер: преамбула выполняется до задачи, имя файла приходит на stdin
+    if preload is not None:
+        (cwd / f"{preload}.tex").read_text(encoding="utf-8")
+        print(f"({preload}.tex)", flush=True)
+    line = sys.stdin.readline().strip()
+    if not line:
+        return 1
+    return _compile(cwd / line, cwd, jobname)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+# benchmarks/scanner_bench.py
+"""
+Микробенчмарк предобработки исходника перед компиляцией.
+
+Сравнивает прежнюю схему (шесть регулярных выражений с IGNORECASE в валидации,
+проверки `in` и split/join в обертке, отдельный поиск кириллицы) с одним проходом
+latex_scanner.scan_latex. Заодно проверяет, что результаты совпадают.
+
+Запуск из папки backend:
+    python -m benchmarks.scanner_bench --sizes 10 100 500 --repeat 50
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.services.compiler_services import CompilerService
+from app.services.latex_scanner import scan_latex
+
+_LEGACY_DANGEROUS = [
+    r"\\write18\s*{",
+    r"\\immediate\s*\\write18\s*{",
+    r"\\special\s*{[^}]*shell[^}]*}",
+    r"\\special\s*{[^}]*exec[^}]*}",
+    r"\\input\s*{[^}]*\.\.\.[^}]*}",
+    r"\\include\s*{[^}]*\.\.\.[^}]*}",
+]
+
+_LEGACY_RUSSIAN_LINES = [
+    "",
+    "% ========== РУССКИЙ ЯЗЫК ==========",
+    "\\usepackage{fontspec}",
+    "\\usepackage{polyglossia}",
+    "\\setmainlanguage{russian}",
+    "\\setotherlanguage{english}",
+    "\\newfontfamily\\russianfont{CMU Serif}",
+    "\\newfontfamily\\russianfonttt{CMU Typewriter Text}",
+    "\\newfontfamily\\russianfontsf{CMU Sans Serif}",
+    "",
+]
+
+
+def legacy_validate(latex_content: str):
+    if not latex_content or not latex_content.strip():
+        return False, "Пустой LaTeX контент"
+    if "\\begin{document}" in latex_content and "\\end{document}" not in latex_content:
+        return False, "Есть \\begin{document} но нет \\end{document}"
+    for pattern in _LEGACY_DANGEROUS:
+        if re.search(pattern, latex_content, re.IGNORECASE):
+            return False, "Обнаружена опасная команда"
+    return True, "LaTeX код валиден"
+
+
+def legacy_wrap(latex_content: str) -> Optional[str]:
+    """Прежняя обертка (ветка без \\documentclass в сравнении не участвует — она не менялась)."""
+    if "\\documentclass" not in latex_content:
+        return None
+    if "\\usepackage[english,russian]{babel}" in latex_content or \
+       "\\usepackage{polyglossia}" in latex_content or \
+       "\\usepackage[utf8]{inputenc}" in latex_content:
+        return latex_content
+    result_lines = []
+    added = False
+    for line in latex_content.split('\n'):
+        result_lines.append(line)
+        if "\\documentclass" in line and not added:
+            result_lines.extend(_LEGACY_RUSSIAN_LINES)
+            added = True
+    return '\n'.join(result_lines)
+
+
+# Граничные случаи для проверки совпадения результатов
+EDGE_CASES = [
+    "\\write18{rm -rf /}",
+    "\\immediate\\write18 {ls}",
+    "\\WRITE18\n{ls}",
+    "\\write18 x{",
+    "\\Special{SHELL: ls}",
+    "\\special {pdf: exec}",
+    "\\special{color push}",
+    "\\specialrule{1pt}{0pt}{0pt}",
+    "\\input{../../...}",
+    "\\include {a...b}",
+    "\\includeonly{a...b}",
+    "\\includegraphics{a...b.png}",
+    "\\input{chapter1}",
+    "\\begin{document} текст",
+    "\\begin{document} \\end{document}",
+    "\\documentclass{article}",
+    "\\documentclass{article}\n\\usepackage{polyglossia}\n\\begin{document}x\\end{document}",
+    "% \\documentclass{article}\ntext\n\\usepackage[utf8]{inputenc}",
+    "english only \\textbf{x}",
+    "   ",
+]
+
+
+def legacy_pipeline(latex_content: str):
+    valid = legacy_validate(latex_content)
+    wrapped = legacy_wrap(latex_content)
+    has_cyrillic = bool(re.search('[а-яА-Я]', latex_content))
+    return valid, wrapped, has_cyrillic
+
+
+def scanner_pipeline(latex_content: str):
+    # Как в реальном запросе: первая проверка сканирует, остальные берут результат из кэша
+    scan_latex.cache_clear()
+    valid = CompilerService.validate_latex_content(latex_content)
+    wrapped = CompilerService._wrap_latex_with_russian_support(latex_content)
+    has_cyrillic = scan_latex(latex_content).has_cyrillic
+    return valid, wrapped, has_cyrillic
+
+
+def make_document(size_kb: int) -> str:
+    """Диплом заданного размера: преамбула, разделы с кириллицей, формулами и картинками."""
+    preamble = (
+        "\\documentclass[14pt]{extreport}\n"
+        "\\usepackage{amsmath}\n\\usepackage{graphicx}\n\\usepackage{hyperref}\n"
+        "\\begin{document}\n\\tableofcontents\n"
+    )
+    section = (
+        "\\section{Раздел}\n"
+        "Текст выпускной работы с \\textbf{выделением} и ссылкой~\\ref{eq:main}. "
+        "Пример формулы: \\begin{equation}\\label{eq:main} E = mc^2 \\end{equation}\n"
+        "\\begin{figure}[h]\\centering\\includegraphics[width=\\textwidth]{plot.png}"
+        "\\caption{График}\\end{figure}\n"
+        "Обычный абзац текста без команд, который занимает большую часть диплома. " * 4
+        + "\n\n"
+    )
+    body = []
+    size = len(preamble)
+    while size < size_kb * 1024:
+        body.append(section)
+        size += len(section)
+    return preamble + "".join(body) + "\\end{document}\n"
+
+
+def measure(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Микробенчмарк сканера LaTeX")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="размеры документов, КБ")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", type=Path, help="куда записать JSON с результатами")
+    args = parser.parse_args(argv)
+
+    for case in EDGE_CASES:
+        legacy_result = legacy_pipeline(case)
+        scanner_result = scanner_pipeline(case)
+        # Ветка без \\documentclass не менялась — ее результат не сравниваем
+        if legacy_result[1] is None:
+            legacy_result, scanner_result = legacy_result[::2], scanner_result[::2]
+        if legacy_result != scanner_result:
+            print(f"❌ Результаты расходятся: {case!r}")
+            return 1
+
+    results = []
+    for size_kb in args.sizes:
+        text = make_document(size_kb)
+        for variant in (text, text.replace("\\usepackage{amsmath}", "\\usepackage{polyglossia}")):
+            legacy_result = legacy_pipeline(variant)
+            scanner_result = scanner_pipeline(variant)
+            if legacy_result != scanner_result:
+                print(f"❌ Результаты расходятся на документе {size_kb} КБ")
+                return 1
+
+        legacy = measure(legacy_pipeline, text, args.repeat)
+        scanner = measure(scanner_pipeline, text, args.repeat)
+        results.append({
+            "size_kb": size_kb,
+            "legacy_ms": round(legacy * 1000, 3),
+            "scanner_ms": round(scanner * 1000, 3),
+            "speedup": round(legacy / scanner, 2) if scanner > 0 else None,
+        })
+        print(f"{size_kb:5} КБ: было {legacy * 1000:8.3f} мс, стало {scanner * 1000:8.3f} мс (x{legacy / scanner:.1f})")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"📊 Результаты: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# Тесты запускаются из backend/ или из корня репозитория: пакет app — в backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,51 @@
+# tests/test_compile_queue.py
+import asyncio
+
+from app.services.compile_queue import CompileQueue
+
+
+def test_finished_jobs_do_not_leave_generations():
+    """После завершения задач в очереди не остается записей о документах."""
+
+    async def scenario():
+        queue = CompileQueue(workers=1, max_pending=10)
+        await queue.start()
+        done = []
+
+        async def job(generation):
+            done.append(generation)
+
+        for doc_id in range(5):
+            queue.submit(doc_id, "hash", job)
+        assert await queue.run(("preview", 1), lambda: "pdf") == "pdf"
+        await queue._queue.join()
+        await queue.stop()
+        return done, queue
+
+    done, queue = asyncio.run(scenario())
+    assert len(done) == 5
+    assert queue._generation == {}
+    assert queue.stats()["pending"] == 0 and queue.stats()["running"] == 0
+
+
+def test_replaced_job_is_not_current():
+    """Задача, замененная новым исходником, остается устаревшей и после чистки."""
+
+    async def scenario():
+        queue = CompileQueue(workers=1, max_pending=10)
+        await queue.start()
+        results = {}
+
+        async def job(generation):
+            results[generation] = queue.is_current(7, generation)
+
+        first = queue.submit(7, "old", job)
+        second = queue.submit(7, "new", job)
+        await queue._queue.join()
+        await queue.stop()
+        return first, second, results, queue
+
+    first, second, results, queue = asyncio.run(scenario())
+    assert first.generation != second.generation
+    assert results == {second.generation: True}
+    assert not queue.is_current(7, first.generation)
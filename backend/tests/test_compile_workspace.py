@@ -0,0 +1,21 @@
+# tests/test_compile_workspace.py
+from app.services.compiler_services import CompilerService
+
+STALE_LOG = """This is XeTeX, Version 3.141592653
+! Undefined control sequence.
+l.42 \\foo
+"""
+
+
+def test_failed_pass_does_not_report_previous_log(tmp_path):
+    """Лог прошлой сборки в постоянной папке не выдается за диагностику текущей."""
+    (tmp_path / "document.log").write_text(STALE_LOG, encoding="utf-8")
+
+    pdf, log, diagnostics = CompilerService._compile_in_dir(
+        tmp_path, "\\documentclass{article}\\begin{document}x\\end{document}",
+        "no-such-tex-engine", 1, None, None, "test-key", []
+    )
+
+    assert pdf is None
+    assert "Компилятор не найден" in log
+    assert diagnostics == []
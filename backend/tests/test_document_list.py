@@ -0,0 +1,58 @@
+# tests/test_document_list.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("asyncpg")  # app.db.session создает движок PostgreSQL при импорте
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.documents import DOCUMENT_SUMMARY_COLUMNS, read_documents
+from app.db.base import Base
+from app.models.models import Document, Template, User
+from app.schemas.document import DocumentSummary
+
+
+def test_summary_columns_cover_summary_schema():
+    """Каждое поле DocumentSummary (кроме pdf_hash, его считает API) загружается запросом списка."""
+    loaded = {column.key for column in DOCUMENT_SUMMARY_COLUMNS}
+    assert set(DocumentSummary.model_fields) - {"pdf_hash"} <= loaded
+
+
+def test_document_page_serializes_summaries():
+    """Страница, загруженная через load_only, сериализуется без ленивых догрузок."""
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            user = User(
+                login="student", email="student@example.com", password_hash="x",
+                last_name="Иванов", first_name="Иван"
+            )
+            template = Template(name_tmp="Отчет", latex_preambula_tmp="\\documentclass{article}")
+            db.add_all([user, template])
+            await db.flush()
+            db.add(Document(
+                name_doc="Лабораторная", user_id=user.user_id, template_id=template.template_id,
+                latex_source="\\begin{document}\\end{document}", content_json={}, version=3
+            ))
+            await db.commit()
+
+            page = await read_documents(cursor=None, limit=100, db=db, current_user=user)
+            data = page.model_dump(mode="json")
+
+        await engine.dispose()
+        return data
+
+    data = asyncio.run(scenario())
+    assert data["next_cursor"] is None
+    assert len(data["items"]) == 1
+    assert data["items"][0]["name_doc"] == "Лабораторная"
+    assert data["items"][0]["version"] == 3
+    assert data["items"][0]["pdf_hash"] is None
@@ -0,0 +1,51 @@
+# tests/test_image_store.py
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+from app.services.image_store import ImageStore, link_file, remove_tree
+
+
+@pytest.fixture
+def windows_unlink(monkeypatch):
+    """Как на Windows: файл с атрибутом "только чтение" не удаляется."""
+    real_unlink = Path.unlink
+
+    def unlink(self, missing_ok=False):
+        if self.exists() and not self.is_symlink() and not os.stat(self).st_mode & stat.S_IWRITE:
+            raise PermissionError(13, "Access is denied", str(self))
+        return real_unlink(self, missing_ok=missing_ok)
+
+    def rmtree_unlink(path, *args, dir_fd=None, **kwargs):
+        mode = os.stat(path, dir_fd=dir_fd, follow_symlinks=False).st_mode
+        if not stat.S_ISLNK(mode) and not mode & stat.S_IWRITE:
+            raise PermissionError(13, "Access is denied", str(path))
+        return real_os_unlink(path, *args, dir_fd=dir_fd, **kwargs)
+
+    real_os_unlink = os.unlink
+    monkeypatch.setattr(Path, "unlink", unlink)
+    monkeypatch.setattr(os, "unlink", rmtree_unlink)
+
+
+def test_read_only_blob_is_relinked_and_removed(tmp_path, windows_unlink):
+    store = ImageStore(tmp_path / "images")
+    old_digest, old_blob = store.put(b"old logo", ".png")
+    new_digest, new_blob = store.put(b"new logo", ".png")
+    assert not os.stat(old_blob).st_mode & stat.S_IWRITE
+
+    workspace = tmp_path / "ws"
+    workspace.mkdir()
+    dst = workspace / "logo.png"
+    link_file(old_blob, dst)
+    # Картинку заменили: ссылка на старый read-only файл перезаписывается
+    link_file(new_blob, dst)
+    assert dst.read_bytes() == b"new logo"
+
+    store.remove(old_digest, ".png")
+    assert not old_blob.exists()
+
+    remove_tree(workspace)
+    assert not workspace.exists()
+    assert new_blob.read_bytes() == b"new logo"
@@ -0,0 +1,88 @@
+# tests/test_pdf_gc.py
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+pytest.importorskip("asyncpg")  # app.db.session создает движок PostgreSQL при импорте
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.base import Base
+from app.models.models import Document, Template, User
+from app.services import pdf_gc
+from app.services.pdf_store import PdfStore
+from app.services.revision_service import RevisionService, _latex_hash
+
+
+def test_pdf_of_old_revision_is_collected(tmp_path, monkeypatch):
+    """PDF, на который ссылалась только вышедшая из REVISION_PDF_KEEP версия, удаляется."""
+    store = PdfStore(tmp_path)
+    monkeypatch.setattr(pdf_gc, "pdf_store", store)
+    monkeypatch.setattr(settings, "REVISION_PDF_KEEP", 2)
+
+    async def compile_version(db, doc, pdf):
+        await pdf_gc.store_compile_result(db, doc.doc_id, pdf, "log", [], _latex_hash(doc.latex_source))
+        await db.commit()
+
+    async def save_version(db, doc, latex):
+        previous = doc.latex_source
+        doc.latex_source = latex
+        doc.version += 1
+        await RevisionService.record(db, doc, previous, doc.content_json)
+        await db.commit()
+
+    def age_files():
+        old = time.time() - settings.PDF_GC_GRACE_SECONDS - 60
+        for path in store.root.glob("*/*.pdf"):
+            os.utime(path, (old, old))
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            user = User(
+                login="student", email="student@example.com", password_hash="x",
+                last_name="Иванов", first_name="Иван"
+            )
+            template = Template(name_tmp="Отчет", latex_preambula_tmp="\\documentclass{article}")
+            db.add_all([user, template])
+            await db.flush()
+            doc = Document(
+                name_doc="Лабораторная", user_id=user.user_id, template_id=template.template_id,
+                latex_source="v1", content_json={}
+            )
+            db.add(doc)
+            await db.flush()
+            await RevisionService.record(db, doc)
+            await db.commit()
+
+            await compile_version(db, doc, b"%PDF v1")
+            first_pdf = store.media_root / store.relative_path(hashlib.sha256(b"%PDF v1").hexdigest())
+
+            # Документ перекомпилирован, но версия 1 еще в пределах REVISION_PDF_KEEP
+            await save_version(db, doc, "v2")
+            await compile_version(db, doc, b"%PDF v2")
+            age_files()
+            await pdf_gc.collect_pdf_garbage(db)
+            kept_while_recent = first_pdf.exists()
+
+            # Версия 1 вышла из последних REVISION_PDF_KEEP — ее PDF больше никому не нужен
+            await save_version(db, doc, "v3")
+            age_files()
+            removed = await pdf_gc.collect_pdf_garbage(db)
+
+        await engine.dispose()
+        return kept_while_recent, removed, first_pdf.exists()
+
+    kept_while_recent, removed, first_exists = asyncio.run(scenario())
+    assert kept_while_recent
+    assert removed == 1
+    assert not first_exists
@@ -0,0 +1,72 @@
+# tests/test_preamble_formats.py
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app.services.preamble_formats import PreambleFormatCache
+
+REPORT = Path(__file__).resolve().parents[1] / "templates" / "report.tex"
+
+
+def test_report_packages_are_dumped_and_fonts_are_not():
+    preamble, _ = PreambleFormatCache.split_preamble(REPORT.read_text(encoding="utf-8"))
+    dumped, rest = PreambleFormatCache.split_dump(preamble)
+
+    assert dumped.startswith("\\documentclass")
+    for package in ("hyperref", "graphicx", "tabu", "geometry", "caption", "amsmath", "tocloft"):
+        assert package in dumped
+    # polyglossia грузит fontspec, а шрифты в формат попасть не могут
+    assert "polyglossia" not in dumped
+    assert "\\usepackage{polyglossia}" in rest
+    assert "\\setmainfont{Times New Roman}" in rest
+    # Настройки пакетов выполняются после выбора шрифта и языка
+    assert "\\renewcaptionname{russian}" in rest
+    assert "\\setlength{\\cftbeforesecskip}{0.5em}" in rest
+
+
+def test_multiline_command_is_not_split():
+    preamble = (
+        "\\documentclass{article}\n"
+        "\\usepackage{fontspec,\n  xcolor}\n"
+        "\\usepackage[\n  colorlinks=true\n]{hyperref}\n"
+        "\\hypersetup{\n  linkcolor=black\n}\n"
+    )
+    dumped, rest = PreambleFormatCache.split_dump(preamble)
+    assert dumped == "\\documentclass{article}\n\\usepackage[\n  colorlinks=true\n]{hyperref}\n"
+    assert rest == "\\usepackage{fontspec,\n  xcolor}\n\\hypersetup{\n  linkcolor=black\n}\n"
+
+
+def _xelatex(args, cwd: Path, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["xelatex", "-interaction=nonstopmode", "-halt-on-error", *args],
+        cwd=cwd, env=env, capture_output=True, text=True, errors="replace", timeout=300
+    )
+
+
+@pytest.mark.skipif(shutil.which("xelatex") is None, reason="xelatex не установлен")
+def test_report_compiles_with_real_format(tmp_path):
+    """Формат report.tex собирается настоящим xelatex, и документ с ним компилируется."""
+    latex = REPORT.read_text(encoding="utf-8")
+    plain = tmp_path / "plain"
+    plain.mkdir()
+    (plain / "document.tex").write_text(latex, encoding="utf-8")
+    if _xelatex(["document.tex"], plain).returncode != 0:
+        pytest.skip("report.tex не компилируется и без формата (нет шрифтов шаблона?)")
+
+    cache = PreambleFormatCache(tmp_path / "formats")
+    name = cache.get_format(1, latex, latex)
+    assert name is not None, cache._failed
+
+    with_format = tmp_path / "with_format"
+    with_format.mkdir()
+    (with_format / "document.tex").write_text(PreambleFormatCache.with_end_of_dump(latex), encoding="utf-8")
+    result = _xelatex([f"-fmt={name}", "-recorder", "document.tex"], with_format, cache.env_for())
+    assert result.returncode == 0, result.stdout[-2000:]
+    assert (with_format / "document.pdf").exists()
+
+    # Пакеты из формата не читаются заново
+    opened = (with_format / "document.fls").read_text(encoding="utf-8", errors="replace")
+    assert "hyperref.sty" not in opened
+    assert "tabu.sty" not in opened
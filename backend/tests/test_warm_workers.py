@@ -0,0 +1,79 @@
+# tests/test_warm_workers.py
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.services.preamble_formats import PreambleFormatCache
+from app.services.warm_workers import _FIRST_LINE, WarmWorker
+
+BACKEND = Path(__file__).resolve().parents[1]
+REPORT = BACKEND / "templates" / "report.tex"
+
+
+def _split(latex: str):
+    return PreambleFormatCache.split_preamble(PreambleFormatCache.with_end_of_dump(latex))
+
+
+def test_fake_worker_runs_preamble_before_job_and_keeps_line_numbers(tmp_path):
+    """Преамбула выполняется до задачи, а ошибка в теле указывает на строку document.tex."""
+    latex = REPORT.read_text(encoding="utf-8").replace("\\section{Вывод}", "\\fakeerror")
+    preamble, body = _split(latex)
+    temp_dir = tmp_path / "build"
+    temp_dir.mkdir()
+    document = PreambleFormatCache.with_end_of_dump(latex)
+    (temp_dir / "document.tex").write_text(document, encoding="utf-8")
+
+    command = [
+        sys.executable, str(BACKEND / "benchmarks" / "fake_tex.py"),
+        "-fmt=fake", "-halt-on-error", "-jobname=document", _FIRST_LINE
+    ]
+    worker = WarmWorker(tmp_path / "worker", command, dict(os.environ, FAKE_TEX_DELAY="0"), 5, preamble)
+    worker.start()
+    try:
+        # Задача еще не отправлена, а преамбула уже прочитана
+        assert worker.process.stdout.readline().strip() == "(warm_preamble.tex)"
+        result = worker.run(temp_dir, body)
+    finally:
+        worker.discard()
+
+    assert result.returncode == 1
+    error_line = document[:document.index("\\fakeerror")].count("\n") + 1
+    log = (temp_dir / "document.log").read_text(encoding="utf-8")
+    assert f"l.{error_line} \\fakeerror" in log
+
+
+@pytest.mark.skipif(shutil.which("xelatex") is None, reason="xelatex не установлен")
+def test_real_worker_preloads_template_packages(tmp_path):
+    """В теплом воркере пакеты шаблона загружены до документа: тело их уже не читает."""
+    latex = REPORT.read_text(encoding="utf-8")
+    cache = PreambleFormatCache(tmp_path / "formats")
+    name = cache.get_format(1, latex, latex)
+    if name is None:
+        pytest.skip(f"формат report.tex не собран: {cache._failed}")
+
+    preamble, body = _split(latex)
+    temp_dir = tmp_path / "build"
+    temp_dir.mkdir()
+    (temp_dir / "document.tex").write_text(PreambleFormatCache.with_end_of_dump(latex), encoding="utf-8")
+
+    command = [shutil.which("xelatex"), f"-fmt={name}", "-halt-on-error", "-jobname=document", _FIRST_LINE]
+    worker = WarmWorker(tmp_path / "worker", command, cache.env_for(), 5, preamble)
+    worker.start()
+    lines = []
+    try:
+        result = worker.run(temp_dir, "\\typeout{WARM-JOB-START}" + body, timeout=300, on_line=lines.append)
+    finally:
+        worker.discard()
+
+    assert result.returncode == 0, "\n".join(lines[-50:])
+    assert (temp_dir / "document.pdf").exists()
+    output = "\n".join(lines)
+    before_job, job = output.split("WARM-JOB-START", 1)
+    # polyglossia и fontspec загружены до прихода документа, hyperref и tabu — из формата
+    assert "polyglossia.sty" in before_job
+    for package in ("polyglossia.sty", "fontspec.sty", "hyperref.sty", "tabu.sty"):
+        assert package not in job
+    assert "hyperref.sty" not in before_job
@@ -7,21 +7,61 @@ export type DocStatus = CompilationStatus | 'draft';
 
 
 
-export interface DocumentItem {
+// Разобранное сообщение из лога LaTeX
+export interface CompileDiagnostic {
+  severity: 'error' | 'warning' | 'badbox' | string;
+  message: string;
+  line: number | null;
+  file: string | null;
+  package: string | null;
+  context: string | null;
+}
+
+// Документ в списке (дашборд): только метаданные, без исходника
+export interface DocumentSummaryItem {
   doc_id: number;
   name_doc: string;
-  user_id: number;
   template_id: number;
-  content_json: any;
-  latex_source: string;
   creation_data_doc: string;
   changes_data_doc: string;
+  version: number;
   pdf_path: string;
+  pdf_hash: string | null;
   compilation_status: CompilationStatus;
-  compilation_log: string;
   pdf_generated_at: string;
 }
 
+// Страница списка документов
+export interface DocumentPage {
+  items: DocumentSummaryItem[];
+  next_cursor: string | null;
+}
+
+// Ответ на сохранение изменениями
+export interface DocumentSaveResult {
+  doc_id: number;
+  version: number;
+  changes_data_doc: string;
+}
+
+// Документ целиком (открывается в редакторе)
+export interface DocumentItem extends DocumentSummaryItem {
+  user_id: number;
+  content_json: any;
+  latex_source: string;
+  compilation_diagnostics: CompileDiagnostic[] | null;
+}
+
+// Полный лог одной компиляции (загружается отдельно от документа)
+export interface CompileRunLog {
+  run_id: number;
+  doc_id: number;
+  status: 'success' | 'error';
+  created_at: string;
+  log_size: number;
+  log: string;
+}
+
 export interface TemplateItem {
   template_id: number;
   name_tmp: string;
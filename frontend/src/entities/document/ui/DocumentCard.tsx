@@ -1,11 +1,11 @@
 // src/entities/document/ui/DocumentCard.tsx
-import { DocumentItem } from '../model/types';
+import { DocumentSummaryItem } from '../model/types';
 import { getTemplateName } from '../model/templateMapper';
 import { Badge } from '../../../shared/ui/Badge';
 import { FileText, Trash2, Clock } from 'lucide-react'; // Импорт Trash2
 
 interface DocumentCardProps {
-  doc: DocumentItem;
+  doc: DocumentSummaryItem;
   onClick: () => void;
   onDelete: (id: number) => void; // Новый пропс
 }
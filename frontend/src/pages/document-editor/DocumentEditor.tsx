@@ -10,6 +10,7 @@ import { useParams } from 'react-router-dom';
 import { Save, Loader2, Check, Play, Download } from 'lucide-react'; // Иконки
 import { DocumentItem } from '../../entities/document/model/types';
 import { documentService } from '../../shared/api/documentService';
+import { diffText } from '../../shared/lib/textDiff';
 import { FileText } from 'lucide-react';
 import { TemplateItem } from '../../entities/document/model/types';
 import { authService, TitleData } from '../../shared/api/authService';
@@ -38,6 +39,8 @@ const DocumentEditor = () => {
   const [pdfUrl, setPdfUrl] = useState<string | null>(null);
   const [pdfBlobUrl, setPdfBlobUrl] = useState<string | null>(null);
   const pollingInterval = useRef<NodeJS.Timeout | null>(null);
+  const stopCompileEvents = useRef<(() => void) | null>(null);
+  const [compileProgress, setCompileProgress] = useState<string | null>(null);
 
   // Пример в DocumentEditor.tsx
   const { latex, newRegistry } = htmlToLatex(content, registry);
@@ -75,7 +78,7 @@ const DocumentEditor = () => {
 
           // Если уже скомпилирован — загружаем превью сразу
           if (docData.compilation_status === 'compiled') {
-            loadPdfPreview(docData.doc_id);
+            loadPdfPreview(docData.doc_id, docData.pdf_hash);
           }
         })
         .catch(err => console.error(err))
@@ -84,9 +87,10 @@ const DocumentEditor = () => {
   }, [id]);
 
   // Функция загрузки PDF через Blob (чтобы работала авторизация)
-  const loadPdfPreview = async (docId: number) => {
+  const loadPdfPreview = async (docId: number, pdfHash?: string | null) => {
     try {
-      const response = await $api.get(`/documents/${docId}/pdf`, {
+      // Ссылка с хэшем кэшируется браузером: повторный просмотр того же PDF не качает его заново
+      const response = await $api.get(documentService.getPdfPath(docId, pdfHash), {
         responseType: 'blob', // Важно!
       });
       const blob = new Blob([response.data], { type: 'application/pdf' });
@@ -122,16 +126,35 @@ const DocumentEditor = () => {
         finalLatex = latex;
       }
 
-      const updatedDoc = await documentService.update(Number(id), {
-        content_json: { html: finalHtml },
-        latex_source: finalLatex
-      });
+      // Отправляем только правки относительно последней сохраненной версии
+      const latexEdits = diffText(doc.latex_source || '', finalLatex);
+      const htmlEdits = diffText(doc.content_json?.html || '', finalHtml);
+      let updatedDoc = doc;
+      if (latexEdits.length || htmlEdits.length) {
+        const saved = await documentService.patch(doc.doc_id, {
+          base_version: doc.version,
+          latex_edits: latexEdits,
+          html_edits: htmlEdits
+        });
+        updatedDoc = {
+          ...doc,
+          latex_source: finalLatex,
+          content_json: { ...doc.content_json, html: finalHtml },
+          version: saved.version,
+          changes_data_doc: saved.changes_data_doc
+        };
+      }
 
       setDoc(updatedDoc);
       setSaveStatus('success');
       setTimeout(() => setSaveStatus('idle'), 2000);
       return updatedDoc;
-    } catch (err) {
+    } catch (err: any) {
+      if (err?.response?.status === 409) {
+        alert("Документ уже изменен в другом окне. Обновите страницу, чтобы не потерять изменения.");
+        setSaveStatus('idle');
+        throw err;
+      }
       alert("Ошибка при сохранении");
       setSaveStatus('idle');
       throw err;
@@ -163,10 +186,11 @@ const DocumentEditor = () => {
           if (data.status === 'compiled' || data.status === 'success') {
             alert("Документ успешно скомпилирован!");
             // Загружаем PDF в превью (если используешь Blob) или просто даем скачать
-            loadPdfPreview(docId); 
+            loadPdfPreview(docId, updatedDoc.pdf_hash); 
           } else {
             alert("Ошибка компиляции. Проверьте LaTeX код.");
-            console.error("Log:", data.log);
+            const { log } = await documentService.getCompileLog(docId);
+            console.error("Log:", log);
           }
         }
       } catch (err) {
@@ -177,6 +201,57 @@ const DocumentEditor = () => {
     }, 2000);
   };
 
+  // Завершение компиляции (общая часть для SSE и опроса)
+  const finishCompilation = async (docId: number, status: string) => {
+    const updatedDoc = await documentService.getById(docId.toString());
+    setDoc(updatedDoc);
+    setIsCompiling(false);
+    setCompileProgress(null);
+
+    if (status === 'compiled' || status === 'success') {
+      alert("Документ успешно скомпилирован!");
+      loadPdfPreview(docId, updatedDoc.pdf_hash);
+    } else {
+      // Показываем первую ошибку из разобранного лога, а не весь текст
+      const firstError = updatedDoc.compilation_diagnostics?.find(d => d.severity === 'error');
+      alert(firstError
+        ? `Ошибка компиляции: ${firstError.message}${firstError.line ? ` (строка ${firstError.line})` : ''}`
+        : "Ошибка компиляции. Проверьте LaTeX код.");
+    }
+  };
+
+  // --- Подписка на события компиляции (сервер сам присылает статус) ---
+  const startCompileEvents = (docId: number) => {
+    if (stopCompileEvents.current) stopCompileEvents.current();
+
+    stopCompileEvents.current = documentService.streamCompileEvents(
+      docId,
+      (event) => {
+        if (event.status === 'queued') {
+          setCompileProgress(`В очереди: ${event.position}`);
+        } else if (event.status === 'compiling' && event.pass) {
+          setCompileProgress(`Проход ${event.pass}/${event.max_runs}`);
+        } else if (event.status === 'log') {
+          console.log("[xelatex]", event.line);
+        } else if (event.status !== 'compiling' || event.stale) {
+          if (stopCompileEvents.current) stopCompileEvents.current();
+          stopCompileEvents.current = null;
+          finishCompilation(docId, event.stale ? 'error' : event.status);
+        }
+      },
+      (err) => {
+        // Стрим недоступен (прокси, старый сервер) — возвращаемся к опросу
+        console.error("Ошибка потока событий, переходим на опрос:", err);
+        startPollingStatus(docId);
+      }
+    );
+  };
+
+  useEffect(() => () => {
+    if (stopCompileEvents.current) stopCompileEvents.current();
+    if (pollingInterval.current) clearInterval(pollingInterval.current);
+  }, []);
+
   const handleCompile = async () => {
     if (!doc) return;
     try {
@@ -191,8 +266,8 @@ const DocumentEditor = () => {
       // 2. Запускаем компиляцию
       await documentService.compile(savedDoc.doc_id);
       
-      // 3. Начинаем опрос статуса
-      startPollingStatus(savedDoc.doc_id);
+      // 3. Слушаем события компиляции
+      startCompileEvents(savedDoc.doc_id);
       
     } catch (err) {
       console.error(err);
@@ -270,7 +345,7 @@ const DocumentEditor = () => {
               className="bg-orange-600 hover:bg-orange-700 text-white px-4 py-1.5 rounded-lg text-sm font-bold flex items-center gap-2 transition-all disabled:opacity-50 shadow-sm"
             >
               {isCompiling ? <Loader2 size={16} className="animate-spin" /> : <Play size={16} fill="currentColor" />}
-              {isCompiling ? 'Сборка...' : 'Компиляция'}
+              {isCompiling ? (compileProgress || 'Сборка...') : 'Компиляция'}
             </button>
 
             {/* Скачивание */}
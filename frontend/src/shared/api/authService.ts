@@ -6,6 +6,7 @@ export interface TitleData {
   last_name: string;
   first_name: string;
   middle_name: string;
+  full_name: string;
   initials: string;
   group: string;
   student_card: string;
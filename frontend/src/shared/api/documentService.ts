@@ -1,12 +1,25 @@
 // src/shared/api/documentService.ts
 import { $api } from './base';
-import { DocumentItem } from '../../entities/document/model/types';
+import { DocumentItem, DocumentPage } from '../../entities/document/model/types';
 import { TemplateItem } from '../../entities/document/model/types';
+import { CompileRunLog, DocumentSaveResult } from '../../entities/document/model/types';
+import { TextEdit } from '../lib/textDiff';
+
+export interface CompileEvent {
+  status: 'queued' | 'compiling' | 'log' | 'success' | 'error' | string;
+  position?: number;  // место в очереди (для queued)
+  pass?: number;      // номер прохода TeX (для compiling)
+  max_runs?: number;
+  line?: string;      // строка лога xelatex (для log)
+  stale?: boolean;    // статус давно не менялся, сервер закрыл поток (компиляция потеряна)
+}
 
 export const documentService = {
-  // Получить все документы
-  async getAll(): Promise<DocumentItem[]> {
-    const { data } = await $api.get<DocumentItem[]>('/documents/');
+  // Одна страница списка документов (next_cursor — для следующей страницы, null — конец)
+  async getPage(cursor?: string | null): Promise<DocumentPage> {
+    const { data } = await $api.get<DocumentPage>('/documents/', {
+      params: cursor ? { cursor } : undefined,
+    });
     return data;
   },
 
@@ -41,17 +54,34 @@ export const documentService = {
     return data;
   },
 
+  // Сохранение изменениями: только правки относительно версии base_version.
+  // 409 — документ уже сохранили с другой версии (другая вкладка)
+  async patch(doc_id: number, payload: {
+    base_version: number,
+    name_doc?: string,
+    latex_edits?: TextEdit[],
+    html_edits?: TextEdit[]
+  }): Promise<DocumentSaveResult> {
+    const { data } = await $api.patch<DocumentSaveResult>(`/documents/${doc_id}`, payload);
+    return data;
+  },
+
   // Запуск компиляции
   async compile(doc_id: number): Promise<DocumentItem> {
     const { data } = await $api.post<DocumentItem>(`/documents/${doc_id}/compile`);
     return data;
   },
 
+  // Путь к PDF: с хэшем содержимого — неизменяемая ссылка, которую браузер кэширует навсегда,
+  // без хэша — ссылка, которую браузер перепроверяет по ETag (304, если PDF не менялся)
+  getPdfPath(doc_id: number, pdfHash?: string | null): string {
+    return pdfHash ? `/documents/${doc_id}/pdf/${pdfHash}` : `/documents/${doc_id}/pdf`;
+  },
+
   // Получение URL для PDF (с токеном, если нужно)
-  getPdfUrl(doc_id: number): string {
+  getPdfUrl(doc_id: number, pdfHash?: string | null): string {
     const token = localStorage.getItem('token');
-    // Добавляем timestamp, чтобы браузер не кешировал старый PDF
-    return `${$api.defaults.baseURL}/documents/${doc_id}/pdf?token=${token}&t=${Date.now()}`;
+    return `${$api.defaults.baseURL}${this.getPdfPath(doc_id, pdfHash)}?token=${token}`;
   },
 
   async downloadPdf(docId: number, fileName: string) {
@@ -69,11 +99,66 @@ export const documentService = {
     link.remove();
   },
 
-  async getCompileStatus(docId: number): Promise<{ status: string, log: string }> {
+  async getCompileStatus(docId: number): Promise<{ status: string }> {
     const { data } = await $api.get(`/documents/${docId}/compile-status`);
     return data;
   },
 
+  // Полный лог компиляции: последней или указанной из истории
+  async getCompileLog(docId: number, runId?: number): Promise<CompileRunLog> {
+    const { data } = await $api.get<CompileRunLog>(`/documents/${docId}/compile-log`, {
+      params: runId !== undefined ? { run_id: runId } : undefined,
+    });
+    return data;
+  },
+
+  // Подписка на события компиляции (SSE). fetch вместо EventSource — чтобы передать токен в заголовке.
+  // Возвращает функцию отписки.
+  streamCompileEvents(
+    docId: number,
+    onEvent: (event: CompileEvent) => void,
+    onError: (err: unknown) => void
+  ): () => void {
+    const controller = new AbortController();
+    const token = localStorage.getItem('token');
+
+    (async () => {
+      const response = await fetch(`${$api.defaults.baseURL}/documents/${docId}/compile-events`, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {},
+        signal: controller.signal,
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`SSE: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // События SSE разделены пустой строкой
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const chunk = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const dataLine = chunk.split('\n').find(line => line.startsWith('data: '));
+          if (dataLine) {
+            onEvent(JSON.parse(dataLine.slice(6)));
+          }
+          boundary = buffer.indexOf('\n\n');
+        }
+      }
+    })().catch(err => {
+      if (!controller.signal.aborted) onError(err);
+    });
+
+    return () => controller.abort();
+  },
+
   
 
 };
\ No newline at end of file
@@ -97,6 +97,8 @@ export const htmlToLatex = (
       finalLatex = finalLatex.replace(/VAR_GROUP/g, userData.group || '_______');
       finalLatex = finalLatex.replace(/VAR_CARD/g, userData.student_card || '_______');
       finalLatex = finalLatex.replace(/VAR_STUDENT_SIGNATURE/g, userData.initials || '_______');
+      finalLatex = finalLatex.replace(/VAR_DEPARTMENT/g, userData.department || '_______');
+      finalLatex = finalLatex.replace(/VAR_FULL_NAME/g, userData.full_name || '_______');
       // Если в шаблоне есть кафедра
       finalLatex = finalLatex.replace(/кафедра «»/g, `кафедра «${userData.department || ''}»`);
     }
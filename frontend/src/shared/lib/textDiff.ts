@@ -0,0 +1,41 @@
+// src/shared/lib/textDiff.ts
+
+// Правка: заменить [start, end) старого текста на text (индексы строк JS — UTF-16)
+export interface TextEdit {
+  start: number;
+  end: number;
+  text: string;
+}
+
+const isHighSurrogate = (code: number) => code >= 0xd800 && code <= 0xdbff;
+
+// Правки, превращающие oldText в newText. При наборе текста меняется один участок,
+// поэтому хватает общего начала и общего конца: остается одна замена посередине.
+export const diffText = (oldText: string, newText: string): TextEdit[] => {
+  if (oldText === newText) return [];
+
+  const maxPrefix = Math.min(oldText.length, newText.length);
+  let prefix = 0;
+  while (prefix < maxPrefix && oldText.charCodeAt(prefix) === newText.charCodeAt(prefix)) {
+    prefix++;
+  }
+
+  const maxSuffix = maxPrefix - prefix;
+  let suffix = 0;
+  while (
+    suffix < maxSuffix &&
+    oldText.charCodeAt(oldText.length - 1 - suffix) === newText.charCodeAt(newText.length - 1 - suffix)
+  ) {
+    suffix++;
+  }
+
+  // Не режем суррогатную пару (эмодзи и т.п.): граница правки — только между символами
+  if (prefix > 0 && isHighSurrogate(oldText.charCodeAt(prefix - 1))) prefix--;
+  if (suffix > 0 && isHighSurrogate(oldText.charCodeAt(oldText.length - 1 - suffix))) suffix--;
+
+  return [{
+    start: prefix,
+    end: oldText.length - suffix,
+    text: newText.slice(prefix, newText.length - suffix),
+  }];
+};
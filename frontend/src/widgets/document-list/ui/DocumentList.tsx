@@ -4,25 +4,48 @@ import { useNavigate } from 'react-router-dom';
 import { Plus, Loader2 } from 'lucide-react';
 import { DocumentCard } from '../../../entities/document/ui/DocumentCard';
 import { documentService } from '../../../shared/api/documentService';
-import { DocumentItem } from '../../../entities/document/model/types';
+import { DocumentSummaryItem } from '../../../entities/document/model/types';
 
 export const DocumentList = () => {
-  const [documents, setDocuments] = useState<DocumentItem[]>([]);
+  const [documents, setDocuments] = useState<DocumentSummaryItem[]>([]);
   const [isLoading, setIsLoading] = useState(true);
+  // Курсор следующей страницы (null — документов больше нет)
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
     loadDocs();
   }, []);
 
+  // Сначала только первая страница, остальные — по кнопке "Показать еще"
   const loadDocs = () => {
     setIsLoading(true);
-    documentService.getAll()
-      .then(setDocuments)
+    documentService.getPage()
+      .then(page => {
+        setDocuments(page.items);
+        setNextCursor(page.next_cursor);
+      })
       .catch(err => console.error(err))
       .finally(() => setIsLoading(false));
   };
 
+  const loadMore = () => {
+    if (!nextCursor || isLoadingMore) return;
+    setIsLoadingMore(true);
+    documentService.getPage(nextCursor)
+      .then(page => {
+        // Документ мог сместиться между страницами (его сохранили) — не показываем дважды
+        setDocuments(prev => {
+          const seen = new Set(prev.map(doc => doc.doc_id));
+          return [...prev, ...page.items.filter(doc => !seen.has(doc.doc_id))];
+        });
+        setNextCursor(page.next_cursor);
+      })
+      .catch(err => console.error(err))
+      .finally(() => setIsLoadingMore(false));
+  };
+
   // --- ФУНКЦИЯ УДАЛЕНИЯ ---
   const handleDelete = async (id: number) => {
     if (!window.confirm("Вы уверены, что хотите удалить этот документ?")) return;
@@ -41,25 +64,41 @@ export const DocumentList = () => {
   }
 
   return (
-    <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6">
-      {/* Кнопка Создать */}
-      <div 
-        onClick={() => navigate('/create')}
-        className="flex flex-col items-center justify-center p-6 border-2 border-dashed border-gray-200 rounded-2xl hover:border-orange-400 hover:bg-orange-50 transition-all cursor-pointer group h-[220px]"
-      >
-        <Plus size={32} className="text-gray-400 group-hover:text-orange-600 mb-2" />
-        <span className="text-sm font-medium text-gray-500">Создать документ</span>
+    <div>
+      <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6">
+        {/* Кнопка Создать */}
+        <div 
+          onClick={() => navigate('/create')}
+          className="flex flex-col items-center justify-center p-6 border-2 border-dashed border-gray-200 rounded-2xl hover:border-orange-400 hover:bg-orange-50 transition-all cursor-pointer group h-[220px]"
+        >
+          <Plus size={32} className="text-gray-400 group-hover:text-orange-600 mb-2" />
+          <span className="text-sm font-medium text-gray-500">Создать документ</span>
+        </div>
+
+        {/* Список документов */}
+        {documents.map((doc) => (
+          <DocumentCard 
+            key={doc.doc_id} 
+            doc={doc} 
+            onClick={() => navigate(`/editor/${doc.doc_id}`)} 
+            onDelete={handleDelete} // Передаем функцию удаления
+          />
+        ))}
       </div>
 
-      {/* Список документов */}
-      {documents.map((doc) => (
-        <DocumentCard 
-          key={doc.doc_id} 
-          doc={doc} 
-          onClick={() => navigate(`/editor/${doc.doc_id}`)} 
-          onDelete={handleDelete} // Передаем функцию удаления
-        />
-      ))}
+      {/* Следующая страница списка */}
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={loadMore}
+            disabled={isLoadingMore}
+            className="flex items-center gap-2 px-6 py-2 text-sm font-medium text-gray-600 border border-gray-200 rounded-xl hover:border-orange-400 hover:text-orange-600 transition-all disabled:opacity-50"
+          >
+            {isLoadingMore && <Loader2 className="animate-spin" size={16} />}
+            Показать еще
+          </button>
+        </div>
+      )}
     </div>
   );
 };